@@ -20,7 +20,9 @@ from app.api.v1.endpoints import (
     reponses_clients,
     comites,
     nlp,
-    analytics
+    analytics,
+    monitoring,
+    sessions
 )
 
 api_router = APIRouter()
@@ -49,4 +51,5 @@ api_router.include_router(reponses_clients.router, prefix="/reponses-clients", t
 api_router.include_router(comites.router, prefix="/comites", tags=["comités"])
 api_router.include_router(nlp.router, prefix="/nlp", tags=["NLP"])
 api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
-    
\ No newline at end of file
+api_router.include_router(monitoring.router, prefix="/monitoring", tags=["monitoring"])
+api_router.include_router(sessions.router, prefix="/sessions", tags=["sessions"])
\ No newline at end of file
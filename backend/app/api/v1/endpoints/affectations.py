@@ -16,6 +16,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_active_user
 from app.core.permissions import (
@@ -153,9 +154,10 @@ def get_stats_agent(
 ):
     """
     Statistiques complètes d'un agent.
-    """
-    from sqlalchemy import func
     
+    Une seule agrégation sur ses affectations ; pour comparer plusieurs
+    agents, utiliser GET /analytics/agents (classement du périmètre).
+    """
     # Vérifier les permissions
     if current_user.role == RoleEnum.AGENT and agent_id != current_user.id_utilisateur:
         raise HTTPException(
@@ -163,68 +165,46 @@ def get_stats_agent(
             detail="Vous ne pouvez voir que vos propres statistiques.",
         )
     
-    # Vérifier que l'agent existe
-    agent = db.query(Utilisateur).filter(
-        Utilisateur.id_utilisateur == agent_id
-    ).first()
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent introuvable")
+    _get_agent_or_404(db, agent_id)
     
     # ============================================================
-    # 1. Toutes les affectations de l'agent
+    # 1. Affectations (toutes / actives) et dossiers résolus
+    #    Un dossier est "résolu" quand il n'est plus actif
     # ============================================================
-    all_affectations = db.query(AffectationDossier).filter(
+    stats = db.query(
+        func.count(AffectationDossier.id_affectation).label("total"),
+        func.count(AffectationDossier.id_affectation)
+            .filter(AffectationDossier.actif == True)
+            .label("actifs"),
+        func.count(func.distinct(DossierClient.id_dossier))
+            .filter(DossierClient.statut != StatutDossierEnum.ACTIF)
+            .label("resolus"),
+    ).select_from(AffectationDossier).join(
+        DossierClient, DossierClient.id_dossier == AffectationDossier.id_dossier
+    ).filter(
         AffectationDossier.id_agent == agent_id
-    ).all()
-    
-    total_dossiers = len(all_affectations)
-    dossiers_actifs = sum(1 for a in all_affectations if a.actif)
-    dossier_ids = [a.id_dossier for a in all_affectations]
+    ).one()
     
-    # ============================================================
-    # 2. Dossiers résolus
-    # Note: D'après votre CSV, les statuts sont "ACTIF" et "SUSPENDU"
-    # Un dossier est "résolu" quand il n'est plus actif
-    # ============================================================
-    dossiers_resolus = 0
-    if dossier_ids:
-        try:
-            # Compter les dossiers qui ne sont PAS "ACTIF"
-            dossiers_resolus = db.query(func.count(DossierClient.id_dossier)).filter(
-                DossierClient.id_dossier.in_(dossier_ids),
-                DossierClient.statut != "ACTIF"  # Tout ce qui n'est plus actif
-            ).scalar() or 0
-        except Exception as e:
-            print(f"Erreur comptage résolus: {e}")
-            dossiers_resolus = 0
+    total_dossiers = stats.total
+    dossiers_resolus = stats.resolus
     
     # ============================================================
-    # 3. Taux de résolution
+    # 2. Taux de résolution et progression vers l'objectif
     # ============================================================
     taux_resolution = round((dossiers_resolus / total_dossiers * 100) if total_dossiers > 0 else 0)
     
-    # ============================================================
-    # 4. Objectif mensuel (paramétrable)
-    # ============================================================
-    objectif_mensuel = 20
-    
-    # ============================================================
-    # 5. Progression
-    # ============================================================
+    objectif_mensuel = settings.AGENT_OBJECTIF_MENSUEL
     progression_objectif = round((dossiers_resolus / objectif_mensuel * 100) if objectif_mensuel > 0 else 0)
     progression_objectif = min(progression_objectif, 100)
     
-    # ============================================================
-    # 6. Retour
-    # ============================================================
     return {
         "total_dossiers": total_dossiers,
-        "dossiers_actifs": dossiers_actifs,
+        "dossiers_actifs": stats.actifs,
         "dossiers_resolus": dossiers_resolus,
         "taux_resolution": taux_resolution,
-        "objectif_mensuel": objectif_mensuel,        # ✅ corrigé
+        "objectif_mensuel": objectif_mensuel,
         "progression_objectif": progression_objectif,
-        "capacite_max": 20,
+        "capacite_max": settings.AGENT_CAPACITE_MAX,
     }
 # ── Historique dossier ─────────────────────────────────────────────────────────
 #   DOIT être déclaré avant GET /{affectation_id}
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_active_user
 from app.core.permissions import require_manager
@@ -29,7 +30,8 @@ def get_agents(
     """
     Récupérer tous les agents automatiques
     
-    Note: Structure préparée. Logique d'exécution Phase 4.
+    Un agent actif traite la file des messages de son type, dans la limite
+    de capacite_max messages par heure (voir app.services.agents_auto).
     """
     return crud_agent.get_agents(db, skip=skip, limit=limit, type_agent=type_agent, statut=statut)
 
@@ -121,7 +123,7 @@ def activer_agent(
         "message": "Agent activé",
         "agent_id": agent_id,
         "statut": "Actif",
-        "note": "Logique d'exécution sera implémentée en Phase 4"
+        "note": f"Exécution au prochain passage du planificateur (toutes les {settings.AGENTS_INTERVAL_SECONDS} s)"
     }
 
 @router.post("/{agent_id}/desactiver")
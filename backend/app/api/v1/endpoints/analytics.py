@@ -5,35 +5,108 @@ GET /analytics/portefeuille/secteur  ← répartition par type_credit (créances
 GET /analytics/portefeuille/region   ← répartition par région (agences)
 GET /analytics/portefeuille/aging    ← ancienneté des créances (jours_retard)
 GET /analytics/portefeuille/summary  ← KPI globaux (en-cours, taux, débiteurs)
+GET /analytics/agents                ← classement des agents du périmètre (KPI + mix NLP)
 """
 
 from __future__ import annotations
 
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends
-from sqlalchemy import func, case
+from datetime import date
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, case, select, true, false, literal, Date, Integer
+from sqlalchemy.dialects.postgresql import array as pg_array
+from sqlalchemy.sql import Select
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.core.security import get_current_active_user
-from app.core.permissions import filter_dossiers_by_role
+from app.core.permissions import dossier_scope_subquery, scope_agent_ids
+from app.core.cache import cached_endpoint
+from app.core.hierarchy import get_hierarchy
+from app.core.config import settings
+from app.services import portefeuille_cube, mouvements_creances, estimations
 from app.models.creance import Creance, StatutCreanceEnum
 from app.models.dossier_client import DossierClient, StatutDossierEnum
 from app.models.client import Client
 from app.models.agence import Agence
 from app.models.region import Region
-from app.models.utilisateur import Utilisateur
+from app.models.utilisateur import Utilisateur, RoleEnum
 from app.models.affectation_dossier import AffectationDossier
+from app.models.analyse_nlp import AnalyseNLP, SentimentEnum
+from app.models.reponse_client import ReponseClient
+from app.models.portefeuille_cube import PortefeuilleCube as Cube
 
 router = APIRouter()
 
 
-# ─── Helper : IDs dossiers accessibles ───────────────────────────────────────
+# ─── Helper : périmètre en sous-requête (résolu par la base) ─────────────────
 
-def _dossier_ids(db: Session, current_user: Utilisateur) -> List[int]:
-    q = db.query(DossierClient.id_dossier)
-    q = filter_dossiers_by_role(q, current_user, db)
-    return [row[0] for row in q.distinct().all()]
+def _in_scope(column, scope: Optional[Select]):
+    """Prédicat `column IN (périmètre)` ; toujours vrai pour un accès global"""
+    return true() if scope is None else column.in_(scope)
+
+
+# ─── Helper : agrégation du cube pré-calculé, restreinte au périmètre ─────────
+
+def _cube_query(db: Session, current_user: Utilisateur, *columns, select_from=None):
+    """Requête sur le cube si celui-ci est construit, sinon None (calcul en direct)"""
+    if not portefeuille_cube.is_ready(db):
+        return None
+    q = db.query(*columns)
+    if select_from is not None:
+        q = q.select_from(select_from)
+    return portefeuille_cube.scoped(q, scope_agent_ids(current_user, db))
+
+
+# ─── Helper : soldes des créances, actuels ou à une date passée ───────────────
+
+AS_OF_DESCRIPTION = "Soldes à cette date, lus dans le journal des mouvements de créances"
+
+
+def _soldes(as_of: Optional[date]):
+    """
+    (montant payé, montant restant, sous-requête à joindre ou None)
+
+    Sans as_of : colonnes de Creance. Avec as_of : dernier solde de chaque
+    créance avant la fin du jour, une descente d'index par créance.
+    """
+    if as_of is None:
+        return Creance.montant_paye, Creance.montant_restant, None
+    solde = mouvements_creances.soldes_au(as_of)
+    return solde.c.montant_paye, solde.c.montant_restant, solde
+
+
+def _join_solde(q, solde):
+    """Joindre les soldes à date (créances créées après as_of exclues)"""
+    return q if solde is None else q.join(solde, solde.c.id_creance == Creance.id_creance)
+
+
+# ─── Helper : mode approché (precision=approx) ────────────────────────────────
+
+PRECISION_DESCRIPTION = "approx : estimations sur échantillon (périmètre global, DGA / Admin)"
+
+
+def _echantillon(db: Session, current_user: Utilisateur, precision: str,
+                 as_of: Optional[date], par_type_credit: bool = False):
+    """
+    Estimations sur échantillon si demandées et applicables, sinon None
+
+    Réservé au périmètre global sans as_of : les périmètres restreints sont
+    déjà rapides (cube), et l'échantillon ne porte que sur les soldes actuels.
+    """
+    if precision != "approx" or as_of is not None or scope_agent_ids(current_user, db) is not None:
+        return None
+    return estimations.echantillon_creances(db, par_type_credit=par_type_credit)
+
+
+def _precision(precision: str, echantillon, marges: Dict[str, Optional[float]]) -> Optional[dict]:
+    """Bloc `precision` de la réponse (absent en mode exact)"""
+    if precision != "approx":
+        return None
+    if echantillon is None:
+        return {"mode": "exact"}
+    return {"mode": "approx", "echantillon_pct": settings.APPROX_SAMPLE_PERCENT, "marges": marges}
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -41,34 +114,91 @@ def _dossier_ids(db: Session, current_user: Utilisateur) -> List[int]:
 # ═══════════════════════════════════════════════════════════════════════════════
 
 @router.get("/portefeuille/summary")
+@cached_endpoint("analytics.summary")
 def get_portefeuille_summary(
+    as_of: Optional[date] = Query(None, description=AS_OF_DESCRIPTION),
+    precision: str = Query("exact", pattern="^(exact|approx)$", description=PRECISION_DESCRIPTION),
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     """
     KPI globaux du portefeuille accessible à l'utilisateur.
     Retourne : total_encours, taux_recouvrement, nb_debiteurs_actifs, risque_moyen.
+
+    Avec `as_of` : montants lus dans le journal des mouvements, retard
+    évalué à cette date (échéance dépassée et solde restant). Le statut des
+    dossiers n'étant pas historisé, les débiteurs actifs sont les dossiers
+    actifs ouverts avant as_of.
+
+    precision=approx : montants et taux estimés sur un échantillon des
+    créances, débiteurs actifs d'après les statistiques de la table.
     """
-    ids = _dossier_ids(db, current_user)
-    if not ids:
-        return {
-            "total_encours": 0,
-            "montant_recouvre": 0,
-            "taux_recouvrement": 0,
-            "nb_debiteurs_actifs": 0,
-            "risque_moyen": "Faible",
-        }
-
-    # Montants créances
-    agg = (
-        db.query(
-            func.sum(Creance.montant_initial).label("initial"),
-            func.sum(Creance.montant_paye).label("paye"),
-            func.sum(Creance.montant_restant).label("restant"),
-        )
-        .filter(Creance.id_dossier.in_(ids))
-        .first()
+    echantillon = _echantillon(db, current_user, precision, as_of)
+    cube_q = None if as_of is not None or echantillon is not None else _cube_query(
+        db, current_user,
+        func.sum(Cube.montant_initial).label("initial"),
+        func.sum(Cube.montant_paye).label("paye"),
+        func.sum(Cube.montant_restant).label("restant"),
+        func.sum(Cube.nb_creances).label("nb_total"),
+        func.sum(Cube.nb_retard).label("nb_retard"),
+        func.sum(Cube.nb_dossiers)
+            .filter(Cube.statut_dossier == StatutDossierEnum.ACTIF.name)
+            .label("nb_actifs"),
     )
+    if echantillon is not None:
+        freqs = estimations.repartition(db, "dossiers_clients", "statut") or {}
+        nb_actifs = freqs.get(StatutDossierEnum.ACTIF.name)
+        if nb_actifs is None:
+            nb_actifs = db.query(func.count(DossierClient.id_dossier)).filter(
+                DossierClient.statut == StatutDossierEnum.ACTIF
+            ).scalar()
+        nb_total = echantillon["nb_creances"]["valeur"]
+        agg = SimpleNamespace(
+            initial=echantillon["montant_initial"]["valeur"],
+            paye=echantillon["montant_paye"]["valeur"],
+            restant=echantillon["montant_restant"]["valeur"],
+            nb_total=nb_total,
+            nb_retard=echantillon["taux_retard"]["valeur"] * nb_total,
+            nb_actifs=nb_actifs,
+        )
+    elif cube_q is not None:
+        agg = cube_q.one()
+    else:
+        scope = dossier_scope_subquery(current_user, db)
+        paye, restant, solde = _soldes(as_of)
+
+        dossier_actif = DossierClient.statut == StatutDossierEnum.ACTIF
+        if as_of is None:
+            en_retard = Creance.jours_retard > 0
+        else:
+            en_retard = (Creance.date_echeance < as_of) & (restant > 0)
+            dossier_actif = dossier_actif & (
+                DossierClient.date_ouverture < mouvements_creances.fin_de_journee(as_of)
+            )
+
+        # Dossiers actifs : sous-requête scalaire évaluée dans la même instruction
+        nb_actifs_q = (
+            select(func.count(DossierClient.id_dossier))
+            .where(dossier_actif, _in_scope(DossierClient.id_dossier, scope))
+            .scalar_subquery()
+        )
+
+        # Tous les KPI en un seul parcours des créances du périmètre
+        agg = (
+            _join_solde(
+                db.query(
+                    func.sum(Creance.montant_initial).label("initial"),
+                    func.sum(paye).label("paye"),
+                    func.sum(restant).label("restant"),
+                    func.count(Creance.id_creance).label("nb_total"),
+                    func.count(Creance.id_creance).filter(en_retard).label("nb_retard"),
+                    nb_actifs_q.label("nb_actifs"),
+                ).select_from(Creance),
+                solde,
+            )
+            .filter(_in_scope(Creance.id_dossier, scope))
+            .one()
+        )
     total_initial = float(agg.initial or 0)
     total_paye    = float(agg.paye    or 0)
     total_restant = float(agg.restant or 0)
@@ -76,29 +206,11 @@ def get_portefeuille_summary(
     taux = round((total_paye / total_initial * 100), 1) if total_initial > 0 else 0
 
     # Débiteurs actifs = dossiers ACTIF
-    nb_actifs = (
-        db.query(func.count(DossierClient.id_dossier))
-        .filter(
-            DossierClient.id_dossier.in_(ids),
-            DossierClient.statut == StatutDossierEnum.ACTIF,
-        )
-        .scalar() or 0
-    )
+    nb_actifs = agg.nb_actifs or 0
 
     # Risque moyen : basé sur % créances en retard
-    nb_total = (
-        db.query(func.count(Creance.id_creance))
-        .filter(Creance.id_dossier.in_(ids))
-        .scalar() or 1
-    )
-    nb_retard = (
-        db.query(func.count(Creance.id_creance))
-        .filter(
-            Creance.id_dossier.in_(ids),
-            Creance.jours_retard > 0,
-        )
-        .scalar() or 0
-    )
+    nb_total  = agg.nb_total or 1
+    nb_retard = agg.nb_retard or 0
     taux_retard = nb_retard / nb_total
     if taux_retard < 0.20:
         risque = "Faible"
@@ -107,13 +219,22 @@ def get_portefeuille_summary(
     else:
         risque = "Élevé"
 
-    return {
+    result = {
         "total_encours":       total_restant,
         "montant_recouvre":    total_paye,
         "taux_recouvrement":   taux,
         "nb_debiteurs_actifs": nb_actifs,
         "risque_moyen":        risque,
     }
+    precision_info = _precision(precision, echantillon, echantillon and {
+        "total_encours":     echantillon["montant_restant"]["marge"],
+        "montant_recouvre":  echantillon["montant_paye"]["marge"],
+        "taux_recouvrement": echantillon["taux_recouvrement"]["marge"],
+        "taux_retard":       echantillon["taux_retard"]["marge"],
+    })
+    if precision_info is not None:
+        result["precision"] = precision_info
+    return result
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -140,31 +261,72 @@ TYPE_CREDIT_COLORS: Dict[str, str] = {
 
 
 @router.get("/portefeuille/secteur")
+@cached_endpoint("analytics.secteur")
 def get_portefeuille_secteur(
+    as_of: Optional[date] = Query(None, description=AS_OF_DESCRIPTION),
+    precision: str = Query("exact", pattern="^(exact|approx)$", description=PRECISION_DESCRIPTION),
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     """
     Répartition du portefeuille par type de crédit (secteur).
     Retourne la liste triée par montant_restant décroissant.
+
+    precision=approx : montants estimés sur un échantillon des créances,
+    marge d'erreur par secteur (en millions) dans `precision`.
     """
-    ids = _dossier_ids(db, current_user)
-    if not ids:
-        return {"secteurs": [], "total": 0}
-
-    rows = (
-        db.query(
-            Creance.type_credit,
-            func.sum(Creance.montant_restant).label("montant_restant"),
-            func.sum(Creance.montant_initial).label("montant_initial"),
-            func.sum(Creance.montant_paye).label("montant_paye"),
-            func.count(Creance.id_creance).label("nb_creances"),
-        )
-        .filter(Creance.id_dossier.in_(ids))
-        .group_by(Creance.type_credit)
-        .order_by(func.sum(Creance.montant_restant).desc())
-        .all()
+    echantillon = _echantillon(db, current_user, precision, as_of, par_type_credit=True)
+    cube_q = None if as_of is not None or echantillon is not None else _cube_query(
+        db, current_user,
+        Cube.type_credit,
+        func.sum(Cube.montant_restant).label("montant_restant"),
+        func.sum(Cube.montant_initial).label("montant_initial"),
+        func.sum(Cube.montant_paye).label("montant_paye"),
+        func.sum(Cube.nb_creances).label("nb_creances"),
     )
+    if echantillon is not None:
+        rows = sorted(
+            (
+                SimpleNamespace(
+                    type_credit=tc,
+                    montant_restant=e["montant_restant"]["valeur"],
+                    montant_initial=e["montant_initial"]["valeur"],
+                    montant_paye=e["montant_paye"]["valeur"],
+                    nb_creances=round(e["nb_creances"]["valeur"]),
+                )
+                for tc, e in echantillon.items()
+            ),
+            key=lambda r: r.montant_restant,
+            reverse=True,
+        )
+    elif cube_q is not None:
+        rows = (
+            cube_q
+            .filter(Cube.type_credit != "")   # dossiers sans créance
+            .group_by(Cube.type_credit)
+            .order_by(func.sum(Cube.montant_restant).desc())
+            .all()
+        )
+    else:
+        scope = dossier_scope_subquery(current_user, db)
+        paye, restant, solde = _soldes(as_of)
+
+        rows = (
+            _join_solde(
+                db.query(
+                    Creance.type_credit,
+                    func.sum(restant).label("montant_restant"),
+                    func.sum(Creance.montant_initial).label("montant_initial"),
+                    func.sum(paye).label("montant_paye"),
+                    func.count(Creance.id_creance).label("nb_creances"),
+                ),
+                solde,
+            )
+            .filter(_in_scope(Creance.id_dossier, scope))
+            .group_by(Creance.type_credit)
+            .order_by(func.sum(restant).desc())
+            .all()
+        )
 
     total_restant = sum(float(r.montant_restant or 0) for r in rows)
 
@@ -189,10 +351,17 @@ def get_portefeuille_secteur(
             "color":             TYPE_CREDIT_COLORS.get(tc, "#7cc49c"),
         })
 
-    return {
+    result = {
         "secteurs": secteurs,
         "total":    round(total_restant / 1_000_000, 2),  # en millions
     }
+    precision_info = _precision(precision, echantillon, echantillon and {
+        tc: round(e["montant_restant"]["marge"] / 1_000_000, 2)    # en millions
+        for tc, e in echantillon.items()
+    })
+    if precision_info is not None:
+        result["precision"] = precision_info
+    return result
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -203,7 +372,9 @@ REGION_COLORS = ["#006747", "#3a8b60", "#7cc49c", "#a4c639", "#5ba97e", "#9dd9ba
 
 
 @router.get("/portefeuille/region")
+@cached_endpoint("analytics.region")
 def get_portefeuille_region(
+    as_of: Optional[date] = Query(None, description=AS_OF_DESCRIPTION),
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
@@ -212,35 +383,59 @@ def get_portefeuille_region(
     Joint : Creance → DossierClient → Client → (ville) + AffectationDossier → Utilisateur → Agence → Region.
     Retourne la liste triée par montant_restant décroissant.
     """
-    ids = _dossier_ids(db, current_user)
-    if not ids:
-        return {"regions": [], "total": 0}
-
-    # Jointure : Créance → Dossier → Affectation active → Agent → Agence → Région
-    rows = (
-        db.query(
-            Region.id_region,
-            Region.nom_region,
-            func.sum(Creance.montant_restant).label("montant_restant"),
-            func.sum(Creance.montant_initial).label("montant_initial"),
-            func.sum(Creance.montant_paye).label("montant_paye"),
-            func.count(Creance.id_creance).label("nb_creances"),
-            func.count(func.distinct(DossierClient.id_dossier)).label("nb_dossiers"),
+    cube_q = None if as_of is not None else _cube_query(
+        db, current_user,
+        Region.id_region,
+        Region.nom_region,
+        func.sum(Cube.montant_restant).label("montant_restant"),
+        func.sum(Cube.montant_initial).label("montant_initial"),
+        func.sum(Cube.montant_paye).label("montant_paye"),
+        func.sum(Cube.nb_creances).label("nb_creances"),
+        func.sum(Cube.nb_dossiers).label("nb_dossiers"),
+        select_from=Cube,
+    )
+    if cube_q is not None:
+        # La région de l'agent est une dimension du cube : seule Region est jointe
+        rows = (
+            cube_q
+            .join(Region, Cube.id_region == Region.id_region)
+            .filter(Cube.type_credit != "")
+            .group_by(Region.id_region, Region.nom_region)
+            .order_by(func.sum(Cube.montant_restant).desc())
+            .all()
         )
-        .join(DossierClient, Creance.id_dossier == DossierClient.id_dossier)
-        .join(
-            AffectationDossier,
-            (AffectationDossier.id_dossier == DossierClient.id_dossier)
-            & (AffectationDossier.actif == True),
+    else:
+        scope = dossier_scope_subquery(current_user, db)
+        paye, restant, solde = _soldes(as_of)
+
+        # Jointure : Créance → Dossier → Affectation active → Agent → Agence → Région
+        q = (
+            db.query(
+                Region.id_region,
+                Region.nom_region,
+                func.sum(restant).label("montant_restant"),
+                func.sum(Creance.montant_initial).label("montant_initial"),
+                func.sum(paye).label("montant_paye"),
+                func.count(Creance.id_creance).label("nb_creances"),
+                func.count(func.distinct(DossierClient.id_dossier)).label("nb_dossiers"),
+            )
+            .join(DossierClient, Creance.id_dossier == DossierClient.id_dossier)
+            .join(
+                AffectationDossier,
+                (AffectationDossier.id_dossier == DossierClient.id_dossier)
+                & (AffectationDossier.actif == True),
+            )
+            .join(Utilisateur, AffectationDossier.id_agent == Utilisateur.id_utilisateur)
+            .join(Agence, Utilisateur.id_agence == Agence.id_agence)
+            .join(Region, Agence.id_region == Region.id_region)
+        )
+        rows = (
+            _join_solde(q, solde)
+            .filter(_in_scope(Creance.id_dossier, scope))
+            .group_by(Region.id_region, Region.nom_region)
+            .order_by(func.sum(restant).desc())
+            .all()
         )
-        .join(Utilisateur, AffectationDossier.id_agent == Utilisateur.id_utilisateur)
-        .join(Agence, Utilisateur.id_agence == Agence.id_agence)
-        .join(Region, Agence.id_region == Region.id_region)
-        .filter(Creance.id_dossier.in_(ids))
-        .group_by(Region.id_region, Region.nom_region)
-        .order_by(func.sum(Creance.montant_restant).desc())
-        .all()
-    )
 
     total_restant = sum(float(r.montant_restant or 0) for r in rows)
 
@@ -274,47 +469,262 @@ def get_portefeuille_region(
 # AGING BALANCE (ancienneté des créances)
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Bornes supérieures (incluses) par défaut : 0-30, 31-60, 61-90, 91-180, > 180
+AGING_BORNES_DEFAUT = "30,60,90,180"
+AGING_COLORS = ["#006747", "#3a8b60", "#a4c639", "#f59e0b", "#e24b4a"]
+AGING_MAX_TRANCHES = 20
+
+
+def _parse_bornes(bornes: str) -> List[int]:
+    """'30,60,90' → [30, 60, 90] ; strictement croissantes et positives"""
+    try:
+        values = [int(b) for b in bornes.split(",") if b.strip()]
+    except ValueError:
+        values = []
+    if (
+        not values
+        or len(values) >= AGING_MAX_TRANCHES
+        or values[0] < 0
+        or any(a >= b for a, b in zip(values, values[1:]))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bornes : entiers positifs strictement croissants séparés par des virgules (ex. 30,60,90,180)",
+        )
+    return values
+
+
+def _aging_live(db: Session, current_user: Utilisateur, lowers: List[int], as_of: Optional[date]):
+    """Tranches calculées sur les créances (bornes libres, ou retard et soldes à as_of)"""
+    scope = dossier_scope_subquery(current_user, db)
+    _, restant, solde = _soldes(as_of)
+
+    if as_of is not None:
+        jours = func.greatest(literal(as_of, Date) - Creance.date_echeance, 0)
+    else:
+        jours = Creance.jours_retard
+
+    # width_bucket(x, seuils) = nombre de seuils <= x → index de la tranche
+    tranche = func.width_bucket(jours, pg_array([literal(b, Integer) for b in lowers])).label("tranche")
+
+    return (
+        _join_solde(
+            db.query(
+                tranche,
+                func.count(Creance.id_creance).label("nb"),
+                func.sum(restant).label("montant"),
+            ).select_from(Creance),
+            solde,
+        )
+        .filter(_in_scope(Creance.id_dossier, scope), jours >= 0)
+        .group_by(tranche)
+        .all()
+    )
+
+
 @router.get("/portefeuille/aging")
+@cached_endpoint("analytics.aging")
 def get_portefeuille_aging(
+    bornes: str = Query(AGING_BORNES_DEFAUT, description="Bornes supérieures des tranches, en jours"),
+    as_of: Optional[date] = Query(None, description="Retard recalculé depuis date_echeance et soldes à cette date"),
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     """
     Répartition des créances par tranche d'ancienneté (jours_retard).
-    Tranches : 0-30j, 31-60j, 61-90j, 91-180j, >180j
+    Tranches par défaut : 0-30j, 31-60j, 61-90j, 91-180j, >180j
+
+    Tranches par défaut : lues dans le cube pré-agrégé. Bornes libres ou
+    `as_of` (retard recalculé : as_of - date_echeance, montants lus dans le
+    journal des mouvements) : un seul GROUP BY (width_bucket) sur les créances.
     """
-    ids = _dossier_ids(db, current_user)
-    if not ids:
-        return {"tranches": []}
-
-    tranches_def = [
-        ("0-30 jours",   0,   30),
-        ("31-60 jours",  31,  60),
-        ("61-90 jours",  61,  90),
-        ("91-180 jours", 91, 180),
-        ("> 180 jours", 181, 99999),
-    ]
-    colors = ["#006747", "#3a8b60", "#a4c639", "#f59e0b", "#e24b4a"]
+    uppers = _parse_bornes(bornes)
+    lowers = [u + 1 for u in uppers]
+
+    cube_q = None
+    if as_of is None and tuple(uppers) == portefeuille_cube.CUBE_AGING_BORNES:
+        cube_q = _cube_query(
+            db, current_user,
+            Cube.tranche_aging.label("tranche"),
+            func.sum(Cube.nb_creances).label("nb"),
+            func.sum(Cube.montant_restant).label("montant"),
+        )
+    if cube_q is not None:
+        rows = cube_q.filter(Cube.tranche_aging >= 0).group_by(Cube.tranche_aging).all()
+    else:
+        rows = _aging_live(db, current_user, lowers, as_of)
+    by_tranche = {r.tranche: r for r in rows}
 
+    bounds = [0] + lowers
     tranches = []
-    for (label, low, high), color in zip(tranches_def, colors):
-        agg = (
-            db.query(
-                func.count(Creance.id_creance).label("nb"),
-                func.sum(Creance.montant_restant).label("montant"),
-            )
-            .filter(
-                Creance.id_dossier.in_(ids),
-                Creance.jours_retard >= low,
-                Creance.jours_retard <= high,
-            )
-            .first()
-        )
+    for i, low in enumerate(bounds):
+        if i < len(uppers):
+            label = f"{low}-{uppers[i]} jours"
+        else:
+            label = f"> {uppers[-1]} jours"
+        r = by_tranche.get(i)
         tranches.append({
             "label":   label,
-            "nb":      agg.nb      or 0,
-            "montant": round(float(agg.montant or 0) / 1_000_000, 2),
-            "color":   color,
+            "nb":      r.nb if r else 0,
+            "montant": round(float(r.montant or 0) / 1_000_000, 2) if r else 0,
+            "color":   AGING_COLORS[min(i * len(AGING_COLORS) // len(bounds), len(AGING_COLORS) - 1)],
         })
 
-    return {"tranches": tranches}
\ No newline at end of file
+    return {"tranches": tranches, "as_of": as_of}
+
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLASSEMENT DES AGENTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+AGENT_TRIS = "total|actifs|resolus|taux_resolution|recouvre|restant|nom"
+
+
+def _portefeuille_par_agent(db: Session):
+    """Dossiers et montants par agent : cube pré-agrégé, sinon affectations actives"""
+    if portefeuille_cube.is_ready(db):
+        return select(
+            Cube.id_agent.label("id_agent"),
+            func.sum(Cube.nb_dossiers).label("total"),
+            func.sum(Cube.nb_dossiers)
+                .filter(Cube.statut_dossier == StatutDossierEnum.ACTIF.name)
+                .label("actifs"),
+            func.sum(Cube.montant_paye).label("recouvre"),
+            func.sum(Cube.montant_restant).label("restant"),
+        ).group_by(Cube.id_agent)
+
+    return (
+        select(
+            AffectationDossier.id_agent.label("id_agent"),
+            func.count(func.distinct(DossierClient.id_dossier)).label("total"),
+            func.count(func.distinct(DossierClient.id_dossier))
+                .filter(DossierClient.statut == StatutDossierEnum.ACTIF)
+                .label("actifs"),
+            func.sum(Creance.montant_paye).label("recouvre"),
+            func.sum(Creance.montant_restant).label("restant"),
+        )
+        .select_from(AffectationDossier)
+        .join(DossierClient, DossierClient.id_dossier == AffectationDossier.id_dossier)
+        .outerjoin(Creance, Creance.id_dossier == DossierClient.id_dossier)
+        .where(AffectationDossier.actif == True)
+        .group_by(AffectationDossier.id_agent)
+    )
+
+
+def _nlp_par_agent():
+    """Répartition des sentiments des réponses clients, par agent affecté"""
+    par_sentiment = lambda s: func.count(AnalyseNLP.id_analyse).filter(AnalyseNLP.sentiment == s)
+    return (
+        select(
+            AffectationDossier.id_agent.label("id_agent"),
+            par_sentiment(SentimentEnum.POSITIF).label("positif"),
+            par_sentiment(SentimentEnum.NEUTRE).label("neutre"),
+            par_sentiment(SentimentEnum.NEGATIF).label("negatif"),
+        )
+        .select_from(AnalyseNLP)
+        .join(ReponseClient, ReponseClient.id_reponse == AnalyseNLP.id_reponse)
+        .join(
+            AffectationDossier,
+            (AffectationDossier.id_dossier == ReponseClient.id_dossier)
+            & (AffectationDossier.actif == True),
+        )
+        .group_by(AffectationDossier.id_agent)
+    )
+
+
+@router.get("/agents")
+@cached_endpoint("analytics.agents")
+def get_agents_leaderboard(
+    tri: str = Query("recouvre", pattern=f"^({AGENT_TRIS})$"),
+    ordre: str = Query("desc", pattern="^(asc|desc)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Classement des agents du périmètre : dossiers (total, actifs, résolus),
+    montants recouvrés / restants et répartition des sentiments NLP.
+
+    Une seule requête pour tout le périmètre (agrégats par agent joints aux
+    agents, tri et pagination en SQL), au lieu d'un appel à
+    /affectations/agent/{id}/stats par agent. Un dossier est "résolu" quand
+    il n'est plus actif.
+    """
+    agents = scope_agent_ids(current_user, db)
+    p = _portefeuille_par_agent(db).subquery("p")
+    n = _nlp_par_agent().subquery("n")
+
+    total   = func.coalesce(p.c.total, 0)
+    actifs  = func.coalesce(p.c.actifs, 0)
+    resolus = total - actifs
+    taux    = case((total > 0, resolus * 100.0 / total), else_=0)
+    tris = {
+        "total":           total,
+        "actifs":          actifs,
+        "resolus":         resolus,
+        "taux_resolution": taux,
+        "recouvre":        func.coalesce(p.c.recouvre, 0),
+        "restant":         func.coalesce(p.c.restant, 0),
+        "nom":             Utilisateur.nom,
+    }
+
+    stmt = (
+        select(
+            Utilisateur.id_utilisateur,
+            Utilisateur.nom,
+            Utilisateur.prenom,
+            Utilisateur.id_agence,
+            total.label("total"),
+            actifs.label("actifs"),
+            resolus.label("resolus"),
+            taux.label("taux_resolution"),
+            tris["recouvre"].label("recouvre"),
+            tris["restant"].label("restant"),
+            func.coalesce(n.c.positif, 0).label("nlp_positif"),
+            func.coalesce(n.c.neutre, 0).label("nlp_neutre"),
+            func.coalesce(n.c.negatif, 0).label("nlp_negatif"),
+            func.count().over().label("nb_agents"),
+        )
+        .outerjoin(p, p.c.id_agent == Utilisateur.id_utilisateur)
+        .outerjoin(n, n.c.id_agent == Utilisateur.id_utilisateur)
+        .where(Utilisateur.role == RoleEnum.AGENT, Utilisateur.actif == True)
+    )
+    if agents is not None:
+        stmt = stmt.where(Utilisateur.id_utilisateur.in_(sorted(agents)) if agents else false())
+
+    cle = tris[tri]
+    stmt = stmt.order_by(
+        cle.desc().nulls_last() if ordre == "desc" else cle.asc().nulls_last(),
+        Utilisateur.id_utilisateur,
+    ).offset(skip).limit(limit)
+
+    rows = db.execute(stmt).all()
+    hierarchy = get_hierarchy(db)
+
+    return {
+        "total":  rows[0].nb_agents if rows else 0,
+        "skip":   skip,
+        "limit":  limit,
+        "agents": [
+            {
+                "id_agent":          r.id_utilisateur,
+                "nom":               r.nom,
+                "prenom":            r.prenom,
+                "agence":            hierarchy.agence_noms.get(r.id_agence),
+                "total_dossiers":    int(r.total),
+                "dossiers_actifs":   int(r.actifs),
+                "dossiers_resolus":  int(r.resolus),
+                "taux_resolution":   round(float(r.taux_resolution), 1),
+                "montant_recouvre":  float(r.recouvre),
+                "montant_restant":   float(r.restant),
+                "nlp": {
+                    "positif": r.nlp_positif,
+                    "neutre":  r.nlp_neutre,
+                    "negatif": r.nlp_negatif,
+                },
+            }
+            for r in rows
+        ],
+    }
@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.core.database import get_db
 from app.core.security import (
-    authenticate_user,
     create_access_token,
     create_refresh_token,
     decode_access_token,  # ← CORRIGÉ
     get_current_active_user,
     blacklist_token,
+    is_token_revoked,
     oauth2_scheme
 )
+from app.core import sessions
 from app.core.config import settings
+from app.core.jwt_keys import get_keyset
+from app.core.login_guard import authenticate_user_async
 from app.schemas.auth import (
     LoginRequest,
     LoginResponse,
@@ -25,8 +29,42 @@ from app.models.utilisateur import Utilisateur
 
 router = APIRouter()
 
+def _client_ip(request: Request) -> str:
+    """
+    IP du client pour le limiteur de login
+
+    X-Forwarded-For n'est lu que si la connexion vient d'un proxy de
+    TRUSTED_PROXIES : on retient alors le dernier saut qui n'est pas un
+    proxy de confiance (les sauts plus à gauche sont fournis par le client).
+    """
+    peer = request.client.host if request.client else "inconnue"
+    trusted = {p.strip() for p in settings.TRUSTED_PROXIES.split(",") if p.strip()}
+    forwarded = request.headers.get("x-forwarded-for")
+    if peer not in trusted or not forwarded:
+        return peer
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if hop not in trusted:
+            return hop
+    return peer
+
+def _issue_tokens(user: Utilisateur, sid: str) -> tuple:
+    """Access + refresh tokens rattachés à la session `sid`"""
+    access_token = create_access_token(
+        data={
+            "sub": user.email,
+            "role": user.role.value,
+            "user_id": user.id_utilisateur,
+            "sid": sid
+        }
+    )
+    refresh_token = create_refresh_token(
+        data={"sub": user.email, "user_id": user.id_utilisateur, "sid": sid}
+    )
+    return access_token, refresh_token
+
 @router.post("/login", response_model=Token)
-def login_oauth2(
+async def login_oauth2(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -37,7 +75,9 @@ def login_oauth2(
     - Username = votre email
     - Password = votre mot de passe
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(
+        db, form_data.username, form_data.password, _client_ip(request)
+    )
     
     if not user:
         raise HTTPException(
@@ -52,17 +92,11 @@ def login_oauth2(
             detail="Compte désactivé",
         )
     
-    access_token = create_access_token(
-        data={
-            "sub": user.email,
-            "role": user.role.value,
-            "user_id": user.id_utilisateur
-        }
-    )
-    
-    refresh_token = create_refresh_token(
-        data={"sub": user.email}
+    sid = await run_in_threadpool(
+        sessions.open_session,
+        user.id_utilisateur, _client_ip(request), request.headers.get("user-agent")
     )
+    access_token, refresh_token = _issue_tokens(user, sid)
     
     return Token(
         access_token=access_token,
@@ -71,14 +105,17 @@ def login_oauth2(
     )
 
 @router.post("/login-json", response_model=LoginResponse)
-def login_json(
+async def login_json(
+    request: Request,
     login_data: LoginRequest,
     db: Session = Depends(get_db)
 ):
     """
     Login avec JSON
     """
-    user = authenticate_user(db, login_data.email, login_data.password)
+    user = await authenticate_user_async(
+        db, login_data.email, login_data.password, _client_ip(request)
+    )
     
     if not user:
         raise HTTPException(
@@ -92,17 +129,11 @@ def login_json(
             detail="Compte désactivé",
         )
     
-    access_token = create_access_token(
-        data={
-            "sub": user.email,
-            "role": user.role.value,
-            "user_id": user.id_utilisateur
-        }
-    )
-    
-    refresh_token = create_refresh_token(
-        data={"sub": user.email}
+    sid = await run_in_threadpool(
+        sessions.open_session,
+        user.id_utilisateur, _client_ip(request), request.headers.get("user-agent")
     )
+    access_token, refresh_token = _issue_tokens(user, sid)
     
     return LoginResponse(
         access_token=access_token,
@@ -143,17 +174,22 @@ def refresh_token(
                 detail="Utilisateur invalide"
             )
         
-        new_access_token = create_access_token(
-            data={
-                "sub": user.email,
-                "role": user.role.value,
-                "user_id": user.id_utilisateur
-            }
-        )
+        # Session révoquée ou déconnexion globale : pas de nouveau token
+        payload.setdefault("user_id", user.id_utilisateur)
+        if is_token_revoked(refresh_data.refresh_token, payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Session révoquée"
+            )
         
-        new_refresh_token = create_refresh_token(
-            data={"sub": user.email}
-        )
+        # Les refresh tokens antérieurs à l'index de sessions en ouvrent une
+        sid = payload.get("sid")
+        if sid:
+            sessions.touch_session(user.id_utilisateur, sid)
+        else:
+            sid = sessions.open_session(user.id_utilisateur)
+        
+        new_access_token, new_refresh_token = _issue_tokens(user, sid)
         
         return Token(
             access_token=new_access_token,
@@ -167,6 +203,16 @@ def refresh_token(
             detail="Token invalide ou expiré"
         )
 
+@router.get("/jwks.json")
+def get_jwks():
+    """
+    Clés publiques de vérification des tokens (format JWKS)
+    
+    Permet aux autres services de vérifier les tokens localement,
+    sans partager de secret. Vide tant que l'API signe en HS256.
+    """
+    return get_keyset().jwks()
+
 @router.get("/me", response_model=UserProfile)
 def get_current_user_profile(
     current_user: Utilisateur = Depends(get_current_active_user)
@@ -183,9 +229,15 @@ def logout(
 ):
     """
     Déconnecter l'utilisateur
+    
+    Révoque le token présenté et la session associée (refresh token compris)
     """
     blacklist_token(token)
     
+    sid = (decode_access_token(token) or {}).get("sid")
+    if sid:
+        sessions.revoke_session(current_user.id_utilisateur, sid)
+    
     return {
         "message": "Déconnexion réussie",
         "detail": "Votre token a été révoqué"
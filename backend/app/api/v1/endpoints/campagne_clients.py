@@ -10,9 +10,12 @@ from app.models.utilisateur import Utilisateur
 from app.schemas.campagne_client import (
     CampagneClientCreate,
     CampagneClientUpdate,
-    CampagneClientResponse
+    CampagneClientResponse,
+    LotEvenementsEnvoi,
+    ResultatEvenementsEnvoi
 )
 from app.crud import campagne_client as crud_campagne_client
+from app.services import evenements_envoi
 
 router = APIRouter()
 
@@ -76,6 +79,29 @@ def update_campagne_client(
     
     return campagne_client
 
+@router.post("/evenements", response_model=ResultatEvenementsEnvoi)
+def appliquer_evenements(
+    lot: LotEvenementsEnvoi,
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Appliquer un lot d'événements d'envoi (accusés SMS / Email)
+    
+    Jusqu'à 10 000 événements visant des liaisons campagne-client ou des
+    messages, appliqués en une transaction. Les événements dans le désordre
+    ou rejoués ne font jamais reculer un statut ; les compteurs des
+    campagnes sont mis à jour dans le même passage.
+    """
+    bilan = evenements_envoi.appliquer_evenements(db, (
+        evenements_envoi.Evenement(
+            e.cible, e.id, e.statut, e.horodatage, e.code_erreur, e.message_erreur
+        )
+        for e in lot.evenements
+    ))
+    db.commit()
+    return bilan
+
 @router.post("/{campagne_client_id}/marquer-envoye")
 def marquer_envoye(
     campagne_client_id: int,
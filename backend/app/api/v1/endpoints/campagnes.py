@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -11,12 +11,42 @@ from app.schemas.campagne import (
     CampagneCreate,
     CampagneUpdate,
     CampagneResponse,
-    CampagneStats
+    CampagneStats,
+    VarianteCreate,
+    VarianteResponse,
+    SegmentationRequete,
+    AudienceEstimee,
+    ApercuSegment
 )
 from app.crud import campagne as crud_campagne
+from app.crud import template as crud_template
+from app.services import segmentation, variantes
+from app.tasks import campagnes as campagne_tasks
 
 router = APIRouter()
 
+def _valider_criteres(criteres: Optional[dict]) -> None:
+    """400 si les critères de segmentation ne compilent pas"""
+    try:
+        segmentation.condition(criteres)
+    except segmentation.CritereInvalide as e:
+        raise HTTPException(status_code=400, detail=f"Critères de segmentation invalides : {e}")
+
+def _valider_variantes(db: Session, liste: List[VarianteCreate]) -> None:
+    """400 si les variantes ne forment pas un test A/B cohérent"""
+    if not liste:
+        return
+    if len(liste) < 2:
+        raise HTTPException(status_code=400, detail="Un test A/B demande au moins deux variantes")
+    if len({v.code for v in liste}) != len(liste):
+        raise HTTPException(status_code=400, detail="Codes de variantes en double")
+    if sum(v.poids for v in liste) != 100:
+        raise HTTPException(status_code=400, detail="La somme des poids des variantes doit être 100")
+    for v in liste:
+        template = crud_template.get_template(db, v.id_template)
+        if not template or not template.actif:
+            raise HTTPException(status_code=400, detail=f"Variante {v.code} : template absent ou inactif")
+
 @router.get("/", response_model=List[CampagneResponse])
 def get_campagnes(
     skip: int = 0,
@@ -35,6 +65,33 @@ def get_campagnes(
         type_campagne=type_campagne
     )
 
+@router.post("/segmentation/estimation", response_model=AudienceEstimee)
+def estimer_audience(
+    requete: SegmentationRequete,
+    current_user: Utilisateur = Depends(require_manager),
+    db: Session = Depends(get_db)
+):
+    """
+    Taille du segment avant lancement (dry-run, rien n'est écrit)
+    
+    Comptage exact sur une petite base ; au-delà de APPROX_MIN_ROWS
+    dossiers, extrapolation d'un échantillon avec marge d'erreur à 95 %.
+    """
+    _valider_criteres(requete.criteres_segmentation)
+    return segmentation.estimer_audience(db, requete.criteres_segmentation)
+
+@router.post("/segmentation/apercu", response_model=ApercuSegment)
+def apercu_segment(
+    requete: SegmentationRequete,
+    current_user: Utilisateur = Depends(require_manager),
+    db: Session = Depends(get_db)
+):
+    """Premiers dossiers du segment, par pages de `limite` (curseur `apres`)"""
+    _valider_criteres(requete.criteres_segmentation)
+    dossiers = segmentation.apercu(db, requete.criteres_segmentation, requete.limite, requete.apres)
+    suivant = dossiers[-1]["id_dossier"] if len(dossiers) == requete.limite else None
+    return {"dossiers": dossiers, "suivant": suivant}
+
 @router.get("/{campagne_id}", response_model=CampagneResponse)
 def get_campagne(
     campagne_id: int,
@@ -60,16 +117,23 @@ def create_campagne(
     
     Permissions: Managers uniquement
     
-    Critères de ciblage supportés:
+    Critères de ciblage (voir app.services.segmentation):
 ```json
     {
         "statut_dossier": ["Actif", "Suspendu"],
         "priorite": ["Haute", "Moyenne"],
         "montant_min": 5000,
-        "montant_max": 50000
+        "montant_max": 50000,
+        "regions": [1, 2],
+        "jours_retard_min": 31,
+        "jours_retard_max": 90,
+        "un_parmi": [{"sentiment": ["Negatif"]}, {"promesse": "echue"}],
+        "sauf": {"derniere_interaction_apres": "2024-06-01"}
     }
 ```
     """
+    _valider_criteres(campagne.criteres_segmentation)
+    _valider_variantes(db, campagne.variantes)
     return crud_campagne.create_campagne(db, campagne, current_user.id_utilisateur)
 
 @router.put("/{campagne_id}", response_model=CampagneResponse)
@@ -80,6 +144,8 @@ def update_campagne(
     db: Session = Depends(get_db)
 ):
     """Mettre à jour une campagne"""
+    if campagne_update.criteres_segmentation is not None:
+        _valider_criteres(campagne_update.criteres_segmentation)
     campagne = crud_campagne.update_campagne(db, campagne_id, campagne_update)
     
     if not campagne:
@@ -104,6 +170,7 @@ def delete_campagne(
 @router.post("/{campagne_id}/lancer")
 def lancer_campagne(
     campagne_id: int,
+    asynchrone: bool = Query(False, description="Lancer par le worker (segments volumineux)"),
     current_user: Utilisateur = Depends(require_manager),
     db: Session = Depends(get_db)
 ):
@@ -111,17 +178,102 @@ def lancer_campagne(
     Lancer une campagne
     
     - Identifie les clients cibles selon les critères
-    - Crée les entrées CampagneClient
+    - Crée les entrées CampagneClient (INSERT ... SELECT par tranches, idempotent)
     - Passe le statut à "En cours"
     - Les agents automatiques prendront ensuite le relais
+    
+    asynchrone=true : le lancement est confié au worker, l'avancement se
+    suit sur GET /campagnes/{id}/lancement.
     """
-    result = crud_campagne.lancer_campagne(db, campagne_id)
+    if asynchrone:
+        campagne = crud_campagne.get_campagne(db, campagne_id)
+        if not campagne:
+            raise HTTPException(status_code=404, detail="Campagne non trouvée")
+        if campagne.statut != StatutCampagneEnum.PLANIFIEE:
+            raise HTTPException(status_code=400, detail="La campagne doit être planifiée")
+        
+        campagne_tasks.enregistrer_progression(campagne_id, "en_attente", pourcentage=0)
+        task = campagne_tasks.lancer_campagne.delay(campagne_id)
+        return {
+            "success": True,
+            "campagne_id": campagne_id,
+            "task_id": task.id,
+            "message": "Lancement en cours"
+        }
+    
+    result = campagne_tasks.executer_lancement(campagne_id)
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
     
     return result
 
+@router.get("/{campagne_id}/lancement")
+def get_lancement_campagne(
+    campagne_id: int,
+    current_user: Utilisateur = Depends(get_current_active_user)
+):
+    """Avancement du dernier lancement de la campagne (24 h)"""
+    progression = campagne_tasks.lire_progression(campagne_id)
+    
+    if progression is None:
+        raise HTTPException(status_code=404, detail="Aucun lancement récent pour cette campagne")
+    
+    return {"campagne_id": campagne_id, **progression}
+
+@router.get("/{campagne_id}/variantes", response_model=List[VarianteResponse])
+def get_variantes(
+    campagne_id: int,
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Variantes (test A/B) d'une campagne"""
+    if not crud_campagne.get_campagne(db, campagne_id):
+        raise HTTPException(status_code=404, detail="Campagne non trouvée")
+    return variantes.get_variantes(db, campagne_id)
+
+@router.put("/{campagne_id}/variantes", response_model=List[VarianteResponse])
+def remplacer_variantes(
+    campagne_id: int,
+    nouvelles: List[VarianteCreate],
+    current_user: Utilisateur = Depends(require_manager),
+    db: Session = Depends(get_db)
+):
+    """
+    Définir les variantes d'une campagne planifiée (liste vide : template unique)
+    
+    Les cibles sont réparties au lancement, par hachage de (campagne,
+    dossier) : un même dossier reçoit toujours la même variante.
+    """
+    campagne = crud_campagne.get_campagne(db, campagne_id)
+    if not campagne:
+        raise HTTPException(status_code=404, detail="Campagne non trouvée")
+    if campagne.statut != StatutCampagneEnum.PLANIFIEE:
+        raise HTTPException(status_code=400, detail="Les variantes ne se modifient qu'avant le lancement")
+    # Lancement interrompu : la campagne reste planifiée mais des cibles
+    # référencent déjà leurs variantes (et les garderaient à la relance)
+    if crud_campagne.a_des_cibles(db, campagne_id):
+        raise HTTPException(status_code=409, detail="Des cibles ont déjà été affectées aux variantes actuelles")
+    _valider_variantes(db, nouvelles)
+    return crud_campagne.remplacer_variantes(db, campagne, nouvelles)
+
+@router.get("/{campagne_id}/variantes/resultats")
+def get_resultats_variantes(
+    campagne_id: int,
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Résultats du test A/B, en continu
+    
+    Lus sur les compteurs des variantes (une ligne par variante) : suivi en
+    direct sans relire les envois. Chaque variante est comparée à la
+    première : écart en points et p-valeur (ouverture, clic, réponse).
+    """
+    if not crud_campagne.get_campagne(db, campagne_id):
+        raise HTTPException(status_code=404, detail="Campagne non trouvée")
+    return {"campagne_id": campagne_id, "variantes": variantes.resultats(db, campagne_id)}
+
 @router.get("/{campagne_id}/stats", response_model=CampagneStats)
 def get_campagne_stats(
     campagne_id: int,
@@ -142,6 +294,28 @@ def get_campagne_stats(
         **stats
     )
 
+@router.post("/{campagne_id}/reconcilier")
+def reconcilier_compteurs(
+    campagne_id: int,
+    current_user: Utilisateur = Depends(require_manager),
+    db: Session = Depends(get_db)
+):
+    """Recalculer les compteurs de la campagne depuis ses cibles (fait chaque heure)"""
+    campagne = crud_campagne.get_campagne(db, campagne_id)
+    
+    if not campagne:
+        raise HTTPException(status_code=404, detail="Campagne non trouvée")
+    
+    ecarts = crud_campagne.reconcilier_compteurs(db, campagne_id)
+    # Codes des variantes recalées : liste, pas un couple (avant, après)
+    variantes_recalees = ecarts.pop("variantes", [])
+    
+    return {
+        "campagne_id": campagne_id,
+        "corrections": {k: {"avant": a, "apres": n} for k, (a, n) in ecarts.items()},
+        "variantes_recalees": variantes_recalees
+    }
+
 @router.post("/{campagne_id}/pause")
 def pause_campagne(
     campagne_id: int,
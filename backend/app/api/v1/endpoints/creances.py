@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 from app.core.database import get_db
 from app.core.security import get_current_active_user
-from app.core.permissions import check_dossier_access, filter_dossiers_by_role
+from app.core.permissions import check_dossier_access, filter_dossiers_by_role, dossier_scope_subquery
 from app.models.creance import Creance, StatutCreanceEnum
 from app.models.dossier_client import DossierClient
 from app.models.utilisateur import Utilisateur
 from app.schemas.creance import CreanceCreate, CreanceUpdate, CreanceResponse
+from app.utils.export import streaming_export
 
 router = APIRouter()
 
@@ -44,6 +46,53 @@ def get_creances(
     
     return query.offset(skip).limit(limit).all()
 
+@router.get("/export")
+def export_creances(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    dossier_id: Optional[int] = None,
+    statut: Optional[StatutCreanceEnum] = None,
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Exporter toutes les créances accessibles (CSV ou XLSX), en flux
+    
+    Même périmètre que GET /creances/, résolu par la base (sous-requête)
+    plutôt que par une liste d'ids.
+    """
+    stmt = select(
+        DossierClient.numero_dossier,
+        Creance.numero_contrat,
+        Creance.type_credit,
+        Creance.montant_initial,
+        Creance.montant_paye,
+        Creance.montant_restant,
+        Creance.date_echeance,
+        Creance.jours_retard,
+        Creance.statut,
+    ).join(DossierClient, DossierClient.id_dossier == Creance.id_dossier)
+    
+    scope = dossier_scope_subquery(current_user, db)
+    if scope is not None:
+        stmt = stmt.where(Creance.id_dossier.in_(scope))
+    if dossier_id:
+        stmt = stmt.where(Creance.id_dossier == dossier_id)
+    if statut:
+        stmt = stmt.where(Creance.statut == statut)
+    
+    columns = [
+        ("numero_dossier", "N° dossier"),
+        ("numero_contrat", "N° contrat"),
+        ("type_credit", "Type de crédit"),
+        ("montant_initial", "Montant initial"),
+        ("montant_paye", "Montant payé"),
+        ("montant_restant", "Montant restant"),
+        ("date_echeance", "Échéance"),
+        ("jours_retard", "Jours de retard"),
+        ("statut", "Statut"),
+    ]
+    return streaming_export(stmt.order_by(Creance.id_creance), columns, "creances", format)
+
 @router.get("/{id_creance}", response_model=CreanceResponse)
 def get_creance(
     id_creance: int,
@@ -136,6 +185,9 @@ def enregistrer_paiement(
     
     check_dossier_access(db_creance.id_dossier, current_user, db)
     
+    # Auteur du mouvement inscrit au journal des créances
+    db.info["id_utilisateur"] = current_user.id_utilisateur
+    
     montant_paye_actuel = Decimal(str(db_creance.montant_paye or 0))
     montant_initial     = Decimal(str(db_creance.montant_initial or 0))
     nouveau_paye        = montant_paye_actuel + Decimal(str(montant))
@@ -1,97 +1,178 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import datetime, timedelta
-from typing import List
+from sqlalchemy import func, select, true
+from datetime import datetime
+from typing import Dict, List, Optional
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_active_user
-from app.core.permissions import filter_dossiers_by_role
+from app.core.cache import cached_endpoint
+from app.core.permissions import dossier_scope_subquery, scope_agent_ids
+from app.services import portefeuille_cube, estimations
 from app.models.dossier_client import DossierClient, StatutDossierEnum
 from app.models.creance import Creance, StatutCreanceEnum
 from app.models.client import Client
 from app.models.utilisateur import Utilisateur
-from app.schemas.dashboard import DashboardStats, MonthlyPerformance, StatutDistribution
+from app.models.portefeuille_cube import PortefeuilleCube as Cube
+from app.models.mouvement_creance import MouvementCreance
+from app.schemas.dashboard import DashboardStats, MonthlyPerformance, StatutDistribution, Precision
 
 router = APIRouter()
 
+MONTH_NAMES = ["Jan","Fév","Mar","Avr","Mai","Juin","Juil","Aoû","Sep","Oct","Nov","Déc"]
+
+
+def _month_starts(count: int) -> List[datetime]:
+    """Premiers jours des `count` derniers mois (mois courant inclus), du plus ancien au plus récent"""
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1
+    return [
+        datetime(i // 12, i % 12 + 1, 1)
+        for i in range(index - count + 1, index + 2)   # + borne de fin exclue
+    ]
+
 
 @router.get("/stats", response_model=DashboardStats)
+@cached_endpoint("dashboard.stats")
 def get_dashboard_stats(
+    mois: int = Query(6, ge=1, le=60, description="Nombre de mois de la série de performance"),
+    precision: str = Query("exact", pattern="^(exact|approx)$", description="approx : estimations (périmètre global)"),
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     KPIs + charts data for the dashboard.
     All figures are scoped to what the current user can access.
-    """
-
-    # ── Dossiers accessibles ──────────────────────────────────────────────────
-    dossiers_q = db.query(DossierClient)
-    dossiers_q = filter_dossiers_by_role(dossiers_q, current_user, db)
-
-    accessible_ids = [d.id_dossier for d in dossiers_q.with_entities(DossierClient.id_dossier).all()]
 
-    # ── KPI: dossiers ─────────────────────────────────────────────────────────
-    total_dossiers  = len(accessible_ids)
-    dossiers_actifs = dossiers_q.filter(DossierClient.statut == StatutDossierEnum.ACTIF).count()
+    Trois requêtes quel que soit `mois` : dossiers (KPI + répartition par
+    statut) et totaux des créances, lus dans le cube pré-calculé dès qu'il
+    est construit, puis la série mensuelle des paiements encaissés, lue
+    dans le journal des mouvements de créances.
 
-    # ── KPI: créances ─────────────────────────────────────────────────────────
-    creances_q = db.query(Creance).filter(Creance.id_dossier.in_(accessible_ids))
-
-    montant_total_du = db.query(
-        func.coalesce(func.sum(Creance.montant_restant), 0)
-    ).filter(Creance.id_dossier.in_(accessible_ids)).scalar() or 0
+    precision=approx (DGA / Admin) : statuts d'après les statistiques de la
+    table, clients distincts d'après un HyperLogLog, montants d'après un
+    échantillon des créances ; marges d'erreur à 95 % dans `precision`.
+    """
 
-    montant_recouvre = db.query(
-        func.coalesce(func.sum(Creance.montant_paye), 0)
-    ).filter(Creance.id_dossier.in_(accessible_ids)).scalar() or 0
+    # ── Périmètre accessible (sous-requête, résolue par la base) ──────────────
+    scope = dossier_scope_subquery(current_user, db)
+    dossier_in_scope = true() if scope is None else DossierClient.id_dossier.in_(scope)
+    use_cube = portefeuille_cube.is_ready(db)
+
+    # ── Estimations (périmètre global, precision=approx) ──────────────────────
+    # Chaque KPI non estimable (statistiques absentes, sketch non construit,
+    # table trop petite) retombe sur le calcul exact ci-dessous
+    approx = precision == "approx" and scope is None
+    marges: Dict[str, Optional[float]] = {}
+    statut_counts = total_clients = montants = echantillon = None
+    if approx:
+        freqs = estimations.repartition(db, "dossiers_clients", "statut")
+        if freqs is not None:
+            statut_counts = [(StatutDossierEnum[v], n) for v, n in freqs.items() if n > 0]
+            marges["total_dossiers"] = None    # statistiques ANALYZE : pas de marge
+        clients = estimations.clients_distincts()
+        if clients is not None:
+            total_clients = clients["valeur"]
+            marges["total_clients"] = clients["marge"]
+        echantillon = estimations.echantillon_creances(db)
+        if echantillon is not None:
+            montants = (echantillon["montant_paye"]["valeur"], echantillon["montant_restant"]["valeur"])
+            marges["montant_recouvre"] = echantillon["montant_paye"]["marge"]
+            marges["montant_total_du"] = echantillon["montant_restant"]["marge"]
+            marges["taux_recouvrement"] = echantillon["taux_recouvrement"]["marge"]
+
+    # ── Dossiers : répartition par statut + clients distincts ─────────────────
+    # (clients distincts : non additif, toujours calculé sur les dossiers)
+    if statut_counts is None or total_clients is None:
+        total_clients_q = (
+            select(func.count(func.distinct(DossierClient.id_client)))
+            .where(dossier_in_scope)
+            .scalar_subquery()
+        )
+        if use_cube:
+            rows = portefeuille_cube.scoped(
+                db.query(
+                    Cube.statut_dossier,
+                    func.sum(Cube.nb_dossiers).label("count"),
+                    total_clients_q.label("total_clients"),
+                ),
+                scope_agent_ids(current_user, db),
+            ).group_by(Cube.statut_dossier).having(func.sum(Cube.nb_dossiers) > 0).all()
+            exact_counts = [(StatutDossierEnum[r.statut_dossier], int(r.count)) for r in rows]
+        else:
+            rows = db.query(
+                DossierClient.statut,
+                func.count(DossierClient.id_dossier).label("count"),
+                total_clients_q.label("total_clients"),
+            ).filter(dossier_in_scope).group_by(DossierClient.statut).all()
+            exact_counts = [(r.statut, r.count) for r in rows]
+        if statut_counts is None:
+            statut_counts = exact_counts
+        if total_clients is None:
+            total_clients = rows[0].total_clients if rows else 0
+
+    total_dossiers  = sum(count for _, count in statut_counts)
+    dossiers_actifs = sum(count for statut, count in statut_counts if statut == StatutDossierEnum.ACTIF)
+
+    # ── Créances : totaux ─────────────────────────────────────────────────────
+    creance_in_scope = true() if scope is None else Creance.id_dossier.in_(scope)
+    if montants is not None:
+        montant_recouvre, montant_total_du = montants
+    elif use_cube:
+        totals = portefeuille_cube.scoped(
+            db.query(
+                func.coalesce(func.sum(Cube.montant_paye), 0).label("recouvre"),
+                func.coalesce(func.sum(Cube.montant_restant), 0).label("restant"),
+            ),
+            scope_agent_ids(current_user, db),
+        ).one()
+        montant_recouvre, montant_total_du = totals.recouvre, totals.restant
+    else:
+        totals = db.query(
+            func.coalesce(func.sum(Creance.montant_paye), 0).label("recouvre"),
+            func.coalesce(func.sum(Creance.montant_restant), 0).label("restant"),
+        ).filter(creance_in_scope).one()
+        montant_recouvre, montant_total_du = totals.recouvre, totals.restant
 
     taux_recouvrement = (
         float(montant_recouvre) / float(montant_recouvre + montant_total_du) * 100
         if (montant_recouvre + montant_total_du) > 0 else 0
     )
 
-    # ── KPI: clients ──────────────────────────────────────────────────────────
-    total_clients = db.query(
-        func.count(func.distinct(DossierClient.id_client))
-    ).filter(DossierClient.id_dossier.in_(accessible_ids)).scalar() or 0
-
-    # ── Monthly performance (last 6 months) ───────────────────────────────────
-    monthly: List[MonthlyPerformance] = []
-    now = datetime.now()
-    month_names = ["Jan","Fév","Mar","Avr","Mai","Juin","Juil","Aoû","Sep","Oct","Nov","Déc"]
-
-    for i in range(5, -1, -1):
-        target_date = now - timedelta(days=30 * i)
-        m = target_date.month
-        y = target_date.year
-
-        recouvre = db.query(
-            func.coalesce(func.sum(Creance.montant_paye), 0)
-        ).join(DossierClient, Creance.id_dossier == DossierClient.id_dossier).filter(
-            Creance.id_dossier.in_(accessible_ids),
-            extract("month", DossierClient.date_ouverture) == m,
-            extract("year",  DossierClient.date_ouverture) == y,
-        ).scalar() or 0
+    # ── Monthly performance ───────────────────────────────────────────────────
+    # Paiements réellement encaissés chaque mois, lus dans le journal des
+    # mouvements (intervalle semi-ouvert sur date_mouvement, indexée)
+    bornes = _month_starts(mois)
+    mois_col = func.date_trunc("month", MouvementCreance.date_mouvement).label("mois")
+    serie = (
+        db.query(mois_col, func.sum(MouvementCreance.delta_paye).label("recouvre"))
+        .join(Creance, Creance.id_creance == MouvementCreance.id_creance)
+        .filter(
+            MouvementCreance.date_mouvement >= bornes[0],
+            MouvementCreance.date_mouvement < bornes[-1],
+            creance_in_scope,
+        )
+        .group_by(mois_col)
+        .all()
+    )
+    par_mois = {(r.mois.year, r.mois.month): r.recouvre for r in serie}
 
-        # Simple target: total_du / 6 per month — adjust to your own logic
-        objectif = float(montant_total_du + montant_recouvre) / 6
+    # Simple target: total_du / nb mois — adjust to your own logic
+    objectif = float(montant_total_du + montant_recouvre) / mois
 
+    monthly: List[MonthlyPerformance] = []
+    for start in bornes[:-1]:
+        label = MONTH_NAMES[start.month - 1]
+        if mois > 12:
+            label = f"{label} {start.year % 100:02d}"
         monthly.append(MonthlyPerformance(
-            month=month_names[m - 1],
-            recouvre=float(recouvre),
+            month=label,
+            recouvre=float(par_mois.get((start.year, start.month), 0)),
             objectif=round(objectif, 2),
         ))
 
     # ── Status distribution ───────────────────────────────────────────────────
-    statut_counts = db.query(
-        DossierClient.statut,
-        func.count(DossierClient.id_dossier).label("count")
-    ).filter(
-        DossierClient.id_dossier.in_(accessible_ids)
-    ).group_by(DossierClient.statut).all()
-
     COLOR_MAP = {
         StatutDossierEnum.ACTIF:      "#a4c639",
         StatutDossierEnum.CLOTURE:    "#7cc49c",
@@ -107,11 +188,11 @@ def get_dashboard_stats(
 
     status_distribution = [
         StatutDistribution(
-            name=LABEL_MAP.get(row.statut, row.statut),
-            value=row.count,
-            color=COLOR_MAP.get(row.statut, "#94a3b8"),
+            name=LABEL_MAP.get(statut, statut),
+            value=count,
+            color=COLOR_MAP.get(statut, "#94a3b8"),
         )
-        for row in statut_counts
+        for statut, count in statut_counts
     ]
 
     return DashboardStats(
@@ -123,4 +204,9 @@ def get_dashboard_stats(
         taux_recouvrement=round(taux_recouvrement, 1),
         monthly_performance=monthly,
         status_distribution=status_distribution,
+        precision=Precision(
+            mode="approx" if marges else "exact",
+            echantillon_pct=settings.APPROX_SAMPLE_PERCENT if echantillon is not None else None,
+            marges=marges,
+        ) if precision == "approx" else None,
     )
\ No newline at end of file
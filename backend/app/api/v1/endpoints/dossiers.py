@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List, Optional
 
 from app.core.database import get_db
@@ -8,15 +9,18 @@ from app.core.permissions import (
     filter_dossiers_by_role,
     check_dossier_access,
     require_manager,
-    get_user_scope_summary
+    get_user_scope_summary,
+    dossier_scope_subquery
 )
 from app.models.dossier_client import DossierClient, StatutDossierEnum, PrioriteEnum
+from app.models.client import Client
 from app.models.utilisateur import Utilisateur
 from app.schemas.dossier import (
     DossierCreate,
     DossierUpdate,
     DossierResponse
 )
+from app.utils.export import streaming_export
 
 router = APIRouter()
 
@@ -69,6 +73,59 @@ def get_dossiers(
     
     return dossiers
 
+@router.get("/export")
+def export_dossiers(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    statut: Optional[StatutDossierEnum] = None,
+    priorite: Optional[PrioriteEnum] = None,
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Exporter tous les dossiers accessibles (CSV ou XLSX)
+    
+    Remplace la pagination en boucle de GET /dossiers/ : les lignes sont
+    lues par curseur serveur et envoyées au fil de l'eau, sans limite ni
+    OFFSET, avec le même périmètre que la liste.
+    """
+    stmt = select(
+        DossierClient.numero_dossier,
+        Client.cin,
+        Client.nom,
+        Client.prenom,
+        Client.telephone,
+        DossierClient.statut,
+        DossierClient.priorite,
+        DossierClient.montant_total_du,
+        DossierClient.date_ouverture,
+        DossierClient.date_derniere_action,
+    ).join(Client, Client.id_client == DossierClient.id_client)
+    
+    scope = dossier_scope_subquery(current_user, db)
+    if scope is not None:
+        stmt = stmt.where(DossierClient.id_dossier.in_(scope))
+    if statut:
+        stmt = stmt.where(DossierClient.statut == statut)
+    if priorite:
+        stmt = stmt.where(DossierClient.priorite == priorite)
+    
+    # Tri sur la clé primaire : parcours d'index, premières lignes immédiates
+    stmt = stmt.order_by(DossierClient.id_dossier)
+    
+    columns = [
+        ("numero_dossier", "N° dossier"),
+        ("cin", "CIN"),
+        ("nom", "Nom"),
+        ("prenom", "Prénom"),
+        ("telephone", "Téléphone"),
+        ("statut", "Statut"),
+        ("priorite", "Priorité"),
+        ("montant_total_du", "Montant dû"),
+        ("date_ouverture", "Date d'ouverture"),
+        ("date_derniere_action", "Dernière action"),
+    ]
+    return streaming_export(stmt, columns, "dossiers", format)
+
 @router.get("/me/scope", response_model=dict)
 def get_my_scope(
     current_user: Utilisateur = Depends(get_current_active_user),
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
@@ -79,7 +79,7 @@ def get_messages_en_attente(
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Récupérer les messages en attente d'envoi"""
+    """Prochains messages de la file d'envoi (priorité puis ancienneté)"""
     messages = crud_message.get_messages_en_attente(db, type_message, limite)
     
     return {
@@ -88,6 +88,32 @@ def get_messages_en_attente(
         "messages": messages
     }
 
+@router.post("/file/reclamer", response_model=List[MessageResponse])
+def reclamer_messages(
+    limite: int = Query(100, ge=1, le=1000),
+    type_message: Optional[TypeMessageEnum] = None,
+    visibilite: Optional[int] = Query(None, ge=10, le=3600, description="Secondes avant remise en file"),
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Réserver des messages à envoyer
+    
+    Chaque expéditeur reçoit des messages distincts. Un message non acquitté
+    (marquer-envoye / marquer-echec) avant la fin du délai de visibilité
+    revient dans la file.
+    """
+    return crud_message.reclamer_messages(db, limite, type_message, visibilite)
+
+@router.post("/file/rejouer")
+def rejouer_messages(
+    ids_messages: List[int] = Body(..., max_length=1000),
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Remettre en file des messages abandonnés (file morte)"""
+    return {"remis_en_file": crud_message.rejouer_messages(db, ids_messages)}
+
 @router.post("/{message_id}/marquer-envoye")
 def marquer_envoye(
     message_id: int,
@@ -134,17 +160,21 @@ def marquer_echec(
     current_user: Utilisateur = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Marquer un message comme échoué"""
+    """Marquer un message comme échoué (nouvel essai différé tant que possible)"""
     message = crud_message.marquer_echec(db, message_id, code_erreur, message_erreur)
     
     if not message:
         raise HTTPException(status_code=404, detail="Message non trouvé")
     
+    reessai = message.statut == StatutMessageEnum.EN_ATTENTE
     return {
         "success": True,
-        "message": "Message marqué comme échoué",
+        "message": "Nouvel essai programmé" if reessai else "Message marqué comme échoué",
         "message_id": message_id,
-        "code_erreur": code_erreur
+        "code_erreur": code_erreur,
+        "statut": message.statut.value,
+        "tentatives": message.tentatives,
+        "prochain_essai": message.disponible_a if reessai else None
     }
 
 @router.get("/stats/global")
@@ -0,0 +1,49 @@
+"""
+routers/monitoring.py — Endpoints de supervision (DGA / Admin)
+
+GET /monitoring/metrics   ← métriques applicatives (login, ...)
+GET /monitoring/blacklist ← révocations de tokens (actives, par heure, expirations)
+GET /monitoring/cache     ← cache des réponses analytiques (taux de succès)
+"""
+
+from fastapi import APIRouter, Depends
+
+from app.core import cache, metrics, token_blacklist
+from app.core.permissions import require_dga_or_admin
+from app.models.utilisateur import Utilisateur
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics(
+    prefix: str = "",
+    current_user: Utilisateur = Depends(require_dga_or_admin),
+):
+    """
+    Métriques agrégées sur toutes les instances de l'API.
+    Les durées sont résumées en count / avg / p50 / p95 / p99 (ms).
+    """
+    return metrics.snapshot(prefix)
+
+
+@router.get("/blacklist")
+def get_blacklist_stats(
+    hours: int = 24,
+    current_user: Utilisateur = Depends(require_dga_or_admin),
+):
+    """
+    Révocations actives, révocations par heure et expirations prévues.
+    """
+    return token_blacklist.get_blacklist_stats(hours)
+
+
+@router.get("/cache")
+def get_cache_stats(
+    current_user: Utilisateur = Depends(require_dga_or_admin),
+):
+    """
+    Cache des réponses analytiques : succès, réponses périmées servies
+    et calculs par endpoint, génération d'invalidation courante.
+    """
+    return cache.stats()
@@ -0,0 +1,119 @@
+"""
+routers/sessions.py — Introspection et révocation des sessions (Admin)
+
+GET    /sessions                                ← nombre de sessions actives (par agence / région)
+GET    /sessions/utilisateurs/{id_utilisateur}  ← sessions d'un utilisateur
+DELETE /sessions/utilisateurs/{id_utilisateur}/{sid}  ← révoquer une session
+POST   /sessions/revoquer                       ← révocation en masse (utilisateurs / agences / régions)
+"""
+
+from typing import List, Optional
+
+import redis
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core import sessions
+from app.core.database import get_db
+from app.core.hierarchy import get_hierarchy, invalidate_hierarchy
+from app.core.permissions import require_admin, require_dga_or_admin
+from app.models.utilisateur import Utilisateur
+from app.schemas.session import (
+    SessionInfo,
+    RevocationRequest,
+    RevocationResult,
+    SessionCounts
+)
+
+router = APIRouter()
+
+
+@router.get("/", response_model=SessionCounts)
+def count_sessions(
+    agence_id: Optional[int] = None,
+    region_id: Optional[int] = None,
+    current_user: Utilisateur = Depends(require_dga_or_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Nombre de sessions actives par utilisateur, pour une agence, une région
+    ou toute l'organisation.
+    """
+    hierarchy = get_hierarchy(db)
+    if agence_id is not None:
+        user_ids = hierarchy.users_of_agence(agence_id)
+    elif region_id is not None:
+        user_ids = hierarchy.users_of_region(region_id)
+    else:
+        user_ids = hierarchy.user_agence.keys()
+
+    counts = sessions.count_sessions(sorted(user_ids))
+    return SessionCounts(total=sum(counts.values()), par_utilisateur=counts)
+
+
+@router.get("/utilisateurs/{id_utilisateur}", response_model=List[SessionInfo])
+def list_user_sessions(
+    id_utilisateur: int,
+    current_user: Utilisateur = Depends(require_dga_or_admin)
+):
+    """Sessions actives d'un utilisateur (IP, user-agent, dernier refresh)"""
+    return sessions.list_sessions([id_utilisateur]).get(id_utilisateur, [])
+
+
+@router.delete("/utilisateurs/{id_utilisateur}/{sid}")
+def revoke_user_session(
+    id_utilisateur: int,
+    sid: str,
+    current_user: Utilisateur = Depends(require_admin)
+):
+    """Révoquer une session : access et refresh tokens deviennent invalides"""
+    if not sessions.revoke_session(id_utilisateur, sid):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Révocation impossible (Redis indisponible)"
+        )
+    return {"message": "Session révoquée", "sid": sid}
+
+
+@router.post("/revoquer", response_model=RevocationResult)
+def revoke_bulk(
+    payload: RevocationRequest,
+    current_user: Utilisateur = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Révoquer en un appel toutes les sessions des utilisateurs ciblés
+
+    Les cibles (utilisateurs, agences, régions) se cumulent ; avec
+    `desactiver=true`, les comptes sont aussi désactivés par un UPDATE unique.
+    L'administrateur appelant n'est jamais ciblé.
+    """
+    hierarchy = get_hierarchy(db)
+    user_ids = set(payload.utilisateurs)
+    for agence_id in payload.agences:
+        user_ids |= hierarchy.users_of_agence(agence_id)
+    for region_id in payload.regions:
+        user_ids |= hierarchy.users_of_region(region_id)
+    user_ids.discard(current_user.id_utilisateur)
+
+    if not user_ids:
+        return RevocationResult(utilisateurs=0, sessions_revoquees=0)
+
+    desactives = 0
+    if payload.desactiver:
+        desactives = db.query(Utilisateur).filter(
+            Utilisateur.id_utilisateur.in_(sorted(user_ids)),
+            Utilisateur.actif == True
+        ).update({Utilisateur.actif: False}, synchronize_session=False)
+        db.commit()
+        # UPDATE en masse : pas d'événement ORM, invalidation explicite
+        invalidate_hierarchy()
+
+    try:
+        result = sessions.revoke_users(sorted(user_ids))
+    except redis.RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Révocation impossible (Redis indisponible): {e}"
+        )
+    return RevocationResult(desactives=desactives, **result)
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.core.database import get_db
 from app.core.security import get_current_active_user
-from app.core.permissions import require_manager
+from app.core.permissions import require_manager, dossier_scope_subquery
+from app.models.dossier_client import DossierClient
 from app.models.template import TypeTemplateEnum
 from app.models.utilisateur import Utilisateur
 from app.schemas.template import (
     TemplateCreate,
     TemplateUpdate,
     TemplateResponse,
-    TemplatePreview
+    TemplatePreview,
+    TemplateRenduDossier
 )
 from app.crud import template as crud_template
+from app.services import rendu_templates
+
+PREVIEW_DOSSIERS_MAX = 500
 
 router = APIRouter()
 
@@ -172,6 +178,37 @@ def preview_template(
         variables_utilisees=variables
     )
 
+@router.post("/{template_id}/preview-dossiers", response_model=List[TemplateRenduDossier])
+def preview_template_dossiers(
+    template_id: int,
+    ids_dossiers: List[int] = Body(..., max_length=PREVIEW_DOSSIERS_MAX),
+    current_user: Utilisateur = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Personnaliser un template pour une liste de dossiers (500 au plus)
+    
+    Variables lues en une requête pour tout le lot ; les dossiers hors du
+    périmètre de l'utilisateur sont ignorés.
+    """
+    db_template = crud_template.get_template(db, template_id)
+    
+    if not db_template:
+        raise HTTPException(status_code=404, detail="Template non trouvé")
+    
+    query = select(DossierClient.id_dossier).where(DossierClient.id_dossier.in_(ids_dossiers))
+    scope = dossier_scope_subquery(current_user, db)
+    if scope is not None:
+        query = query.where(DossierClient.id_dossier.in_(scope))
+    accessibles = set(db.execute(query).scalars())
+    ids = [i for i in dict.fromkeys(ids_dossiers) if i in accessibles]
+    
+    rendus = rendu_templates.personnaliser(db, db_template, ids)
+    return [
+        TemplateRenduDossier(id_dossier=i, objet_rendu=rendus[i][0], corps_rendu=rendus[i][1])
+        for i in ids
+    ]
+
 @router.get("/{template_id}/validate")
 def validate_template(
     template_id: int,
@@ -0,0 +1,244 @@
+"""
+Cache des réponses analytiques (Redis)
+
+Les endpoints /dashboard/stats et /analytics/portefeuille/* sont rafraîchis
+en continu par les managers alors que les chiffres ne changent qu'au gré
+des paiements, affectations et mises à jour de dossiers.
+
+Clés Redis:
+    - "cache:generation"                        : compteur d'invalidation
+    - "cache:{endpoint}:{périmètre}:{params}"   : JSON {"g": génération, "t": calculé le, "v": réponse}
+    - "cache:lock:{...}"                        : verrou de recalcul en arrière-plan
+
+Le périmètre est l'empreinte du rôle et de son rattachement (global, région,
+agence ou agent) plus la version de la hiérarchie : deux chefs de la même
+agence partagent la même entrée.
+
+Invalidation:
+    - Toute écriture ORM sur Creance / DossierClient / AffectationDossier
+      (enregistrer_paiement, affectations, mises à jour de dossiers...)
+      marque la session ; au commit, "cache:generation" est incrémenté
+    - Aucune clé n'est parcourue : une entrée d'une génération antérieure
+      ou plus vieille que CACHE_TTL_SECONDS est simplement périmée
+
+Stale-while-revalidate:
+    Une entrée périmée de moins de CACHE_STALE_SECONDS est servie telle
+    quelle et recalculée en arrière-plan (une seule fois grâce au verrou) ;
+    au-delà, ou sans entrée, le calcul est synchrone.
+
+Métriques: "cache.{endpoint}.hit" / ".stale" / ".miss" (GET /monitoring/cache)
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import redis
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.hierarchy import get_hierarchy
+from app.core.redis_client import redis_client
+from app.models.affectation_dossier import AffectationDossier
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient
+from app.models.utilisateur import Utilisateur, RoleEnum
+
+CACHE_PREFIX = "cache:"
+CACHE_GENERATION_KEY = "cache:generation"
+REVALIDATE_LOCK_SECONDS = 30
+
+# Paramètres d'endpoint qui ne font pas partie de la clé
+_EXCLUS = {"current_user", "db"}
+
+# Recalculs en arrière-plan (stale-while-revalidate)
+_revalidate_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-revalidate")
+
+
+# ========================
+# CLÉS
+# ========================
+
+def scope_fingerprint(user: Utilisateur, db: Session) -> str:
+    """Empreinte du périmètre : les utilisateurs au même périmètre partagent le cache"""
+    if user.role in (RoleEnum.DGA, RoleEnum.ADMIN):
+        scope = "global"
+    elif user.role == RoleEnum.CHEF_REGIONAL:
+        scope = f"region{user.id_region}"
+    elif user.role == RoleEnum.CHEF_AGENCE:
+        scope = f"agence{user.id_agence}"
+    else:
+        scope = f"agent{user.id_utilisateur}"
+    return f"{scope}.h{get_hierarchy(db).version}"
+
+
+def _cache_key(endpoint: str, scope: str, params: dict) -> str:
+    encoded = json.dumps(jsonable_encoder(params), sort_keys=True)
+    digest = hashlib.sha1(encoded.encode()).hexdigest()[:16]
+    return f"{CACHE_PREFIX}{endpoint}:{scope}:{digest}"
+
+
+def _store(key: str, generation: int, value) -> None:
+    entry = json.dumps({"g": generation, "t": time.time(), "v": value})
+    try:
+        redis_client.setex(key, settings.CACHE_STALE_SECONDS, entry)
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (écriture cache): {e}")
+
+
+def _generation() -> int:
+    return int(redis_client.get(CACHE_GENERATION_KEY) or 0)
+
+
+# ========================
+# DÉCORATEUR D'ENDPOINT
+# ========================
+
+def cached_endpoint(endpoint: str, ttl: Optional[int] = None) -> Callable:
+    """
+    Mettre en cache la réponse d'un endpoint synchrone
+
+    L'endpoint doit recevoir `current_user` et `db` en paramètres nommés ;
+    tous les autres paramètres entrent dans la clé. La fonction d'origine
+    reste accessible via `__wrapped__` (benchmarks, appels internes).
+
+    Usage:
+        @router.get("/portefeuille/summary")
+        @cached_endpoint("analytics.summary")
+        def get_portefeuille_summary(current_user = ..., db = ...):
+            ...
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            db = kwargs["db"]
+            params = {k: v for k, v in kwargs.items() if k not in _EXCLUS}
+            key = _cache_key(endpoint, scope_fingerprint(kwargs["current_user"], db), params)
+            try:
+                generation, raw = redis_client.mget(CACHE_GENERATION_KEY, key)
+            except redis.RedisError as e:
+                print(f"❌ Erreur Redis (lecture cache): {e}")
+                return func(*args, **kwargs)
+            generation = int(generation or 0)
+
+            if raw:
+                entry = json.loads(raw)
+                age = time.time() - entry["t"]
+                if entry["g"] == generation and age < (ttl or settings.CACHE_TTL_SECONDS):
+                    metrics.incr(f"cache.{endpoint}.hit")
+                    return entry["v"]
+                metrics.incr(f"cache.{endpoint}.stale")
+                _revalidate(key, func, args, kwargs)
+                return entry["v"]
+
+            metrics.incr(f"cache.{endpoint}.miss")
+            value = jsonable_encoder(func(*args, **kwargs))
+            _store(key, generation, value)
+            return value
+
+        # Annotations résolues : FastAPI évalue sinon les annotations
+        # différées (from __future__ import annotations) dans ce module-ci
+        wrapper.__signature__ = inspect.signature(func, eval_str=True)
+        return wrapper
+    return decorator
+
+
+def _revalidate(key: str, func: Callable, args, kwargs) -> None:
+    """Planifier le recalcul d'une entrée périmée (au plus un à la fois par clé)"""
+    try:
+        if not redis_client.set(f"{CACHE_PREFIX}lock:{key[len(CACHE_PREFIX):]}", "1",
+                                nx=True, ex=REVALIDATE_LOCK_SECONDS):
+            return
+    except redis.RedisError:
+        return
+    _revalidate_executor.submit(_recompute, key, func, args, dict(kwargs))
+
+
+def _recompute(key: str, func: Callable, args, kwargs) -> None:
+    # La session de la requête est fermée entre-temps : session dédiée
+    db = SessionLocal()
+    try:
+        generation = _generation()
+        kwargs["db"] = db
+        _store(key, generation, jsonable_encoder(func(*args, **kwargs)))
+    except Exception as e:
+        print(f"❌ Erreur recalcul cache {key}: {e}")
+    finally:
+        db.close()
+        try:
+            redis_client.delete(f"{CACHE_PREFIX}lock:{key[len(CACHE_PREFIX):]}")
+        except redis.RedisError:
+            pass
+
+
+# ========================
+# INVALIDATION
+# ========================
+
+def invalidate() -> None:
+    """Périmer toutes les réponses en cache (nouvelle génération)"""
+    try:
+        redis_client.incr(CACHE_GENERATION_KEY)
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (invalidation cache): {e}")
+
+
+def _mark_session(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["cache_changed"] = True
+
+
+for _model in (Creance, DossierClient, AffectationDossier):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("cache_changed", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("cache_changed", None)
+
+
+# ========================
+# STATISTIQUES
+# ========================
+
+def stats() -> dict:
+    """
+    Taux de succès par endpoint
+
+    Returns:
+        {"generation": n, "endpoints": {endpoint: {hit, stale, miss, hit_rate}}}
+    """
+    snapshot = metrics.snapshot("cache.")
+    if "error" in snapshot:
+        return snapshot
+
+    endpoints: dict = {}
+    for name, summary in snapshot.items():
+        endpoint, _, outcome = name[len("cache."):].rpartition(".")
+        endpoints.setdefault(endpoint, {"hit": 0, "stale": 0, "miss": 0})[outcome] = summary["count"]
+    for counts in endpoints.values():
+        total = counts["hit"] + counts["stale"] + counts["miss"]
+        # Une réponse périmée est servie depuis le cache : elle compte comme succès
+        counts["hit_rate"] = round((counts["hit"] + counts["stale"]) / total * 100, 1) if total else 0
+
+    try:
+        generation = _generation()
+    except redis.RedisError:
+        generation = None
+    return {"generation": generation, "endpoints": endpoints}
@@ -21,6 +21,78 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # JWT asymétrique (optionnel) — si JWT_PRIVATE_KEY_FILE est défini,
+    # les tokens sont signés en RS256/EdDSA et vérifiables sans secret partagé
+    JWT_PRIVATE_KEY_FILE: str = ""
+    JWT_ACTIVE_KID: str = ""
+    JWT_PUBLIC_KEYS_DIR: str = ""  # Clés publiques <kid>.pem (rotation)
+    
+    # Login : hachage bcrypt et anti brute-force
+    BCRYPT_ROUNDS: int = 12                  # Changer la valeur => rehash au prochain login
+    PASSWORD_HASH_WORKERS: int = 4           # Threads dédiés à bcrypt
+    PASSWORD_HASH_QUEUE_MAX: int = 32        # Au-delà : 503 plutôt que saturer l'API
+    LOGIN_MAX_ATTEMPTS_ACCOUNT: int = 5
+    LOGIN_MAX_ATTEMPTS_IP: int = 20
+    LOGIN_ATTEMPT_WINDOW_SECONDS: int = 900
+    TRUSTED_PROXIES: str = ""                # IP des reverse proxies (X-Forwarded-For), séparées par des virgules
+    
+    # Analytics : cube pré-agrégé du portefeuille (reconstruit chaque nuit)
+    CUBE_REBUILD_HOUR: int = 2
+    
+    # Objectifs des agents (statistiques et classement)
+    AGENT_OBJECTIF_MENSUEL: int = 20         # Dossiers résolus par mois
+    AGENT_CAPACITE_MAX: int = 20             # Dossiers actifs par agent
+    
+    # Cache des réponses analytiques (invalidé à chaque écriture)
+    CACHE_TTL_SECONDS: int = 300             # Fraîcheur maximale sans invalidation
+    CACHE_STALE_SECONDS: int = 3600          # Réponse périmée servie pendant le recalcul
+    
+    # Mode precision=approx (périmètre global) : échantillonnage des créances
+    APPROX_SAMPLE_PERCENT: float = 1.0       # % des blocs lus (TABLESAMPLE SYSTEM)
+    APPROX_MIN_ROWS: int = 100000            # En dessous : calcul exact
+    
+    # Lancement des campagnes : ciblage par tranches d'id_dossier
+    CAMPAGNE_LAUNCH_BATCH: int = 50000
+    CAMPAGNE_ATTRIBUTION_JOURS: int = 7      # Réponse sans message lié : dernier envoi de moins de 7 jours
+    
+    # Envoi des campagnes (dispatcher Celery)
+    DISPATCH_INTERVAL_SECONDS: int = 15      # Planification des workers d'envoi
+    DISPATCH_TASK_SECONDS: int = 60          # Durée max d'un worker avant relance
+    DISPATCH_PARALLELISME: int = 4           # Workers simultanés par campagne
+    DISPATCH_BATCH_SIZE: int = 100           # Cibles réservées par transaction
+    DISPATCH_RESERVATION_SECONDS: int = 600  # Cible réservée sans résultat au-delà : envoi interrompu
+    CANAL_SMS_ADAPTER: str = "app.services.canaux.SmsStub"
+    CANAL_EMAIL_ADAPTER: str = "app.services.canaux.EmailStub"
+    
+    # Politique de contact des débiteurs (toutes campagnes confondues)
+    CONTACT_MAX_PAR_JOUR: int = 1            # Fenêtre glissante de 24 h
+    CONTACT_MAX_PAR_SEMAINE: int = 3         # Fenêtre glissante de 7 jours
+    CONTACT_MAX_SMS_SEMAINE: int = 2
+    CONTACT_MAX_EMAIL_SEMAINE: int = 3
+    CONTACT_HEURE_DEBUT: int = 8             # Envois autorisés de 8 h à 20 h
+    CONTACT_HEURE_FIN: int = 20
+    CONTACT_JOURS: str = "0,1,2,3,4,5"       # Lundi=0 ; dimanche exclu
+    CONTACT_FUSEAU: str = "Africa/Tunis"
+    
+    # File des messages unitaires (réclamation par les expéditeurs)
+    FILE_MESSAGES_VISIBILITE_SECONDS: int = 300   # Message réclamé invisible pendant ce délai
+    FILE_MESSAGES_TENTATIVES_MAX: int = 5         # Au-delà : file morte (Abandonne)
+    FILE_MESSAGES_BACKOFF_SECONDS: int = 30       # 30 s, 60 s, 120 s... entre deux essais
+    FILE_MESSAGES_BACKOFF_MAX_SECONDS: int = 3600
+    
+    # Agents automatiques (traitement de la file des messages)
+    AGENTS_INTERVAL_SECONDS: int = 30        # Réveil du planificateur
+    AGENTS_RUN_SECONDS: int = 60             # Durée max d'une exécution d'agent
+    AGENTS_INTERVALLE_DEFAUT: int = 300      # Entre deux exécutions (configuration["intervalle_secondes"])
+    AGENTS_LOT_DEFAUT: int = 50              # Messages par lot (configuration["taille_lot"])
+    
+    # Export Parquet du portefeuille (analyse hors ligne)
+    EXPORT_DIR: str = "/app/exports"
+    EXPORT_BATCH_ROWS: int = 50000           # Lignes lues par lot (curseur serveur)
+    EXPORT_WATERMARK_OVERLAP_SECONDS: int = 300
+    EXPORT_HOUR: int = 3
+    EXPORT_FULL_DAY: int = 0                 # Jour de l'export complet (crontab : 0 = dimanche), incrémental les autres jours
+    
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:5173,http://localhost:8080"
     
@@ -33,9 +105,3 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 settings = Settings()
-
-# DEBUG
-print("=" * 70)
-print(f"🔐 SECRET_KEY chargée: {settings.SECRET_KEY}")
-print(f"🔑 ALGORITHM: {settings.ALGORITHM}")
-print("=" * 70)
@@ -0,0 +1,198 @@
+"""
+Index en mémoire de la hiérarchie organisationnelle
+
+Région → agences → utilisateurs, chargé au démarrage et consulté par les
+helpers de permissions à la place des sous-requêtes SQL répétées.
+
+Invalidation:
+    - Toute écriture sur Region / Agence / Utilisateur marque la session ;
+      au commit, la version locale est invalidée et le compteur Redis
+      "hierarchy:version" est incrémenté
+    - Les autres processus comparent leur version au compteur Redis au plus
+      une fois par HIERARCHY_CHECK_INTERVAL secondes et se rechargent
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, FrozenSet, Optional
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core.redis_client import redis_client
+from app.models.agence import Agence
+from app.models.region import Region
+from app.models.utilisateur import Utilisateur, RoleEnum
+
+HIERARCHY_VERSION_KEY = "hierarchy:version"
+HIERARCHY_CHECK_INTERVAL = 2.0  # secondes
+
+_EMPTY: FrozenSet[int] = frozenset()
+
+
+class HierarchyIndex:
+    """
+    Instantané immuable de la hiérarchie ; toutes les lectures sont en O(1)
+
+    Attributes:
+        version: version Redis au moment du chargement
+        agence_region: id_agence → id_region
+        region_agences: id_region → agences de la région
+        user_agence: id_utilisateur → id_agence (tous les utilisateurs)
+        agence_users: id_agence → tous les utilisateurs de l'agence
+        agence_users_actifs: id_agence → utilisateurs actifs (tous rôles)
+        region_agents_actifs: id_region → agents (rôle Agent) actifs
+        region_users: id_region → tous les utilisateurs de la région
+    """
+
+    def __init__(self, version: int, regions, agences, utilisateurs):
+        self.version = version
+        self.region_noms: Dict[int, str] = {r.id_region: r.nom_region for r in regions}
+        self.agence_noms: Dict[int, str] = {a.id_agence: a.nom_agence for a in agences}
+        self.agence_region: Dict[int, int] = {a.id_agence: a.id_region for a in agences}
+
+        region_agences = defaultdict(set)
+        for a in agences:
+            region_agences[a.id_region].add(a.id_agence)
+
+        user_agence: Dict[int, int] = {}
+        agence_users = defaultdict(set)
+        agence_users_actifs = defaultdict(set)
+        region_agents_actifs = defaultdict(set)
+        region_users = defaultdict(set)
+        for u in utilisateurs:
+            if u.id_agence is None:
+                continue
+            user_agence[u.id_utilisateur] = u.id_agence
+            agence_users[u.id_agence].add(u.id_utilisateur)
+            region_id = self.agence_region.get(u.id_agence)
+            if region_id is not None:
+                region_users[region_id].add(u.id_utilisateur)
+            if u.actif:
+                agence_users_actifs[u.id_agence].add(u.id_utilisateur)
+                if u.role == RoleEnum.AGENT and region_id is not None:
+                    region_agents_actifs[region_id].add(u.id_utilisateur)
+
+        self.user_agence = user_agence
+        self.region_agences = _freeze(region_agences)
+        self.agence_users = _freeze(agence_users)
+        self.agence_users_actifs = _freeze(agence_users_actifs)
+        self.region_agents_actifs = _freeze(region_agents_actifs)
+        self.region_users = _freeze(region_users)
+
+    def region_of_agence(self, agence_id: Optional[int]) -> Optional[int]:
+        return self.agence_region.get(agence_id)
+
+    def region_of_user(self, user_id: int) -> Optional[int]:
+        return self.agence_region.get(self.user_agence.get(user_id))
+
+    def agences_of_region(self, region_id: Optional[int]) -> FrozenSet[int]:
+        return self.region_agences.get(region_id, _EMPTY)
+
+    def active_users_of_agence(self, agence_id: Optional[int]) -> FrozenSet[int]:
+        return self.agence_users_actifs.get(agence_id, _EMPTY)
+
+    def active_agents_of_region(self, region_id: Optional[int]) -> FrozenSet[int]:
+        return self.region_agents_actifs.get(region_id, _EMPTY)
+
+    def users_of_agence(self, agence_id: Optional[int]) -> FrozenSet[int]:
+        return self.agence_users.get(agence_id, _EMPTY)
+
+    def users_of_region(self, region_id: Optional[int]) -> FrozenSet[int]:
+        return self.region_users.get(region_id, _EMPTY)
+
+
+def _freeze(mapping) -> Dict[int, FrozenSet[int]]:
+    return {k: frozenset(v) for k, v in mapping.items()}
+
+
+# ========================
+# CACHE DE PROCESSUS
+# ========================
+
+_lock = threading.Lock()
+_index: Optional[HierarchyIndex] = None
+_stale = True
+_last_check = 0.0
+
+
+def _remote_version() -> int:
+    try:
+        return int(redis_client.get(HIERARCHY_VERSION_KEY) or 0)
+    except redis.RedisError:
+        return -1  # Redis indisponible : seules les invalidations locales s'appliquent
+
+
+def load_hierarchy(db: Session) -> HierarchyIndex:
+    """Charger (ou recharger) l'index : trois requêtes légères"""
+    global _index, _stale, _last_check
+    version = _remote_version()
+    regions = db.query(Region.id_region, Region.nom_region).all()
+    agences = db.query(Agence.id_agence, Agence.id_region, Agence.nom_agence).all()
+    utilisateurs = db.query(
+        Utilisateur.id_utilisateur,
+        Utilisateur.id_agence,
+        Utilisateur.role,
+        Utilisateur.actif,
+    ).all()
+    index = HierarchyIndex(version, regions, agences, utilisateurs)
+    with _lock:
+        _index = index
+        _stale = False
+        _last_check = time.monotonic()
+    return index
+
+
+def get_hierarchy(db: Session) -> HierarchyIndex:
+    """
+    Index courant ; rechargé si invalidé localement ou par un autre processus
+    """
+    global _last_check
+    index = _index
+    if index is not None and not _stale:
+        now = time.monotonic()
+        if now - _last_check < HIERARCHY_CHECK_INTERVAL:
+            return index
+        _last_check = now
+        remote = _remote_version()
+        if remote == -1 or remote == index.version:
+            return index
+    return load_hierarchy(db)
+
+
+def invalidate_hierarchy() -> None:
+    """Invalider l'index de ce processus et notifier les autres"""
+    global _stale
+    _stale = True
+    try:
+        redis_client.incr(HIERARCHY_VERSION_KEY)
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (invalidation hiérarchie): {e}")
+
+
+# ========================
+# NOTIFICATIONS DE CHANGEMENT
+# ========================
+
+def _mark_session(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["hierarchy_changed"] = True
+
+
+for _model in (Region, Agence, Utilisateur):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("hierarchy_changed", False):
+        invalidate_hierarchy()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("hierarchy_changed", None)
@@ -0,0 +1,265 @@
+"""
+Signature et vérification JWT avec jeux de clés et rotation par `kid`
+
+Ce module remplace l'appel direct à `jose.jwt.decode` sur le chemin critique
+(chaque requête authentifiée). Les clés sont parsées une seule fois puis mises
+en cache ; la vérification se fait directement avec `cryptography` / `hmac`.
+
+Modes:
+    - HS256 (par défaut) : secret partagé SECRET_KEY, tokens sans `kid`
+    - RS256 / EdDSA      : clé privée JWT_PRIVATE_KEY_FILE (PEM RSA ou Ed25519)
+                           identifiée par JWT_ACTIVE_KID
+
+Rotation:
+    - Les anciennes clés publiques restent dans JWT_PUBLIC_KEYS_DIR
+      (un fichier <kid>.pem par clé) jusqu'à expiration de leurs tokens
+    - Les clés publiques sont exposées au format JWKS : les autres services
+      (service sentiment, réplicas) vérifient les tokens sans le secret
+"""
+
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
+
+from app.core.config import settings
+
+# Claims temporels convertis en timestamp (comme python-jose)
+_TIME_CLAIMS = ("exp", "iat", "nbf")
+
+
+def _b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _int_to_b64url(value: int) -> str:
+    return _b64url_encode(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def _algorithm_for_key(key: Any) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Type de clé non supporté: {type(key).__name__}")
+
+
+def _default_kid(public_key: Any) -> str:
+    """Identifiant stable dérivé de la clé publique (si JWT_ACTIVE_KID est vide)"""
+    der = public_key.public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+class KeySet:
+    """
+    Jeu de clés JWT parsées une fois pour toutes
+
+    Attributes:
+        signing_kid: kid de la clé de signature active (None en HS256)
+        signing_alg: algorithme de signature actif
+        verification_keys: {kid: (algorithme, clé)} ; la clé HS256 est
+            enregistrée sous le kid None (tokens sans en-tête `kid`)
+    """
+
+    def __init__(
+        self,
+        signing_alg: str,
+        signing_key: Any,
+        signing_kid: Optional[str] = None,
+        verification_keys: Optional[Dict[Optional[str], Tuple[str, Any]]] = None,
+    ):
+        self.signing_alg = signing_alg
+        self.signing_key = signing_key
+        self.signing_kid = signing_kid
+        self.verification_keys = dict(verification_keys or {})
+
+        header = {"alg": signing_alg, "typ": "JWT"}
+        if signing_kid:
+            header["kid"] = signing_kid
+        self._encoded_header = _b64url_encode(
+            json.dumps(header, separators=(",", ":")).encode()
+        )
+
+    # ── Signature ────────────────────────────────────────────────────────────
+
+    def _sign(self, alg: str, key: Any, signing_input: bytes) -> bytes:
+        if alg == "HS256":
+            return hmac.new(key, signing_input, hashlib.sha256).digest()
+        if alg == "RS256":
+            return key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+        if alg == "EdDSA":
+            return key.sign(signing_input)
+        raise ValueError(f"Algorithme non supporté: {alg}")
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """Signer un jeu de claims avec la clé active"""
+        payload = dict(claims)
+        for claim in _TIME_CLAIMS:
+            if isinstance(payload.get(claim), datetime):
+                payload[claim] = calendar.timegm(payload[claim].utctimetuple())
+
+        signing_input = (
+            self._encoded_header
+            + "."
+            + _b64url_encode(json.dumps(payload, separators=(",", ":"), default=str).encode())
+        )
+        signature = self._sign(self.signing_alg, self.signing_key, signing_input.encode("ascii"))
+        return signing_input + "." + _b64url_encode(signature)
+
+    # ── Vérification ─────────────────────────────────────────────────────────
+
+    def _verify_signature(self, alg: str, key: Any, signing_input: bytes, signature: bytes) -> bool:
+        if alg == "HS256":
+            expected = hmac.new(key, signing_input, hashlib.sha256).digest()
+            return hmac.compare_digest(expected, signature)
+        try:
+            if alg == "RS256":
+                key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+            elif alg == "EdDSA":
+                key.verify(signature, signing_input)
+            else:
+                return False
+        except InvalidSignature:
+            return False
+        return True
+
+    def decode(self, token: str) -> Optional[dict]:
+        """
+        Vérifier un token et retourner ses claims
+
+        Returns:
+            Les claims si la signature et les dates sont valides, None sinon
+        """
+        try:
+            encoded_header, encoded_payload, encoded_signature = token.split(".")
+            header = json.loads(_b64url_decode(encoded_header))
+        except (ValueError, TypeError):
+            return None
+        # En-tête mal formé : jamais d'exception (401 et non 500 côté API)
+        if not isinstance(header, dict):
+            return None
+        kid = header.get("kid")
+        if kid is not None and not isinstance(kid, str):
+            return None
+
+        entry = self.verification_keys.get(kid)
+        # L'algorithme est imposé par la clé, jamais par l'en-tête du token
+        if entry is None or header.get("alg") != entry[0]:
+            return None
+
+        alg, key = entry
+        try:
+            signature = _b64url_decode(encoded_signature)
+            signing_input = f"{encoded_header}.{encoded_payload}".encode("ascii")
+        except (ValueError, TypeError):
+            return None
+        if not self._verify_signature(alg, key, signing_input, signature):
+            return None
+
+        try:
+            payload = json.loads(_b64url_decode(encoded_payload))
+        except (ValueError, TypeError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+
+        now = time.time()
+        exp = payload.get("exp")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp <= now):
+            return None
+        nbf = payload.get("nbf")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            return None
+
+        return payload
+
+    # ── Publication ──────────────────────────────────────────────────────────
+
+    def jwks(self) -> dict:
+        """Clés publiques au format JWKS (les clés HMAC ne sont jamais exposées)"""
+        keys = []
+        for kid, (alg, key) in self.verification_keys.items():
+            if alg == "RS256":
+                numbers = key.public_numbers()
+                keys.append({
+                    "kty": "RSA", "use": "sig", "alg": alg, "kid": kid,
+                    "n": _int_to_b64url(numbers.n),
+                    "e": _int_to_b64url(numbers.e),
+                })
+            elif alg == "EdDSA":
+                raw = key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+                keys.append({
+                    "kty": "OKP", "use": "sig", "alg": alg, "kid": kid,
+                    "crv": "Ed25519", "x": _b64url_encode(raw),
+                })
+        return {"keys": keys}
+
+
+def build_keyset(
+    secret_key: str,
+    algorithm: str = "HS256",
+    private_key_file: str = "",
+    active_kid: str = "",
+    public_keys_dir: str = "",
+) -> KeySet:
+    """
+    Construire un jeu de clés à partir de la configuration
+
+    Le secret HS256 reste accepté en vérification pour les tokens sans `kid`
+    (tokens émis avant le passage aux clés asymétriques).
+    """
+    if algorithm != "HS256":
+        raise ValueError(f"ALGORITHM={algorithm} non supporté (HS256, ou clé asymétrique)")
+    hmac_key = secret_key.encode()
+    verification_keys: Dict[Optional[str], Tuple[str, Any]] = {None: ("HS256", hmac_key)}
+
+    if public_keys_dir:
+        for path in sorted(Path(public_keys_dir).glob("*.pem")):
+            public_key = serialization.load_pem_public_key(path.read_bytes())
+            verification_keys[path.stem] = (_algorithm_for_key(public_key), public_key)
+
+    if not private_key_file:
+        return KeySet("HS256", hmac_key, verification_keys=verification_keys)
+
+    private_key = serialization.load_pem_private_key(
+        Path(private_key_file).read_bytes(), password=None
+    )
+    alg = _algorithm_for_key(private_key)
+    kid = active_kid or _default_kid(private_key.public_key())
+    verification_keys[kid] = (alg, private_key.public_key())
+    return KeySet(alg, private_key, signing_kid=kid, verification_keys=verification_keys)
+
+
+@lru_cache(maxsize=1)
+def get_keyset() -> KeySet:
+    """Jeu de clés de l'application (parsé une seule fois par processus)"""
+    return build_keyset(
+        settings.SECRET_KEY,
+        settings.ALGORITHM,
+        settings.JWT_PRIVATE_KEY_FILE,
+        settings.JWT_ACTIVE_KID,
+        settings.JWT_PUBLIC_KEYS_DIR,
+    )
+
+
+def reload_keyset() -> KeySet:
+    """Recharger les clés après une rotation (nouveau fichier dans JWT_PUBLIC_KEYS_DIR)"""
+    get_keyset.cache_clear()
+    return get_keyset()
@@ -0,0 +1,197 @@
+"""
+Protection des endpoints de login
+
+- Limiteur de tentatives Redis par compte et par IP : la tentative est
+  réservée atomiquement (INCR) AVANT tout calcul bcrypt, une attaque par
+  force brute ne consomme pas de CPU et des essais concurrents ne peuvent
+  pas dépasser le quota
+- Vérification bcrypt déportée dans un pool de threads dédié et borné :
+  une vague de logins ne peut plus occuper le threadpool de l'API
+- Rehash automatique au login quand BCRYPT_ROUNDS augmente
+- Métriques : latence, attente en file, refus (voir app.core.metrics)
+- Côté asynchrone, tous les appels Redis (limiteur, métriques) passent par
+  le threadpool : un Redis lent ne bloque pas la boucle d'événements
+
+Clés Redis:
+    - "login_attempts:account:{email}" : tentatives (échecs et essais en cours)
+                                         sur la fenêtre, remis à zéro au succès
+    - "login_attempts:ip:{ip}"         : idem par adresse IP, succès décomptés
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import redis
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.core.security import bcrypt_input, pwd_context
+
+# Pool dédié au hachage : bcrypt libère le GIL, les threads tournent en parallèle
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_pending_lock = threading.Lock()
+_pending = 0
+
+
+def _account_key(email: str) -> str:
+    return f"login_attempts:account:{email.strip().lower()}"
+
+
+def _ip_key(ip: str) -> str:
+    return f"login_attempts:ip:{ip}"
+
+
+# ========================
+# LIMITEUR DE TENTATIVES
+# ========================
+
+def reserve_login_attempt(email: str, ip: Optional[str]) -> None:
+    """
+    Compter la tentative AVANT bcrypt et la refuser au-delà du quota
+
+    INCR + EXPIRE NX dans un même pipeline : des tentatives concurrentes
+    reçoivent chacune une valeur distincte, le quota ne peut pas être
+    dépassé (la fenêtre démarre à la première tentative). Une tentative
+    réussie est décomptée par record_login_success.
+
+    Raises:
+        HTTPException 429 avec l'en-tête Retry-After
+    """
+    keys = [_account_key(email)] + ([_ip_key(ip)] if ip else [])
+    limits = [settings.LOGIN_MAX_ATTEMPTS_ACCOUNT, settings.LOGIN_MAX_ATTEMPTS_IP]
+    window = settings.LOGIN_ATTEMPT_WINDOW_SECONDS
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        for key in keys:
+            pipe.incr(key)
+            pipe.expire(key, window, nx=True)
+            pipe.ttl(key)
+        results = pipe.execute()
+    except redis.RedisError as e:
+        # Limiteur indisponible : on laisse passer plutôt que bloquer tous les logins
+        print(f"❌ Erreur Redis (limiteur login): {e}")
+        return
+
+    for i, limit in enumerate(limits[:len(keys)]):
+        attempts, ttl = results[3 * i], results[3 * i + 2]
+        if attempts > limit:
+            metrics.incr("login.bloque")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Trop de tentatives de connexion. Réessayez plus tard.",
+                headers={"Retry-After": str(max(ttl, 1))},
+            )
+
+
+def record_login_success(email: str, ip: Optional[str]) -> None:
+    """Remettre à zéro le compteur du compte ; l'IP ne garde que ses échecs"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.delete(_account_key(email))
+        if ip:
+            pipe.decr(_ip_key(ip))
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+# ========================
+# HACHAGE DÉPORTÉ
+# ========================
+
+async def verify_password_offloaded(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifier un mot de passe dans le pool bcrypt dédié
+
+    Returns:
+        (valide, nouveau_hash) ; nouveau_hash est renseigné quand le hash
+        stocké utilise un coût inférieur à BCRYPT_ROUNDS
+
+    Raises:
+        HTTPException 503 si la file d'attente du pool est pleine
+    """
+    global _pending
+    with _pending_lock:
+        saturated = _pending >= settings.PASSWORD_HASH_QUEUE_MAX
+        if not saturated:
+            _pending += 1
+        pending = _pending
+    if saturated:
+        await run_in_threadpool(metrics.incr, "login.file_pleine")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service de connexion saturé. Réessayez dans quelques secondes.",
+            headers={"Retry-After": "2"},
+        )
+    await run_in_threadpool(metrics.gauge, "login.file_attente", pending)
+
+    enqueued_at = time.perf_counter()
+
+    def _verify() -> Tuple[bool, Optional[str]]:
+        metrics.observe("login.attente_hash", time.perf_counter() - enqueued_at)
+        return pwd_context.verify_and_update(bcrypt_input(plain_password), hashed_password)
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, _verify)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+            pending = _pending
+        await run_in_threadpool(metrics.gauge, "login.file_attente", pending)
+
+
+async def authenticate_user_async(
+    db: Session,
+    email: str,
+    password: str,
+    ip: Optional[str] = None
+):
+    """
+    Authentifier un utilisateur sans bloquer l'API
+
+    Équivalent asynchrone de `security.authenticate_user` : limiteur, puis
+    lecture de l'utilisateur, puis bcrypt dans le pool dédié.
+    """
+    from app.models.utilisateur import Utilisateur
+
+    started_at = time.perf_counter()
+    await run_in_threadpool(reserve_login_attempt, email, ip)
+
+    user = await run_in_threadpool(
+        lambda: db.query(Utilisateur).filter(Utilisateur.email == email).first()
+    )
+    valid = False
+    if user:
+        valid, new_hash = await verify_password_offloaded(password, user.mot_de_passe)
+        if valid and new_hash:
+            user.mot_de_passe = new_hash
+            await run_in_threadpool(db.commit)
+            await run_in_threadpool(metrics.incr, "login.rehash")
+
+    elapsed = time.perf_counter() - started_at
+
+    def _record() -> None:
+        metrics.observe("login.latence", elapsed)
+        if valid:
+            record_login_success(email, ip)
+            metrics.incr("login.succes")
+        else:
+            # Échec déjà compté par reserve_login_attempt
+            metrics.incr("login.echec")
+
+    await run_in_threadpool(_record)
+    return user if valid else False
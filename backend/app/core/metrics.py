@@ -0,0 +1,117 @@
+"""
+Métriques applicatives partagées entre instances (Redis)
+
+Chaque métrique est un hash Redis "metrics:{nom}" :
+    - compteur : champ "count"
+    - durée    : champs "count", "sum" et un histogramme "le_{borne}"
+    - jauge    : champ "value"
+
+Les noms sont enregistrés dans le set "metrics:index" pour que le
+snapshot n'ait jamais besoin de parcourir le keyspace.
+
+Les erreurs Redis sont ignorées : une métrique ne doit jamais faire
+échouer une requête.
+"""
+
+from typing import Dict, Optional
+
+import redis
+
+from app.core.redis_client import redis_client
+
+METRICS_PREFIX = "metrics:"
+METRICS_INDEX = "metrics:index"
+
+# Bornes de l'histogramme des durées (secondes)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Incrémenter un compteur"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(METRICS_PREFIX + name, "count", amount)
+        pipe.sadd(METRICS_INDEX, name)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def observe(name: str, seconds: float) -> None:
+    """Enregistrer une durée (latence, attente en file...)"""
+    try:
+        key = METRICS_PREFIX + name
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(key, "count", 1)
+        pipe.hincrbyfloat(key, "sum", seconds)
+        for bound in DURATION_BUCKETS:
+            if seconds <= bound:
+                pipe.hincrby(key, f"le_{bound}", 1)
+                break
+        else:
+            pipe.hincrby(key, "le_inf", 1)
+        pipe.sadd(METRICS_INDEX, name)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def gauge(name: str, value: float) -> None:
+    """Fixer la valeur courante d'une jauge"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(METRICS_PREFIX + name, "value", value)
+        pipe.sadd(METRICS_INDEX, name)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _quantile(fields: Dict[str, str], count: int, q: float) -> Optional[float]:
+    """Quantile approché (borne supérieure du bucket) à partir de l'histogramme"""
+    if count <= 0:
+        return None
+    target = q * count
+    cumulated = 0
+    for bound in DURATION_BUCKETS:
+        cumulated += int(fields.get(f"le_{bound}", 0))
+        if cumulated >= target:
+            return bound
+    return None  # Au-delà de la dernière borne
+
+
+def _summarize(fields: Dict[str, str]) -> dict:
+    if "value" in fields:
+        return {"value": float(fields["value"])}
+    count = int(fields.get("count", 0))
+    if "sum" not in fields:
+        return {"count": count}
+    total = float(fields.get("sum", 0))
+    return {
+        "count": count,
+        "avg_ms": round(total / count * 1000, 2) if count else 0,
+        "p50_ms": _ms(_quantile(fields, count, 0.50)),
+        "p95_ms": _ms(_quantile(fields, count, 0.95)),
+        "p99_ms": _ms(_quantile(fields, count, 0.99)),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def snapshot(prefix: str = "") -> dict:
+    """
+    Lire toutes les métriques (éventuellement filtrées par préfixe)
+
+    Returns:
+        {nom: résumé} ; les durées sont résumées en count/avg/p50/p95/p99
+    """
+    try:
+        names = sorted(n for n in redis_client.smembers(METRICS_INDEX) if n.startswith(prefix))
+        pipe = redis_client.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(METRICS_PREFIX + name)
+        return {name: _summarize(fields) for name, fields in zip(names, pipe.execute())}
+    except redis.RedisError as e:
+        return {"error": str(e)}
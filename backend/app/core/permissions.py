@@ -12,15 +12,17 @@ Hiérarchie des rôles (du plus restreint au plus large) :
 """
 
 from fastapi import Depends, HTTPException, status
+from sqlalchemy import select, false
 from sqlalchemy.orm import Session, Query
-from typing import List, Optional
+from sqlalchemy.sql import Select
+from typing import FrozenSet, List, Optional
 
 from app.core.security import get_current_active_user
 from app.core.database import get_db
+from app.core.hierarchy import get_hierarchy
 from app.models.utilisateur import Utilisateur, RoleEnum
 from app.models.dossier_client import DossierClient
 from app.models.affectation_dossier import AffectationDossier
-from app.models.agence import Agence
 from app.models.client import Client
 
 # ========================
@@ -119,14 +121,11 @@ def filter_dossiers_by_role(
     
     # Chef d'Agence : Dossiers des agents de son agence
     if user.role == RoleEnum.CHEF_AGENCE:
-        # Sous-requête : agents de son agence
-        agents_agence = db.query(Utilisateur.id_utilisateur).filter(
-            Utilisateur.id_agence == user.id_agence,
-            Utilisateur.actif == True
-        ).subquery()
+        # Utilisateurs actifs de l'agence, lus dans l'index hiérarchique
+        agents_agence = get_hierarchy(db).active_users_of_agence(user.id_agence)
         
         return query.join(AffectationDossier).filter(
-            AffectationDossier.id_agent.in_(agents_agence),
+            AffectationDossier.id_agent.in_(sorted(agents_agence)),
             AffectationDossier.actif == True
         )
     
@@ -136,25 +135,58 @@ def filter_dossiers_by_role(
         if not user.id_region:
             return query.filter(False)
         
-        # Récupérer les agences de sa région
-        agences_region = db.query(Agence.id_agence).filter(
-            Agence.id_region == user.id_region
-        ).subquery()
-        
-        # Récupérer les agents de ces agences
-        agents_region = db.query(Utilisateur.id_utilisateur).filter(
-            Utilisateur.id_agence.in_(agences_region),
-            Utilisateur.role == RoleEnum.AGENT,
-            Utilisateur.actif == True
-        ).subquery()
+        # Agents actifs des agences de sa région
+        agents_region = get_hierarchy(db).active_agents_of_region(user.id_region)
         
         return query.join(AffectationDossier).filter(
-            AffectationDossier.id_agent.in_(agents_region),
+            AffectationDossier.id_agent.in_(sorted(agents_region)),
             AffectationDossier.actif == True
         )
     
     return query.filter(False)
 
+def scope_agent_ids(user: Utilisateur, db: Session) -> Optional[FrozenSet[int]]:
+    """
+    Agents dont les dossiers sont accessibles à l'utilisateur
+    
+    Returns:
+        None pour un accès global (DGA/Admin), sinon l'ensemble des agents
+        (vide si le rôle ou son rattachement ne donne accès à rien)
+    """
+    if user.role in [RoleEnum.DGA, RoleEnum.ADMIN]:
+        return None
+    
+    if user.role == RoleEnum.AGENT:
+        return frozenset([user.id_utilisateur])
+    
+    if user.role == RoleEnum.CHEF_AGENCE:
+        return get_hierarchy(db).active_users_of_agence(user.id_agence)
+    
+    if user.role == RoleEnum.CHEF_REGIONAL and user.id_region:
+        return get_hierarchy(db).active_agents_of_region(user.id_region)
+    
+    return frozenset()
+
+def dossier_scope_subquery(user: Utilisateur, db: Session) -> Optional[Select]:
+    """
+    Sous-requête des id_dossier accessibles, à combiner avec `.in_()`
+    
+    Même logique que filter_dossiers_by_role, mais sans matérialiser la
+    liste des ids côté Python : la base résout le périmètre dans la même
+    requête que l'agrégation.
+    
+    Returns:
+        None pour un accès global (DGA/Admin), sinon un SELECT id_dossier
+    """
+    agents = scope_agent_ids(user, db)
+    if agents is None:
+        return None
+    
+    scope = select(AffectationDossier.id_dossier).where(AffectationDossier.actif == True)
+    if not agents:
+        return scope.where(false())
+    return scope.where(AffectationDossier.id_agent.in_(sorted(agents)))
+
 # ========================
 # VÉRIFICATION D'ACCÈS À UN DOSSIER SPÉCIFIQUE
 # ========================
@@ -204,13 +236,13 @@ def check_dossier_access(
             )
         return True
     
+    hierarchy = get_hierarchy(db)
+    
     # Chef d'Agence : Vérifier que l'agent est de son agence
     if user.role == RoleEnum.CHEF_AGENCE:
-        agent = db.query(Utilisateur).filter(
-            Utilisateur.id_utilisateur == affectation.id_agent
-        ).first()
+        agent_agence_id = hierarchy.user_agence.get(affectation.id_agent)
         
-        if not agent or agent.id_agence != user.id_agence:
+        if agent_agence_id is None or agent_agence_id != user.id_agence:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Ce dossier n'appartient pas à votre agence"
@@ -226,27 +258,23 @@ def check_dossier_access(
                 detail="Votre région n'est pas configurée"
             )
         
-        agent = db.query(Utilisateur).filter(
-            Utilisateur.id_utilisateur == affectation.id_agent
-        ).first()
+        agent_agence_id = hierarchy.user_agence.get(affectation.id_agent)
         
-        if not agent:
+        if agent_agence_id is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Agent non trouvé"
             )
         
-        agent_agence = db.query(Agence).filter(
-            Agence.id_agence == agent.id_agence
-        ).first()
+        agent_region_id = hierarchy.region_of_agence(agent_agence_id)
         
-        if not agent_agence:
+        if agent_region_id is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Agence de l'agent non trouvée"
             )
         
-        if agent_agence.id_region != user.id_region:
+        if agent_region_id != user.id_region:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Ce dossier n'appartient pas à votre région"
@@ -294,13 +322,11 @@ def filter_utilisateurs_by_role(
         if not user.id_region:
             return query.filter(False)
         
-        # Récupérer les agences de sa région
-        agences_region = db.query(Agence.id_agence).filter(
-            Agence.id_region == user.id_region
-        ).subquery()
+        # Agences de sa région, lues dans l'index hiérarchique
+        agences_region = get_hierarchy(db).agences_of_region(user.id_region)
         
         return query.filter(
-            Utilisateur.id_agence.in_(agences_region)
+            Utilisateur.id_agence.in_(sorted(agences_region))
         )
     
     return query.filter(False)
@@ -344,14 +370,12 @@ def can_modify_user(
         if not current_user.id_region:
             return False
         
-        target_agence = db.query(Agence).filter(
-            Agence.id_agence == target_user.id_agence
-        ).first()
+        target_region_id = get_hierarchy(db).region_of_agence(target_user.id_agence)
         
-        if not target_agence:
+        if target_region_id is None:
             return False
         
-        return target_agence.id_region == current_user.id_region
+        return target_region_id == current_user.id_region
     
     return False
 
@@ -367,33 +391,30 @@ def get_user_scope_summary(user: Utilisateur, db: Session) -> dict:
             "description": "Accès à toutes les données"
         }
     
+    hierarchy = get_hierarchy(db)
+    
     if user.role == RoleEnum.CHEF_REGIONAL:
         # ✅ CORRIGÉ : Utiliser id_region directement
         if user.id_region:
-            from app.models.region import Region
-            region = db.query(Region).filter(
-                Region.id_region == user.id_region
-            ).first()
+            region_nom = hierarchy.region_noms.get(user.id_region)
             
             return {
                 "role": user.role.value,
                 "scope": "region",
                 "region_id": user.id_region,
-                "region_nom": region.nom_region if region else "Inconnue",
-                "description": f"Accès aux données de la région {region.nom_region if region else ''}"
+                "region_nom": region_nom or "Inconnue",
+                "description": f"Accès aux données de la région {region_nom or ''}"
             }
     
     if user.role == RoleEnum.CHEF_AGENCE:
-        agence = db.query(Agence).filter(
-            Agence.id_agence == user.id_agence
-        ).first()
+        agence_nom = hierarchy.agence_noms.get(user.id_agence)
         
         return {
             "role": user.role.value,
             "scope": "agence",
             "agence_id": user.id_agence,
-            "agence_nom": agence.nom_agence if agence else "Inconnue",
-            "description": f"Accès aux données de l'agence {agence.nom_agence if agence else ''}"
+            "agence_nom": agence_nom or "Inconnue",
+            "description": f"Accès aux données de l'agence {agence_nom or ''}"
         }
     
     if user.role == RoleEnum.AGENT:
@@ -0,0 +1,88 @@
+"""
+Seaux à jetons Redis (limitation de débit partagée entre workers)
+
+Un seau par clé, hash Redis {"jetons", "maj"} : capacité C, rechargé de
+C / periode jetons par seconde. La recharge et le prélèvement se font dans
+un script Lua, donc atomiquement, quel que soit le nombre de processus qui
+puisent dans le même seau.
+
+Usage (agents automatiques : capacite_max messages par heure):
+    accordes = prendre(f"agent:{id_agent}", demande, capacite=agent.capacite_max)
+    ...
+    rendre(f"agent:{id_agent}", inutilises, capacite=agent.capacite_max)
+"""
+
+import redis
+
+from app.core.redis_client import redis_client
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+
+# KEYS[1] = seau ; ARGV = capacité, jetons/seconde, demande
+# L'heure est celle du serveur Redis : pas de dérive entre les horloges des workers
+# demande > 0 : prélève au plus `demande` jetons disponibles, renvoie le nombre accordé
+# demande < 0 : restitue des jetons (plafonnés à la capacité), renvoie 0
+_TOKEN_BUCKET_LUA = """
+local capacite = tonumber(ARGV[1])
+local debit = tonumber(ARGV[2])
+local demande = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local maintenant = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local etat = redis.call('HMGET', KEYS[1], 'jetons', 'maj')
+local jetons = tonumber(etat[1])
+local maj = tonumber(etat[2])
+if jetons == nil then
+    jetons = capacite
+    maj = maintenant
+end
+
+jetons = math.min(capacite, jetons + math.max(0, maintenant - maj) * debit)
+
+local accordes = 0
+if demande > 0 then
+    accordes = math.min(demande, math.floor(jetons))
+    jetons = jetons - accordes
+else
+    jetons = math.min(capacite, jetons - demande)
+end
+
+redis.call('HSET', KEYS[1], 'jetons', jetons, 'maj', maintenant)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacite / debit) + 60)
+return accordes
+"""
+
+_token_bucket = redis_client.register_script(_TOKEN_BUCKET_LUA)
+
+
+def prendre(cle: str, demande: int, capacite: int, periode: float = 3600) -> int:
+    """
+    Prélever jusqu'à `demande` jetons
+
+    Returns:
+        nombre de jetons accordés (0 si le seau est vide ou Redis indisponible)
+    """
+    if demande <= 0 or capacite <= 0:
+        return 0
+    try:
+        return int(_token_bucket(
+            keys=[RATE_LIMIT_PREFIX + cle],
+            args=[capacite, capacite / periode, demande],
+        ))
+    except redis.RedisError as e:
+        # Limiteur indisponible : on n'envoie rien plutôt que dépasser le quota
+        print(f"❌ Erreur Redis (limiteur {cle}): {e}")
+        return 0
+
+
+def rendre(cle: str, jetons: int, capacite: int, periode: float = 3600) -> None:
+    """Restituer des jetons prélevés mais non consommés"""
+    if jetons <= 0 or capacite <= 0:
+        return
+    try:
+        _token_bucket(
+            keys=[RATE_LIMIT_PREFIX + cle],
+            args=[capacite, capacite / periode, -jetons],
+        )
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (limiteur {cle}): {e}")
@@ -0,0 +1,18 @@
+"""
+Connexion Redis partagée
+
+Un seul pool de connexions par processus, configuré par REDIS_URL.
+"""
+
+import redis
+
+from app.core.config import settings
+
+# Connexion Redis avec pool de connexions
+redis_client = redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    max_connections=50,
+    socket_keepalive=True,
+    socket_connect_timeout=5
+)
@@ -0,0 +1,155 @@
+"""
+Mise à niveau du schéma des bases existantes
+
+Base.metadata.create_all crée les tables manquantes mais ne touche pas aux
+tables déjà présentes : les colonnes, index et contraintes ajoutés ensuite aux modèles
+sont appliqués ici, au démarrage, de façon idempotente.
+
+Chaque étape est une liste d'ordres SQL exécutés dans une transaction
+(nettoyage éventuel des doublons, puis création "IF NOT EXISTS").
+"""
+
+from typing import List, Tuple
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# (description, ordres SQL)
+_ETAPES: List[Tuple[str, List[str]]] = [
+    (
+        "reprise unique des créances (journal des mouvements)",
+        [
+            # Reprises en double (démarrages simultanés) : on garde la première
+            """
+            DELETE FROM mouvements_creances m
+            USING mouvements_creances premier
+            WHERE m.id_creance = premier.id_creance
+              AND m.type_mouvement = 'REPRISE'
+              AND premier.type_mouvement = 'REPRISE'
+              AND m.id_mouvement > premier.id_mouvement
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_indexes WHERE indexname = 'uq_mouvements_creances_reprise'
+              )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_mouvements_creances_reprise
+                ON mouvements_creances (id_creance) WHERE type_mouvement = 'REPRISE'
+            """,
+        ],
+    ),
+    (
+        "ciblage unique des campagnes",
+        [
+            # Doublons hérités des lancements répétés : on garde la première
+            # ligne, après y avoir rattaché les messages des doublons (FK)
+            """
+            UPDATE messages m SET id_campagne_client = premier.id
+            FROM campagnes_clients cc
+            JOIN LATERAL (
+                SELECT min(p.id) AS id FROM campagnes_clients p
+                WHERE p.id_campagne = cc.id_campagne AND p.id_dossier = cc.id_dossier
+            ) premier ON premier.id < cc.id
+            WHERE m.id_campagne_client = cc.id
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_indexes WHERE indexname = 'uq_campagnes_clients_cible'
+              )
+            """,
+            """
+            DELETE FROM campagnes_clients cc
+            USING campagnes_clients premier
+            WHERE cc.id_campagne = premier.id_campagne
+              AND cc.id_dossier = premier.id_dossier
+              AND cc.id > premier.id
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_indexes WHERE indexname = 'uq_campagnes_clients_cible'
+              )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_campagnes_clients_cible
+                ON campagnes_clients (id_campagne, id_dossier)
+            """,
+        ],
+    ),
+    (
+        "index de segmentation des campagnes",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_creances_dossier ON creances (id_dossier, jours_retard)",
+            "CREATE INDEX IF NOT EXISTS ix_interactions_dossier_date "
+            "ON interactions (id_dossier, date_interaction)",
+            "CREATE INDEX IF NOT EXISTS ix_reponses_clients_dossier_date "
+            "ON reponses_clients (id_dossier, date_reponse)",
+            "CREATE INDEX IF NOT EXISTS ix_analyses_nlp_reponse ON analyses_nlp (id_reponse)",
+            "CREATE INDEX IF NOT EXISTS ix_affectations_agent_actif "
+            "ON affectations_dossiers (id_agent, id_dossier) WHERE actif",
+        ],
+    ),
+    (
+        "statut EnPause des campagnes",
+        [
+            # Les enums ORM sont stockés par nom dans un type Postgres natif
+            "ALTER TYPE statutcampagneenum ADD VALUE IF NOT EXISTS 'EN_PAUSE' AFTER 'EN_COURS'",
+        ],
+    ),
+    (
+        "report des envois (politique de contact)",
+        [
+            "ALTER TABLE campagnes_clients ADD COLUMN IF NOT EXISTS date_report TIMESTAMPTZ",
+        ],
+    ),
+    (
+        "statut Abandonne des messages",
+        [
+            "ALTER TYPE statutmessageenum ADD VALUE IF NOT EXISTS 'ABANDONNE'",
+        ],
+    ),
+    (
+        "file d'envoi des messages",
+        [
+            """
+            ALTER TABLE messages
+                ADD COLUMN IF NOT EXISTS priorite SMALLINT NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS tentatives INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS disponible_a TIMESTAMPTZ NOT NULL DEFAULT now()
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_messages_file
+                ON messages (priorite DESC, id_message) WHERE statut = 'EN_ATTENTE'
+            """,
+        ],
+    ),
+    (
+        "variantes des campagnes (tests A/B)",
+        [
+            """
+            ALTER TABLE campagnes_clients
+                ADD COLUMN IF NOT EXISTS id_variante INTEGER REFERENCES campagnes_variantes (id_variante),
+                ADD COLUMN IF NOT EXISTS date_reponse TIMESTAMPTZ
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_campagnes_clients_dossier_envoi
+                ON campagnes_clients (id_dossier, date_envoi)
+            """,
+        ],
+    ),
+    (
+        "réservation des envois et identifiant fournisseur",
+        [
+            "ALTER TABLE campagnes_clients ADD COLUMN IF NOT EXISTS date_reservation TIMESTAMPTZ",
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS id_externe VARCHAR(100)",
+            "CREATE INDEX IF NOT EXISTS ix_messages_id_externe ON messages (id_externe)",
+        ],
+    ),
+]
+
+
+def mettre_a_niveau(engine: Engine) -> None:
+    """Appliquer les étapes de mise à niveau (à appeler après create_all)"""
+    for description, ordres in _ETAPES:
+        try:
+            with engine.begin() as conn:
+                for ordre in ordres:
+                    conn.execute(text(ordre))
+        except Exception as e:
+            logger.error(f"❌ Mise à niveau du schéma ({description}) : {e}")
+            raise
@@ -1,50 +1,47 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import os
-import redis
+
+from app.core.config import settings
+from app.core.jwt_keys import get_keyset
+from app.core import token_blacklist
+from app.core.redis_client import redis_client
+from app.core.sessions import new_token_id, revoked_key
 
 # Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-me-in-production-2024")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-print("="*70)
-print(f"🔐 SECRET_KEY chargée: {SECRET_KEY}")
-print(f"🔑 ALGORITHM: {ALGORITHM}")
-print("="*70)
-
 # Contexte de hachage de mot de passe - CORRECTION ICI
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds = BCRYPT_ROUNDS : un hash moins coûteux est signalé "à mettre à jour"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
 
 # OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-# Redis pour blacklist
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "redis"),
-    port=int(os.getenv("REDIS_PORT", "6379")),
-    db=int(os.getenv("REDIS_DB", "0")),
-    decode_responses=True
-)
+def bcrypt_input(password: str) -> str:
+    """Tronquer le mot de passe à 72 bytes pour bcrypt"""
+    if len(password.encode('utf-8')) > 72:
+        password = password[:72]
+    return password
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Vérifier un mot de passe - AVEC LIMITE 72 BYTES"""
-    # Tronquer le mot de passe à 72 bytes pour bcrypt
-    if len(plain_password.encode('utf-8')) > 72:
-        plain_password = plain_password[:72]
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context.verify(bcrypt_input(plain_password), hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hasher un mot de passe - AVEC LIMITE 72 BYTES"""
-    # Tronquer le mot de passe à 72 bytes pour bcrypt
-    if len(password.encode('utf-8')) > 72:
-        password = password[:72]
-    return pwd_context.hash(password)
+    return pwd_context.hash(bcrypt_input(password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Créer un token JWT"""
@@ -53,20 +50,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": new_token_id()})
+    return get_keyset().encode(to_encode)
 
 def decode_access_token(token: str) -> dict:
-    """Décoder un token JWT"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+    """Décoder un token JWT (clés parsées en cache, voir app.core.jwt_keys)"""
+    return get_keyset().decode(token)
 
 def blacklist_token(token: str):
-    """Ajouter un token à la blacklist"""
+    """Ajouter un token à la blacklist (clé hashée + index de statistiques)"""
     try:
         payload = decode_access_token(token)
         if payload:
@@ -74,17 +66,42 @@ def blacklist_token(token: str):
             if exp:
                 ttl = exp - int(datetime.utcnow().timestamp())
                 if ttl > 0:
-                    redis_client.setex(f"blacklist:{token}", ttl, "1")
+                    token_blacklist.blacklist_token(token, ttl)
     except Exception as e:
         print(f"Erreur blacklist: {e}")
 
 def is_token_blacklisted(token: str) -> bool:
     """Vérifier si un token est blacklisté"""
     try:
-        return redis_client.exists(f"blacklist:{token}") > 0
+        # L'ancienne clé en clair reste vérifiée jusqu'à l'expiration des tokens concernés
+        return redis_client.exists(token_blacklist.blacklist_key(token), f"blacklist:{token}") > 0
     except:
         return False
 
+def is_token_revoked(token: str, payload: dict) -> bool:
+    """
+    Token blacklisté, session révoquée ou utilisateur déconnecté globalement ?
+    
+    Un seul aller-retour Redis pour les trois vérifications.
+    """
+    keys = [token_blacklist.blacklist_key(token), f"blacklist:{token}"]
+    if payload.get("sid"):
+        keys.append(revoked_key(payload["sid"]))
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.exists(*keys)
+        pipe.get(f"user_logout:{payload.get('user_id')}")
+        revoked, logout_at = pipe.execute()
+    except Exception:
+        return False
+    if revoked:
+        return True
+    # Déconnexion globale postérieure à l'émission (tokens sans iat : émis avant).
+    # iat est en secondes entières : un login dans la seconde qui suit la
+    # déconnexion ne doit pas être révoqué (les tokens avec sid le sont par
+    # leur session)
+    return logout_at is not None and int(float(logout_at)) > payload.get("iat", 0)
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(lambda: None)
@@ -99,17 +116,17 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Vérifier blacklist
-    if is_token_blacklisted(token):
+    payload = decode_access_token(token)
+    if payload is None:
+        raise credentials_exception
+    
+    # Vérifier blacklist et révocations de session
+    if is_token_revoked(token, payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has been revoked"
         )
     
-    payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-    
     email: str = payload.get("sub")
     if email is None:
         raise credentials_exception
@@ -147,7 +164,6 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(days=7)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+        expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": new_token_id()})
+    return get_keyset().encode(to_encode)
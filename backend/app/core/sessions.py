@@ -0,0 +1,211 @@
+"""
+Index des sessions actives et révocation en masse
+
+Une session naît au login et porte un identifiant "sid" partagé par
+l'access token et le refresh token ; chaque token a en plus son propre "jti".
+
+Clés Redis:
+    - "sessions:{user_id}"     : sorted set {sid: expiration} des sessions d'un utilisateur
+    - "session:{sid}"          : hash (user_id, créée le, IP, user-agent, dernier refresh)
+    - "revoked_session:{sid}"  : marqueur de révocation, TTL = durée de vie restante
+
+Toutes les écritures d'une révocation (une session, un utilisateur ou
+toute une agence / région) sont envoyées dans un seul pipeline.
+"""
+
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+
+SESSION_TTL_SECONDS = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+
+
+def _user_key(user_id: int) -> str:
+    return f"sessions:{user_id}"
+
+
+def _session_key(sid: str) -> str:
+    return f"session:{sid}"
+
+
+def revoked_key(sid: str) -> str:
+    """Clé du marqueur de révocation d'une session"""
+    return f"revoked_session:{sid}"
+
+
+def new_token_id() -> str:
+    """Identifiant unique de token (claim "jti") ou de session (claim "sid")"""
+    return uuid.uuid4().hex
+
+
+# ========================
+# CYCLE DE VIE
+# ========================
+
+def open_session(user_id: int, ip: Optional[str] = None, user_agent: Optional[str] = None) -> str:
+    """
+    Enregistrer une nouvelle session au login
+
+    Returns:
+        sid à inclure dans les claims des tokens émis
+    """
+    sid = new_token_id()
+    now = time.time()
+    expires_at = now + SESSION_TTL_SECONDS
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_session_key(sid), mapping={
+            "user_id": user_id,
+            "created_at": int(now),
+            "last_refresh": int(now),
+            "ip": ip or "",
+            "user_agent": (user_agent or "")[:200],
+        })
+        pipe.expireat(_session_key(sid), int(expires_at))
+        pipe.zadd(_user_key(user_id), {sid: expires_at})
+        pipe.zremrangebyscore(_user_key(user_id), "-inf", now)
+        pipe.expireat(_user_key(user_id), int(expires_at))
+        pipe.execute()
+    except redis.RedisError as e:
+        # La session reste utilisable : seul l'index est incomplet
+        print(f"❌ Erreur Redis (ouverture session): {e}")
+    return sid
+
+
+def touch_session(user_id: int, sid: str) -> None:
+    """Prolonger une session lors d'un refresh"""
+    now = time.time()
+    expires_at = now + SESSION_TTL_SECONDS
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_session_key(sid), "last_refresh", int(now))
+        pipe.expireat(_session_key(sid), int(expires_at))
+        pipe.zadd(_user_key(user_id), {sid: expires_at})
+        pipe.expireat(_user_key(user_id), int(expires_at))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (refresh session): {e}")
+
+
+def is_session_revoked(sid: str) -> bool:
+    try:
+        return redis_client.exists(revoked_key(sid)) > 0
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (vérification session): {e}")
+        return False
+
+
+# ========================
+# INTROSPECTION
+# ========================
+
+def list_sessions(user_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """
+    Sessions actives de plusieurs utilisateurs (deux allers-retours Redis)
+
+    Returns:
+        {user_id: [session, ...]} ; les utilisateurs sans session sont omis
+    """
+    user_ids = list(user_ids)
+    now = time.time()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zrangebyscore(_user_key(user_id), now, "+inf", withscores=True)
+    per_user = pipe.execute()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for entries in per_user:
+        for sid, _ in entries:
+            pipe.hgetall(_session_key(sid))
+    details = iter(pipe.execute())
+
+    result: Dict[int, List[dict]] = {}
+    for user_id, entries in zip(user_ids, per_user):
+        sessions = []
+        for sid, expires_at in entries:
+            info = next(details)
+            sessions.append({
+                "sid": sid,
+                "created_at": _int_or_none(info.get("created_at")),
+                "last_refresh": _int_or_none(info.get("last_refresh")),
+                "expires_at": int(expires_at),
+                "ip": info.get("ip") or None,
+                "user_agent": info.get("user_agent") or None,
+            })
+        if sessions:
+            result[user_id] = sessions
+    return result
+
+
+def count_sessions(user_ids: Iterable[int]) -> Dict[int, int]:
+    """Nombre de sessions actives par utilisateur (un seul aller-retour)"""
+    user_ids = list(user_ids)
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zcount(_user_key(user_id), now, "+inf")
+    return {uid: n for uid, n in zip(user_ids, pipe.execute()) if n}
+
+
+def _int_or_none(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+# ========================
+# RÉVOCATION
+# ========================
+
+def revoke_session(user_id: int, sid: str) -> bool:
+    """Révoquer une session (access et refresh tokens associés)"""
+    try:
+        expires_at = redis_client.zscore(_user_key(user_id), sid)
+        ttl = int(expires_at - time.time()) if expires_at else SESSION_TTL_SECONDS
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.setex(revoked_key(sid), max(ttl, 1), "revoked")
+        pipe.delete(_session_key(sid))
+        pipe.zrem(_user_key(user_id), sid)
+        pipe.execute()
+        return True
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (révocation session): {e}")
+        return False
+
+
+def revoke_users(user_ids: Iterable[int]) -> dict:
+    """
+    Révoquer toutes les sessions d'un ensemble d'utilisateurs
+
+    Deux allers-retours quel que soit le nombre d'utilisateurs : lecture
+    des index de sessions, puis un pipeline unique d'écritures. Le marqueur
+    "user_logout:{id}" couvre aussi les tokens émis sans sid.
+
+    Returns:
+        {"utilisateurs": n, "sessions_revoquees": n}
+    """
+    user_ids = list(user_ids)
+    now = time.time()
+
+    read = redis_client.pipeline(transaction=False)
+    for user_id in user_ids:
+        read.zrangebyscore(_user_key(user_id), now, "+inf", withscores=True)
+    per_user = read.execute()
+
+    revoked = 0
+    write = redis_client.pipeline(transaction=False)
+    for user_id, entries in zip(user_ids, per_user):
+        for sid, expires_at in entries:
+            write.setex(revoked_key(sid), max(int(expires_at - now), 1), "revoked")
+            write.delete(_session_key(sid))
+            revoked += 1
+        write.delete(_user_key(user_id))
+        write.setex(f"user_logout:{user_id}", SESSION_TTL_SECONDS, str(now))
+    write.execute()
+
+    print(f"🚫 {revoked} sessions révoquées pour {len(user_ids)} utilisateurs")
+    return {"utilisateurs": len(user_ids), "sessions_revoquees": revoked}
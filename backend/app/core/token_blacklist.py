@@ -9,6 +9,10 @@ Architecture:
     - Valeur: "revoked"
     - TTL: Temps restant avant expiration du token
 
+Statistiques (sans SCAN du keyspace):
+    - "blacklist_stats:active" : sorted set {token_hash: timestamp d'expiration}
+    - "blacklist_stats:hour:{AAAAMMJJHH}" : révocations par heure (UTC)
+
 Sécurité:
     - Tokens révoqués automatiquement supprimés après expiration
     - Pas de stockage permanent des tokens
@@ -17,18 +21,15 @@ Sécurité:
 
 import redis
 import hashlib
+import time
 from typing import Optional
 from datetime import datetime, timedelta
-from app.core.config import settings
+from app.core.redis_client import redis_client
 
-# Connexion Redis avec pool de connexions
-redis_client = redis.from_url(
-    settings.REDIS_URL,
-    decode_responses=True,
-    max_connections=50,
-    socket_keepalive=True,
-    socket_connect_timeout=5
-)
+BLACKLIST_INDEX = "blacklist_stats:active"
+BLACKLIST_HOURLY_PREFIX = "blacklist_stats:hour:"
+HOURLY_RETENTION_SECONDS = 7 * 24 * 3600
+FORECAST_HOURS = (1, 6, 24)
 
 def _hash_token(token: str) -> str:
     """
@@ -44,6 +45,13 @@ def _hash_token(token: str) -> str:
     """
     return hashlib.sha256(token.encode()).hexdigest()
 
+def blacklist_key(token: str) -> str:
+    """Clé Redis de révocation d'un token"""
+    return f"blacklist:{_hash_token(token)}"
+
+def _hour_bucket(timestamp: float) -> str:
+    return datetime.utcfromtimestamp(timestamp).strftime("%Y%m%d%H")
+
 def blacklist_token(token: str, expires_in_seconds: int) -> bool:
     """
     Ajouter un token à la blacklist avec expiration automatique
@@ -64,13 +72,21 @@ def blacklist_token(token: str, expires_in_seconds: int) -> bool:
     """
     try:
         token_hash = _hash_token(token)
+        now = time.time()
+        hour_key = BLACKLIST_HOURLY_PREFIX + _hour_bucket(now)
         
-        # Stocker dans Redis avec expiration automatique
-        redis_client.setex(
+        # Révocation + index des statistiques en un seul aller-retour
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.setex(
             name=f"blacklist:{token_hash}",
             time=expires_in_seconds,
             value="revoked"
         )
+        pipe.zadd(BLACKLIST_INDEX, {token_hash: now + expires_in_seconds})
+        pipe.zremrangebyscore(BLACKLIST_INDEX, "-inf", now)
+        pipe.incr(hour_key)
+        pipe.expire(hour_key, HOURLY_RETENTION_SECONDS)
+        pipe.execute()
         
         # Log pour audit
         print(f"🚫 Token révoqué (expire dans {expires_in_seconds}s)")
@@ -121,15 +137,14 @@ def revoke_all_user_tokens(user_id: int) -> bool:
         True si l'opération a réussi
         
     Note:
-        Cette fonction nécessite de maintenir une liste des tokens actifs par utilisateur
+        Les sessions actives sont lues dans l'index "sessions:{user_id}"
+        (voir app.core.sessions) ; le flag "user_logout:{user_id}" couvre
+        les tokens émis sans identifiant de session
     """
+    from app.core.sessions import revoke_users
+    
     try:
-        # Stocker un flag indiquant que tous les tokens de cet utilisateur sont invalides
-        redis_client.setex(
-            name=f"user_logout:{user_id}",
-            time=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-            value=str(datetime.utcnow().timestamp())
-        )
+        revoke_users([user_id])
         
         print(f"🚫 Tous les tokens de l'utilisateur {user_id} révoqués")
         return True
@@ -165,27 +180,52 @@ def is_user_logged_out(user_id: int, token_issued_at: datetime) -> bool:
         print(f"❌ Erreur lors de la vérification de logout global: {e}")
         return False
 
-def get_blacklist_stats() -> dict:
+def get_blacklist_stats(hours: int = 24) -> dict:
     """
     Obtenir des statistiques sur la blacklist (pour monitoring)
     
+    Lit le sorted set d'index et les compteurs horaires : aucun parcours
+    du keyspace, coût indépendant du nombre de clés Redis.
+    
+    Args:
+        hours: Nombre d'heures d'historique des révocations (max 7 jours)
+    
     Returns:
         Dictionnaire avec les statistiques
     """
+    hours = max(1, min(hours, HOURLY_RETENTION_SECONDS // 3600))
+    now = time.time()
+    buckets = [_hour_bucket(now - h * 3600) for h in range(hours - 1, -1, -1)]
+    
     try:
-        # Compter les tokens blacklistés
-        pattern = "blacklist:*"
-        cursor = 0
-        count = 0
-        
-        while True:
-            cursor, keys = redis_client.scan(cursor, match=pattern, count=100)
-            count += len(keys)
-            if cursor == 0:
-                break
+        pipe = redis_client.pipeline(transaction=False)
+        # Purger les entrées expirées (les clés elles-mêmes expirent via leur TTL)
+        pipe.zremrangebyscore(BLACKLIST_INDEX, "-inf", now)
+        pipe.zcard(BLACKLIST_INDEX)
+        for h in FORECAST_HOURS:
+            pipe.zcount(BLACKLIST_INDEX, now, now + h * 3600)
+        pipe.zrange(BLACKLIST_INDEX, -1, -1, withscores=True)
+        pipe.mget([BLACKLIST_HOURLY_PREFIX + b for b in buckets])
+        results = pipe.execute()
+        
+        active = results[1]
+        forecasts = results[2:2 + len(FORECAST_HOURS)]
+        last = results[2 + len(FORECAST_HOURS)]
+        hourly = [int(v or 0) for v in results[-1]]
         
         return {
-            "tokens_blacklisted": count,
+            "tokens_blacklisted": active,
+            "revocations_par_heure": {
+                datetime.strptime(b, "%Y%m%d%H").strftime("%Y-%m-%dT%H:00Z"): n
+                for b, n in zip(buckets, hourly)
+            },
+            "revocations_periode": sum(hourly),
+            "expirations_prevues": {
+                f"{h}h": n for h, n in zip(FORECAST_HOURS, forecasts)
+            },
+            "derniere_expiration": (
+                datetime.utcfromtimestamp(last[0][1]).isoformat() if last else None
+            ),
             "redis_connected": True
         }
         
@@ -193,4 +233,4 @@ def get_blacklist_stats() -> dict:
         return {
             "error": str(e),
             "redis_connected": False
-        }
\ No newline at end of file
+        }
@@ -1,9 +1,9 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
 
 from app.models.agent_auto import AgentAuto, TypeAgentEnum, StatutAgentEnum
 from app.schemas.agent_auto import AgentAutoCreate, AgentAutoUpdate
+from app.services import agents_auto
 
 def get_agent(db: Session, agent_id: int) -> Optional[AgentAuto]:
     return db.query(AgentAuto).filter(AgentAuto.id_agent == agent_id).first()
@@ -74,6 +74,8 @@ def changer_statut(
         return None
     
     db_agent.statut = nouveau_statut
+    if nouveau_statut == StatutAgentEnum.ACTIF:
+        db_agent.date_prochain_run = None  # Réveillé au prochain passage du planificateur
     
     db.commit()
     db.refresh(db_agent)
@@ -84,17 +86,10 @@ def incrementer_messages_traites(
     agent_id: int,
     nombre: int = 1
 ) -> Optional[AgentAuto]:
-    """Incrémenter le compteur de messages traités"""
-    db_agent = get_agent(db, agent_id)
-    if not db_agent:
-        return None
-    
-    db_agent.messages_traites += nombre
-    db_agent.date_dernier_run = datetime.now()
-    
+    """Incrémenter le compteur de messages traités (UPDATE atomique)"""
+    agents_auto.compter_traites(db, {agent_id: nombre})
     db.commit()
-    db.refresh(db_agent)
-    return db_agent
+    return get_agent(db, agent_id)
 
 def get_agent_stats(db: Session, agent_id: int) -> dict:
     """Obtenir les statistiques d'un agent"""
@@ -102,7 +97,9 @@ def get_agent_stats(db: Session, agent_id: int) -> dict:
     if not agent:
         return None
     
-    taux_utilisation = (agent.messages_traites / agent.capacite_max * 100) if agent.capacite_max > 0 else 0
+    # Utilisation de la capacité horaire sur l'heure glissante
+    derniere_heure = agents_auto.traites_derniere_heure(agent.id_agent)
+    taux_utilisation = agents_auto.utilisation(agent.id_agent, agent.capacite_max) or 0
     
     return {
         "id_agent": agent.id_agent,
@@ -110,9 +107,11 @@ def get_agent_stats(db: Session, agent_id: int) -> dict:
         "type": agent.type.value,
         "statut": agent.statut.value,
         "messages_traites": agent.messages_traites,
+        "messages_derniere_heure": derniere_heure,
         "capacite_max": agent.capacite_max,
-        "taux_utilisation": round(taux_utilisation, 2),
-        "date_dernier_run": agent.date_dernier_run
+        "taux_utilisation": taux_utilisation,
+        "date_dernier_run": agent.date_dernier_run,
+        "date_prochain_run": agent.date_prochain_run
     }
 
 def get_agents_actifs(db: Session) -> List[AgentAuto]:
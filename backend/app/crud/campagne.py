@@ -1,12 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import func, select, literal, text, or_, and_, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Callable, List, Optional
+from datetime import datetime, timedelta
+
+from app.core.config import settings
 
 from app.models.campagne import Campagne, TypeCampagneEnum, StatutCampagneEnum
 from app.models.campagne_client import CampagneClient, StatutEnvoiEnum
-from app.models.dossier_client import DossierClient, StatutDossierEnum, PrioriteEnum
-from app.schemas.campagne import CampagneCreate, CampagneUpdate
+from app.models.campagne_variante import CampagneVariante
+from app.models.dossier_client import DossierClient
+from app.schemas.campagne import CampagneCreate, CampagneUpdate, VarianteCreate
+from app.services import segmentation, variantes
 
 def get_campagne(db: Session, campagne_id: int) -> Optional[Campagne]:
     return db.query(Campagne).filter(Campagne.id_campagne == campagne_id).first()
@@ -33,7 +38,7 @@ def create_campagne(
     created_by: int = None
 ) -> Campagne:
     db_campagne = Campagne(
-        **campagne.dict(),
+        **campagne.dict(exclude={"variantes"}),
         statut=StatutCampagneEnum.PLANIFIEE,
         nombre_cibles=0,
         nombre_envoyes=0,
@@ -41,6 +46,7 @@ def create_campagne(
         nombre_ouverts=0,
         nombre_cliques=0
     )
+    db_campagne.variantes = [CampagneVariante(**v.dict()) for v in campagne.variantes or []]
     db.add(db_campagne)
     db.commit()
     db.refresh(db_campagne)
@@ -62,6 +68,22 @@ def update_campagne(
     db.refresh(db_campagne)
     return db_campagne
 
+def a_des_cibles(db: Session, campagne_id: int) -> bool:
+    """Des cibles ont-elles déjà été insérées (lancement fait ou interrompu) ?"""
+    return db.query(
+        select(CampagneClient.id).where(CampagneClient.id_campagne == campagne_id).exists()
+    ).scalar()
+
+def remplacer_variantes(
+    db: Session,
+    db_campagne: Campagne,
+    nouvelles: List[VarianteCreate]
+) -> List[CampagneVariante]:
+    """Redéfinir les variantes d'une campagne planifiée (liste vide : plus de test A/B)"""
+    db_campagne.variantes = [CampagneVariante(**v.dict()) for v in nouvelles]
+    db.commit()
+    return variantes.get_variantes(db, db_campagne.id_campagne)
+
 def delete_campagne(db: Session, campagne_id: int) -> bool:
     db_campagne = get_campagne(db, campagne_id)
     if not db_campagne:
@@ -72,25 +94,27 @@ def delete_campagne(db: Session, campagne_id: int) -> bool:
     return True
 
 def get_dossiers_cibles(db: Session, criteres: dict) -> List[int]:
-    query = db.query(DossierClient.id_dossier).distinct()
-    
-    if "statut" in criteres:
-        statuts = [StatutDossierEnum(s) for s in criteres["statut"]]
-        query = query.filter(DossierClient.statut.in_(statuts))
-    
-    if "priorite" in criteres:
-        priorites = [PrioriteEnum(p) for p in criteres["priorite"]]
-        query = query.filter(DossierClient.priorite.in_(priorites))
+    return list(db.execute(segmentation.requete_cibles(criteres)).scalars())
+
+def lancer_campagne(
+    db: Session,
+    campagne_id: int,
+    on_progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Lancer une campagne : ciblage en INSERT ... SELECT, sans objet ORM
     
-    if "montant_min" in criteres:
-        query = query.filter(DossierClient.montant_total_du >= criteres["montant_min"])
+    Les dossiers ciblés sont insérés par tranches d'id_dossier de
+    CAMPAGNE_LAUNCH_BATCH, une transaction par tranche : mémoire et durée
+    des transactions constantes quelle que soit la taille du segment.
     
-    if "montant_max" in criteres:
-        query = query.filter(DossierClient.montant_total_du <= criteres["montant_max"])
+    Idempotent : ON CONFLICT (id_campagne, id_dossier) DO NOTHING. Un
+    lancement interrompu reste "Planifiee" et peut être relancé ; les
+    tranches déjà insérées sont ignorées.
     
-    return [d.id_dossier for d in query.all()]
-
-def lancer_campagne(db: Session, campagne_id: int) -> dict:
+    on_progress reçoit après chaque tranche {"pourcentage", "total",
+    "inseres"} (avancement sur la plage d'id, dossiers ciblés, nouveaux).
+    """
     campagne = get_campagne(db, campagne_id)
     
     if not campagne:
@@ -99,51 +123,86 @@ def lancer_campagne(db: Session, campagne_id: int) -> dict:
     if campagne.statut != StatutCampagneEnum.PLANIFIEE:
         return {"success": False, "message": "La campagne doit être planifiée"}
     
-    dossiers_ids = get_dossiers_cibles(db, campagne.criteres_segmentation)
+    try:
+        conditions = [segmentation.condition(campagne.criteres_segmentation)]
+    except segmentation.CritereInvalide as e:
+        return {"success": False, "message": f"Critères de segmentation invalides : {e}"}
+    borne_min, borne_max, total = db.execute(
+        select(
+            func.min(DossierClient.id_dossier),
+            func.max(DossierClient.id_dossier),
+            func.count(),
+        ).where(*conditions)
+    ).one()
     
-    if not dossiers_ids:
+    if not total:
         return {"success": False, "message": "Aucun dossier ne correspond aux critères"}
     
     canal = "SMS" if campagne.type == TypeCampagneEnum.SMS else "Email"
     if campagne.type == TypeCampagneEnum.MIXTE:
         canal = "MIXTE"
     
-    for dossier_id in dossiers_ids:
-        campagne_client = CampagneClient(
-            id_campagne=campagne_id,
-            id_dossier=dossier_id,
-            statut=StatutEnvoiEnum.EN_ATTENTE,
-            canal=canal
+    # Test A/B : variante tirée du seau de chaque dossier, dans le même INSERT
+    table = CampagneClient.__table__
+    cibles = select(
+        literal(campagne_id, Integer),
+        DossierClient.id_dossier,
+        literal(StatutEnvoiEnum.EN_ATTENTE, table.c.statut.type),
+        literal(canal, table.c.canal.type),
+        variantes.expression_variante(campagne_id, variantes.get_variantes(db, campagne_id)),
+    ).where(*conditions)
+    
+    pas = settings.CAMPAGNE_LAUNCH_BATCH
+    inseres = 0
+    for debut in range(borne_min, borne_max + 1, pas):
+        tranche = cibles.where(DossierClient.id_dossier.between(debut, debut + pas - 1))
+        result = db.execute(
+            pg_insert(table)
+            .from_select(["id_campagne", "id_dossier", "statut", "canal", "id_variante"], tranche)
+            .on_conflict_do_nothing(index_elements=["id_campagne", "id_dossier"])
         )
-        db.add(campagne_client)
+        db.commit()
+        inseres += result.rowcount
+        if on_progress:
+            fin = min(debut + pas - 1, borne_max)
+            on_progress({
+                "pourcentage": round((fin - borne_min + 1) * 100 / (borne_max - borne_min + 1), 1),
+                "total": total,
+                "inseres": inseres,
+            })
     
-    campagne.statut = StatutCampagneEnum.EN_COURS
-    campagne.nombre_cibles = len(dossiers_ids)
+    nombre_cibles = db.execute(
+        select(func.count()).select_from(table).where(table.c.id_campagne == campagne_id)
+    ).scalar()
     
+    variantes.compter_cibles(db, campagne_id)
+    campagne.statut = StatutCampagneEnum.EN_COURS
+    campagne.nombre_cibles = nombre_cibles
     db.commit()
     
     return {
         "success": True,
         "campagne_id": campagne_id,
-        "nombre_cibles": len(dossiers_ids),
-        "message": f"Campagne lancée pour {len(dossiers_ids)} dossiers"
+        "nombre_cibles": nombre_cibles,
+        "nouveaux_cibles": inseres,
+        "message": f"Campagne lancée pour {nombre_cibles} dossiers"
     }
 
 def get_campagne_stats(db: Session, campagne_id: int) -> dict:
-    stats = db.query(
-        CampagneClient.statut,
-        func.count(CampagneClient.id).label('count')
-    ).filter(
-        CampagneClient.id_campagne == campagne_id
-    ).group_by(CampagneClient.statut).all()
+    """
+    Statistiques d'une campagne, lues sur ses compteurs (O(1))
     
-    stats_dict = {stat.statut.value: stat.count for stat in stats}
+    Compteurs cumulés (entonnoir) : une cible ouverte compte aussi comme
+    envoyée et délivrée. Tenus à jour à chaque événement d'envoi
+    (app.services.evenements_envoi), recalés par reconcilier_compteurs.
+    """
+    campagne = db.get(Campagne, campagne_id)
     
-    total = sum(stats_dict.values())
-    envoyes = stats_dict.get('Envoye', 0)
-    delivres = stats_dict.get('Delivre', 0)
-    ouverts = stats_dict.get('Ouvert', 0)
-    cliques = stats_dict.get('Clique', 0)
+    total = campagne.nombre_cibles or 0
+    envoyes = campagne.nombre_envoyes or 0
+    delivres = campagne.nombre_delivres or 0
+    ouverts = campagne.nombre_ouverts or 0
+    cliques = campagne.nombre_cliques or 0
     
     taux_delivrance = (delivres / envoyes * 100) if envoyes > 0 else 0
     taux_ouverture = (ouverts / delivres * 100) if delivres > 0 else 0
@@ -158,4 +217,121 @@ def get_campagne_stats(db: Session, campagne_id: int) -> dict:
         "taux_delivrance": round(taux_delivrance, 2),
         "taux_ouverture": round(taux_ouverture, 2),
         "taux_clic": round(taux_clic, 2)
-    }
\ No newline at end of file
+    }
+
+# ========================
+# RECALAGE DES COMPTEURS
+# ========================
+
+# Dates implicites manquantes (statuts posés avant le journal des événements)
+_DATES_IMPLICITES_SQL = """
+UPDATE campagnes_clients SET
+    date_ouvert  = COALESCE(date_ouvert, date_clique),
+    date_delivre = COALESCE(date_delivre, date_ouvert, date_clique),
+    date_envoi   = COALESCE(date_envoi, date_delivre, date_ouvert, date_clique)
+WHERE id_campagne = :id
+  AND ((date_ouvert IS NULL AND date_clique IS NOT NULL)
+    OR (date_delivre IS NULL AND COALESCE(date_ouvert, date_clique) IS NOT NULL)
+    OR (date_envoi IS NULL AND COALESCE(date_delivre, date_ouvert, date_clique) IS NOT NULL))
+"""
+
+_COMPTAGE_SQL = """
+SELECT count(*)            AS cibles,
+       count(date_envoi)   AS envoyes,
+       count(date_delivre) AS delivres,
+       count(date_ouvert)  AS ouverts,
+       count(date_clique)  AS cliques
+FROM campagnes_clients
+WHERE id_campagne = :id
+"""
+
+# Variantes (tests A/B) : même recomptage, réponses comprises
+_COMPTAGE_VARIANTES_SQL = """
+UPDATE campagnes_variantes v SET
+    nombre_cibles = c.cibles,
+    nombre_envoyes = c.envoyes,
+    nombre_delivres = c.delivres,
+    nombre_ouverts = c.ouverts,
+    nombre_cliques = c.cliques,
+    nombre_reponses = c.reponses
+FROM (
+    SELECT id_variante,
+           count(*)            AS cibles,
+           count(date_envoi)   AS envoyes,
+           count(date_delivre) AS delivres,
+           count(date_ouvert)  AS ouverts,
+           count(date_clique)  AS cliques,
+           count(date_reponse) AS reponses
+    FROM campagnes_clients
+    WHERE id_campagne = :id AND id_variante IS NOT NULL
+    GROUP BY id_variante
+) c
+WHERE v.id_variante = c.id_variante
+  AND (v.nombre_cibles, v.nombre_envoyes, v.nombre_delivres, v.nombre_ouverts, v.nombre_cliques, v.nombre_reponses)
+      IS DISTINCT FROM (c.cibles, c.envoyes, c.delivres, c.ouverts, c.cliques, c.reponses)
+RETURNING v.code
+"""
+
+_COMPTEURS = (
+    ("nombre_cibles", "cibles"),
+    ("nombre_envoyes", "envoyes"),
+    ("nombre_delivres", "delivres"),
+    ("nombre_ouverts", "ouverts"),
+    ("nombre_cliques", "cliques"),
+)
+
+def reconcilier_compteurs(db: Session, campagne_id: int) -> dict:
+    """
+    Recalculer les compteurs d'une campagne depuis campagnes_clients
+    
+    La ligne Campagne est verrouillée pendant le recomptage : un lot
+    d'événements concurrent attend, puis incrémente la valeur recalée.
+    
+    Returns:
+        {compteur: (ancienne valeur, nouvelle valeur)} pour les compteurs
+        corrigés, et {"variantes": [codes]} si des variantes ont été recalées
+    """
+    # Transaction séparée : ne pas tenir le verrou de la campagne en
+    # attendant des lignes verrouillées par un lot d'événements
+    db.execute(text(_DATES_IMPLICITES_SQL), {"id": campagne_id})
+    db.commit()
+    
+    campagne = db.query(Campagne).filter(
+        Campagne.id_campagne == campagne_id
+    ).with_for_update().populate_existing().first()
+    if campagne is None:
+        db.rollback()
+        return {}
+    
+    comptes = db.execute(text(_COMPTAGE_SQL), {"id": campagne_id}).one()
+    ecarts = {}
+    for colonne, cle in _COMPTEURS:
+        ancien, nouveau = getattr(campagne, colonne) or 0, getattr(comptes, cle)
+        if ancien != nouveau:
+            ecarts[colonne] = (ancien, nouveau)
+            setattr(campagne, colonne, nouveau)
+    
+    db.query(CampagneVariante.id_variante).filter(
+        CampagneVariante.id_campagne == campagne_id
+    ).order_by(CampagneVariante.id_variante).with_for_update().all()
+    recalees = db.execute(text(_COMPTAGE_VARIANTES_SQL), {"id": campagne_id}).scalars().all()
+    if recalees:
+        ecarts["variantes"] = sorted(recalees)
+    db.commit()
+    return ecarts
+
+def get_campagnes_a_reconcilier(db: Session) -> List[int]:
+    """Campagnes dont les compteurs bougent encore (en cours, en pause, terminées récemment)"""
+    limite = datetime.now().astimezone() - timedelta(days=7)
+    return [
+        c.id_campagne
+        for c in db.query(Campagne.id_campagne).filter(
+            or_(
+                Campagne.statut.in_([StatutCampagneEnum.EN_COURS, StatutCampagneEnum.EN_PAUSE]),
+                and_(
+                    Campagne.statut == StatutCampagneEnum.TERMINEE,
+                    func.coalesce(Campagne.updated_at, Campagne.created_at) >= limite
+                )
+            )
+        )
+    ]
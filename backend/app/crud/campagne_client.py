@@ -1,8 +1,8 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
 
 from app.models.campagne_client import CampagneClient, StatutEnvoiEnum
+from app.services import evenements_envoi
 from app.schemas.campagne_client import CampagneClientCreate, CampagneClientUpdate
 
 def get_campagne_client(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
@@ -56,64 +56,37 @@ def update_campagne_client(
     db.refresh(db_campagne_client)
     return db_campagne_client
 
-def marquer_envoye(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
-    db_campagne_client = get_campagne_client(db, campagne_client_id)
-    if not db_campagne_client:
-        return None
-    
-    db_campagne_client.statut = StatutEnvoiEnum.ENVOYE
-    db_campagne_client.date_envoi = datetime.now()
-    
+def _appliquer_evenement(
+    db: Session,
+    campagne_client_id: int,
+    statut: StatutEnvoiEnum
+) -> Optional[CampagneClient]:
+    """
+    Appliquer un événement unitaire par le chemin groupé
+    (transition monotone et compteurs de la campagne, voir app.services.evenements_envoi)
+    """
+    bilan = evenements_envoi.appliquer_evenements(db, [
+        evenements_envoi.Evenement(evenements_envoi.CIBLE_CAMPAGNE_CLIENT, campagne_client_id, statut)
+    ])
     db.commit()
-    db.refresh(db_campagne_client)
-    return db_campagne_client
+    if bilan["campagnes_clients"]["inconnus"]:
+        return None
+    return get_campagne_client(db, campagne_client_id)
+
+def marquer_envoye(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
+    return _appliquer_evenement(db, campagne_client_id, StatutEnvoiEnum.ENVOYE)
 
 def marquer_delivre(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
-    db_campagne_client = get_campagne_client(db, campagne_client_id)
-    if not db_campagne_client:
-        return None
-    
-    db_campagne_client.statut = StatutEnvoiEnum.DELIVRE
-    db_campagne_client.date_delivre = datetime.now()
-    
-    db.commit()
-    db.refresh(db_campagne_client)
-    return db_campagne_client
+    return _appliquer_evenement(db, campagne_client_id, StatutEnvoiEnum.DELIVRE)
 
 def marquer_ouvert(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
-    db_campagne_client = get_campagne_client(db, campagne_client_id)
-    if not db_campagne_client:
-        return None
-    
-    db_campagne_client.statut = StatutEnvoiEnum.OUVERT
-    db_campagne_client.date_ouvert = datetime.now()
-    
-    db.commit()
-    db.refresh(db_campagne_client)
-    return db_campagne_client
+    return _appliquer_evenement(db, campagne_client_id, StatutEnvoiEnum.OUVERT)
 
 def marquer_clique(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
-    db_campagne_client = get_campagne_client(db, campagne_client_id)
-    if not db_campagne_client:
-        return None
-    
-    db_campagne_client.statut = StatutEnvoiEnum.CLIQUE
-    db_campagne_client.date_clique = datetime.now()
-    
-    db.commit()
-    db.refresh(db_campagne_client)
-    return db_campagne_client
+    return _appliquer_evenement(db, campagne_client_id, StatutEnvoiEnum.CLIQUE)
 
 def marquer_echec(db: Session, campagne_client_id: int) -> Optional[CampagneClient]:
-    db_campagne_client = get_campagne_client(db, campagne_client_id)
-    if not db_campagne_client:
-        return None
-    
-    db_campagne_client.statut = StatutEnvoiEnum.ECHEC
-    
-    db.commit()
-    db.refresh(db_campagne_client)
-    return db_campagne_client
+    return _appliquer_evenement(db, campagne_client_id, StatutEnvoiEnum.ECHEC)
 
 def get_prochains_envois(
     db: Session,
@@ -122,5 +95,6 @@ def get_prochains_envois(
 ) -> List[CampagneClient]:
     return db.query(CampagneClient).filter(
         CampagneClient.id_campagne == campagne_id,
-        CampagneClient.statut == StatutEnvoiEnum.EN_ATTENTE
+        CampagneClient.statut == StatutEnvoiEnum.EN_ATTENTE,
+        CampagneClient.date_reservation.is_(None)
     ).limit(limite).all()
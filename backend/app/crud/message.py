@@ -1,8 +1,9 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
 
 from app.models.message import Message, TypeMessageEnum, StatutMessageEnum
+from app.models.campagne_client import StatutEnvoiEnum
+from app.services import evenements_envoi, file_messages
 from app.schemas.message import MessageCreate, MessageUpdate
 
 def get_message(db: Session, message_id: int) -> Optional[Message]:
@@ -27,7 +28,8 @@ def get_messages(
 def create_message(db: Session, message: MessageCreate) -> Message:
     db_message = Message(
         **message.dict(),
-        statut=StatutMessageEnum.EN_ATTENTE
+        statut=StatutMessageEnum.EN_ATTENTE,
+        priorite=file_messages.priorite_dossier(db, message.id_dossier)
     )
     db.add(db_message)
     db.commit()
@@ -55,52 +57,58 @@ def get_messages_en_attente(
     type_message: Optional[TypeMessageEnum] = None,
     limite: int = 100
 ) -> List[Message]:
-    """Récupérer les messages en attente d'envoi"""
-    query = db.query(Message).filter(
-        Message.statut == StatutMessageEnum.EN_ATTENTE
-    )
-    
-    if type_message:
-        query = query.filter(Message.type == type_message)
-    
-    return query.limit(limite).all()
+    """Prochains messages de la file (priorité puis ancienneté), sans les réserver"""
+    return file_messages.apercu(db, limite, type_message)
+
+def reclamer_messages(
+    db: Session,
+    limite: int = 100,
+    type_message: Optional[TypeMessageEnum] = None,
+    visibilite: Optional[int] = None
+) -> List[Message]:
+    """Réserver des messages à envoyer (un expéditeur ne reçoit que des messages libres)"""
+    return file_messages.reclamer(db, limite, type_message, visibilite)
+
+def rejouer_messages(db: Session, ids_messages: List[int]) -> int:
+    """Remettre en file des messages abandonnés"""
+    return file_messages.rejouer(db, ids_messages)
+
+def _appliquer_evenement(
+    db: Session,
+    message_id: int,
+    statut: StatutEnvoiEnum,
+    code_erreur: Optional[str] = None,
+    message_erreur: Optional[str] = None
+) -> Optional[Message]:
+    """Événement unitaire par le chemin groupé (propagé à la cible de campagne)"""
+    bilan = evenements_envoi.appliquer_evenements(db, [
+        evenements_envoi.Evenement(
+            evenements_envoi.CIBLE_MESSAGE, message_id, statut,
+            code_erreur=code_erreur, message_erreur=message_erreur
+        )
+    ])
+    db.commit()
+    if bilan["messages"]["inconnus"]:
+        return None
+    return get_message(db, message_id)
 
 def marquer_envoye(db: Session, message_id: int) -> Optional[Message]:
     """Marquer un message comme envoyé"""
-    db_message = get_message(db, message_id)
-    if not db_message:
-        return None
-    
-    db_message.statut = StatutMessageEnum.ENVOYE
-    db_message.date_envoi = datetime.now()
-    
-    db.commit()
-    db.refresh(db_message)
-    return db_message
+    return _appliquer_evenement(db, message_id, StatutEnvoiEnum.ENVOYE)
 
 def marquer_delivre(db: Session, message_id: int) -> Optional[Message]:
     """Marquer un message comme délivré"""
-    db_message = get_message(db, message_id)
-    if not db_message:
-        return None
-    
-    db_message.statut = StatutMessageEnum.DELIVRE
-    db_message.date_delivre = datetime.now()
-    
-    db.commit()
-    db.refresh(db_message)
-    return db_message
+    return _appliquer_evenement(db, message_id, StatutEnvoiEnum.DELIVRE)
 
 def marquer_echec(db: Session, message_id: int, code_erreur: str, message_erreur: str) -> Optional[Message]:
-    """Marquer un message comme échoué"""
-    db_message = get_message(db, message_id)
-    if not db_message:
-        return None
-    
-    db_message.statut = StatutMessageEnum.ECHEC
-    db_message.code_erreur = code_erreur
-    db_message.message_erreur = message_erreur
+    """
+    Marquer un message comme échoué
     
+    Message encore dans la file : nouvel essai différé (backoff exponentiel)
+    ou file morte ("Abandonne") si les tentatives sont épuisées. Message
+    déjà envoyé (échec signalé par le fournisseur) : statut "Echec".
+    """
+    if file_messages.echec(db, message_id, code_erreur, message_erreur) is None:
+        return _appliquer_evenement(db, message_id, StatutEnvoiEnum.ECHEC, code_erreur, message_erreur)
     db.commit()
-    db.refresh(db_message)
-    return db_message
+    return get_message(db, message_id)
@@ -1,8 +1,8 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import re
 
 from app.models.template import Template, TypeTemplateEnum
+from app.services import rendu_templates
 from app.schemas.template import TemplateCreate, TemplateUpdate
 
 def get_template(db: Session, template_id: int) -> Optional[Template]:
@@ -68,24 +68,17 @@ def render_template(template: Template, variables: dict) -> tuple[Optional[str],
     - {date_echeance}
     - etc.
     
+    Le template est compilé une fois (voir app.services.rendu_templates) ;
+    pour un lot de destinataires, utiliser rendu_templates.personnaliser.
+    
     Returns:
         tuple (objet_rendu, corps_rendu)
     """
-    objet_rendu = None
-    if template.objet:
-        objet_rendu = template.objet
-        for key, value in variables.items():
-            objet_rendu = objet_rendu.replace(f"{{{key}}}", str(value))
-    
-    corps_rendu = template.corps
-    for key, value in variables.items():
-        corps_rendu = corps_rendu.replace(f"{{{key}}}", str(value))
-    
-    return objet_rendu, corps_rendu
+    return rendu_templates.compiler(template).rendre(variables)
 
 def extract_variables(text: str) -> List[str]:
     """Extraire toutes les variables d'un template (format {variable})"""
-    return re.findall(r'\{(\w+)\}', text)
+    return rendu_templates.VARIABLE.findall(text)
 
 def validate_template(template: Template) -> dict:
     """
@@ -100,14 +93,11 @@ def validate_template(template: Template) -> dict:
         }
     """
     errors = []
-    variables_objet = []
-    variables_corps = []
-    
-    # Extraire les variables
-    if template.objet:
-        variables_objet = extract_variables(template.objet)
     
-    variables_corps = extract_variables(template.corps)
+    # Extraire les variables (segmentation compilée, mise en cache)
+    compile_ = rendu_templates.compiler(template)
+    variables_objet = compile_.variables_objet
+    variables_corps = compile_.variables_corps
     
     # Vérifier que le corps n'est pas vide
     if not template.corps or len(template.corps.strip()) < 10:
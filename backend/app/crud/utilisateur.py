@@ -1,13 +1,11 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from typing import Optional, List
-from passlib.context import CryptContext
 
+from app.core.security import pwd_context
 from app.models.utilisateur import Utilisateur, RoleEnum
 from app.schemas.utilisateur import UtilisateurCreate, UtilisateurUpdate
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -1,12 +1,19 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
 from loguru import logger
 
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.models import comite  # add to imports
-from app.core.database import Base, engine
+from app.core.database import Base, engine, SessionLocal
+from app.core.hierarchy import load_hierarchy
+from app.core.schema import mettre_a_niveau
+from app.services import portefeuille_cube, mouvements_creances, estimations
+from app.services import variantes  # noqa: F401 — enregistre l'attribution des réponses (événement ORM sur ReponseClient)
+from app.tasks.portefeuille import rebuild_portefeuille_cube, rebuild_clients_hll
 
 app = FastAPI(
     title=os.getenv("APP_NAME", "Système de Recouvrement"),
@@ -32,9 +39,50 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
+# Délai max de publication d'une tâche au démarrage (broker arrêté)
+STARTUP_TASK_TIMEOUT = 5
+
+async def _demander_tache(tache) -> bool:
+    """Publier une tâche Celery sans bloquer le démarrage si le broker est injoignable"""
+    try:
+        await asyncio.wait_for(
+            run_in_threadpool(tache.apply_async, retry=False),
+            timeout=STARTUP_TASK_TIMEOUT,
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Tâche {tache.name} : worker injoignable ({e!r})")
+        return False
+
 @app.on_event("startup")
 async def startup():
     Base.metadata.create_all(bind=engine)
+    mettre_a_niveau(engine)
+    
+    # Index hiérarchique région → agences → agents (permissions)
+    db = SessionLocal()
+    try:
+        index = load_hierarchy(db)
+        logger.info(f"🏢 Hiérarchie chargée : {len(index.agence_region)} agences, {len(index.user_agence)} utilisateurs")
+        
+        # Journal des mouvements : soldes initiaux des créances antérieures
+        reprises = mouvements_creances.reprendre_historique(db)
+        if reprises:
+            logger.info(f"📒 Journal des créances : {reprises} soldes initiaux repris")
+        
+        # Cube analytique jamais construit : première construction par le worker
+        if not portefeuille_cube.is_ready(db):
+            if await _demander_tache(rebuild_portefeuille_cube):
+                logger.info("🧊 Construction initiale du cube portefeuille demandée")
+            else:
+                logger.warning("Cube portefeuille non construit : analytics en direct")
+        
+        # Sketch des clients distincts (precision=approx) jamais construit
+        if estimations.clients_distincts() is None:
+            if not await _demander_tache(rebuild_clients_hll):
+                logger.warning("HyperLogLog clients non construit : comptage exact")
+    finally:
+        db.close()
     logger.info(f"🚀 Starting {os.getenv('APP_NAME')} v{os.getenv('APP_VERSION')}")
 
 @app.get("/")
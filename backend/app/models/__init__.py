@@ -10,6 +10,7 @@ from app.models.creance import Creance
 from app.models.interaction import Interaction
 from app.models.campagne import Campagne
 from app.models.campagne_client import CampagneClient
+from app.models.campagne_variante import CampagneVariante
 from app.models.template import Template
 from app.models.message import Message
 from app.models.reponse_client import ReponseClient
@@ -19,6 +20,8 @@ from app.models.analyse_nlp import AnalyseNLP
 from app.models.agent_auto import AgentAuto
 from app.models.alerte import Alerte
 from app.models.tracabilite import Tracabilite
+from app.models.portefeuille_cube import PortefeuilleCube, PortefeuilleCubeBuild
+from app.models.mouvement_creance import MouvementCreance
 
 __all__ = [
     "Base",
@@ -33,6 +36,7 @@ __all__ = [
     "Interaction",
     "Campagne",
     "CampagneClient",
+    "CampagneVariante",
     "Template",
     "Message",
     "ReponseClient",
@@ -42,4 +46,7 @@ __all__ = [
     "AgentAuto",
     "Alerte",
     "Tracabilite",
+    "PortefeuilleCube",
+    "PortefeuilleCubeBuild",
+    "MouvementCreance",
 ]
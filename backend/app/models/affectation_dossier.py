@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index, text
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.models.base import TimestampMixin
 
 class AffectationDossier(Base, TimestampMixin):
     __tablename__ = "affectations_dossiers"
+    __table_args__ = (
+        Index("ix_affectations_agent_actif", "id_agent", "id_dossier", postgresql_where=text("actif")),
+    )
     
     id_affectation = Column(Integer, primary_key=True, index=True)
     id_dossier = Column(Integer, ForeignKey("dossiers_clients.id_dossier"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -11,6 +11,9 @@ class SentimentEnum(str, enum.Enum):
 
 class AnalyseNLP(Base, TimestampMixin):
     __tablename__ = "analyses_nlp"
+    __table_args__ = (
+        Index("ix_analyses_nlp_reponse", "id_reponse"),
+    )
     
     id_analyse = Column(Integer, primary_key=True, index=True)
     id_reponse = Column(Integer, ForeignKey("reponses_clients.id_reponse"), nullable=False)
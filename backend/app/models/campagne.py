@@ -12,6 +12,7 @@ class TypeCampagneEnum(str, enum.Enum):
 class StatutCampagneEnum(str, enum.Enum):
     PLANIFIEE = "Planifiee"
     EN_COURS = "EnCours"
+    EN_PAUSE = "EnPause"
     TERMINEE = "Terminee"
     ANNULEE = "Annulee"
 
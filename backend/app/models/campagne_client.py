@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -14,6 +14,12 @@ class StatutEnvoiEnum(str, enum.Enum):
 
 class CampagneClient(Base, TimestampMixin):
     __tablename__ = "campagnes_clients"
+    __table_args__ = (
+        # Un dossier n'est ciblé qu'une fois par campagne (lancement idempotent)
+        Index("uq_campagnes_clients_cible", "id_campagne", "id_dossier", unique=True),
+        # Attribution des réponses au dernier envoi de campagne du dossier
+        Index("ix_campagnes_clients_dossier_envoi", "id_dossier", "date_envoi"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     id_campagne = Column(Integer, ForeignKey("campagnes.id_campagne"), nullable=False)
@@ -24,6 +30,10 @@ class CampagneClient(Base, TimestampMixin):
     date_clique = Column(DateTime(timezone=True))
     statut = Column(Enum(StatutEnvoiEnum), nullable=False, default=StatutEnvoiEnum.EN_ATTENTE)
     canal = Column(String(20))  # SMS ou Email
+    date_report = Column(DateTime(timezone=True))  # Politique de contact : pas d'envoi avant
+    date_reservation = Column(DateTime(timezone=True))  # Prise par un worker d'envoi (avant l'appel fournisseur)
+    id_variante = Column(Integer, ForeignKey("campagnes_variantes.id_variante"))  # Test A/B
+    date_reponse = Column(DateTime(timezone=True))  # Première réponse attribuée à cet envoi
     
     # Relations
     campagne = relationship("Campagne", backref="clients_campagne")
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from sqlalchemy.orm import relationship, backref
+from app.core.database import Base
+from app.models.base import TimestampMixin
+
+class CampagneVariante(Base, TimestampMixin):
+    """Variante d'une campagne (test A/B) : template, part du trafic, compteurs"""
+    __tablename__ = "campagnes_variantes"
+    __table_args__ = (
+        Index("uq_campagnes_variantes_code", "id_campagne", "code", unique=True),
+    )
+    
+    id_variante = Column(Integer, primary_key=True, index=True)
+    id_campagne = Column(Integer, ForeignKey("campagnes.id_campagne", ondelete="CASCADE"), nullable=False)
+    code = Column(String(20), nullable=False)  # "A", "B"...
+    id_template = Column(Integer, ForeignKey("templates.id_template"), nullable=False)
+    poids = Column(Integer, nullable=False)  # % des cibles
+    
+    # Compteurs tenus à chaque événement (app.services.variantes)
+    nombre_cibles = Column(Integer, nullable=False, default=0)
+    nombre_envoyes = Column(Integer, nullable=False, default=0)
+    nombre_delivres = Column(Integer, nullable=False, default=0)
+    nombre_ouverts = Column(Integer, nullable=False, default=0)
+    nombre_cliques = Column(Integer, nullable=False, default=0)
+    nombre_reponses = Column(Integer, nullable=False, default=0)
+    
+    # Relations
+    campagne = relationship(
+        "Campagne",
+        backref=backref("variantes", cascade="all, delete-orphan", passive_deletes=True, order_by="CampagneVariante.code"),
+    )
+    
+    def __repr__(self):
+        return f"<CampagneVariante(id={self.id_variante}, campagne_id={self.id_campagne}, code='{self.code}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -13,6 +13,9 @@ class StatutCreanceEnum(str, enum.Enum):
 
 class Creance(Base, TimestampMixin):
     __tablename__ = "creances"
+    __table_args__ = (
+        Index("ix_creances_dossier", "id_dossier", "jours_retard"),
+    )
     
     id_creance = Column(Integer, primary_key=True, index=True)
     id_dossier = Column(Integer, ForeignKey("dossiers_clients.id_dossier"), nullable=False)
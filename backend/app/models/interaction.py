@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -14,6 +14,9 @@ class TypeInteractionEnum(str, enum.Enum):
 
 class Interaction(Base, TimestampMixin):
     __tablename__ = "interactions"
+    __table_args__ = (
+        Index("ix_interactions_dossier_date", "id_dossier", "date_interaction"),
+    )
     
     id_interaction = Column(Integer, primary_key=True, index=True)
     id_dossier = Column(Integer, ForeignKey("dossiers_clients.id_dossier"), nullable=False)
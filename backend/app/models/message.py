@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -15,6 +16,7 @@ class StatutMessageEnum(str, enum.Enum):
     ECHEC = "Echec"
     OUVERT = "Ouvert"
     CLIQUE = "Clique"
+    ABANDONNE = "Abandonne"  # File morte : tentatives épuisées
 
 class Message(Base, TimestampMixin):
     __tablename__ = "messages"
@@ -32,6 +34,12 @@ class Message(Base, TimestampMixin):
     id_agent_auto = Column(Integer, ForeignKey("agents_auto.id_agent"))
     code_erreur = Column(String(100))
     message_erreur = Column(Text)
+    id_externe = Column(String(100), index=True)  # Identifiant chez le fournisseur (dédoublonnage, accusés)
+    
+    # File d'envoi (app.services.file_messages)
+    priorite = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    tentatives = Column(Integer, nullable=False, default=0, server_default="0")
+    disponible_a = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     # Relations
     campagne_client = relationship("CampagneClient", backref="messages")
@@ -39,4 +47,12 @@ class Message(Base, TimestampMixin):
     agent_auto = relationship("AgentAuto", backref="messages_envoyes")
     
     def __repr__(self):
-        return f"<Message(id={self.id_message}, type='{self.type}', statut='{self.statut}')>"
\ No newline at end of file
+        return f"<Message(id={self.id_message}, type='{self.type}', statut='{self.statut}')>"
+
+# Messages en attente dans l'ordre de la file : priorité décroissante, puis ancienneté
+Index(
+    "ix_messages_file",
+    Message.priorite.desc(),
+    Message.id_message,
+    postgresql_where=Message.statut == StatutMessageEnum.EN_ATTENTE,
+)
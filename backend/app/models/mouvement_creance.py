@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, Enum, Index, text
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+class TypeMouvementEnum(str, enum.Enum):
+    CREATION = "Creation"
+    PAIEMENT = "Paiement"
+    AJUSTEMENT = "Ajustement"
+    REPRISE = "Reprise"          # Solde initial des créances antérieures au journal
+
+class MouvementCreance(Base):
+    """
+    Journal append-only des soldes de créances (voir app.services.mouvements_creances)
+    
+    Chaque ligne porte la variation du montant payé et les soldes qui en
+    résultent : le solde à une date est la dernière ligne antérieure, lue
+    par l'index (id_creance, date_mouvement) sans rejouer l'historique.
+    """
+    __tablename__ = "mouvements_creances"
+    
+    id_mouvement = Column(Integer, primary_key=True)
+    id_creance = Column(Integer, ForeignKey("creances.id_creance", ondelete="CASCADE"), nullable=False)
+    date_mouvement = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    type_mouvement = Column(Enum(TypeMouvementEnum), nullable=False)
+    delta_paye = Column(Numeric(15, 2), nullable=False, default=0)
+    montant_paye = Column(Numeric(15, 2), nullable=False)
+    montant_restant = Column(Numeric(15, 2), nullable=False)
+    id_utilisateur = Column(Integer, ForeignKey("utilisateurs.id_utilisateur"))
+    
+    # Relations
+    creance = relationship("Creance", backref=backref("mouvements", passive_deletes=True))
+    
+    __table_args__ = (
+        Index("ix_mouvements_creances_solde", "id_creance", "date_mouvement", "id_mouvement"),
+        Index("ix_mouvements_creances_date", "date_mouvement"),
+        # Une seule reprise par créance, même si plusieurs instances démarrent ensemble
+        Index(
+            "uq_mouvements_creances_reprise", "id_creance",
+            unique=True, postgresql_where=text("type_mouvement = 'REPRISE'"),
+        ),
+    )
+    
+    def __repr__(self):
+        return f"<MouvementCreance(id={self.id_mouvement}, creance={self.id_creance}, type='{self.type_mouvement}')>"
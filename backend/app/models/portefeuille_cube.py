@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Numeric, Date, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class PortefeuilleCube(Base):
+    """
+    Cube pré-agrégé du portefeuille (voir app.services.portefeuille_cube)
+    
+    Grain : jour d'ouverture du dossier × région × agence × agent × type de crédit
+    × tranche d'ancienneté × statut créance × statut dossier.
+    Valeurs sentinelles pour les dimensions absentes : 0 (dossier non affecté),
+    '' (dossier sans créance), -1 (retard inconnu).
+    """
+    __tablename__ = "portefeuille_cube"
+    
+    jour = Column(Date, primary_key=True)
+    id_region = Column(Integer, primary_key=True)
+    id_agence = Column(Integer, primary_key=True)
+    id_agent = Column(Integer, primary_key=True)
+    type_credit = Column(String(100), primary_key=True)
+    tranche_aging = Column(SmallInteger, primary_key=True)
+    statut_creance = Column(String(30), primary_key=True)
+    statut_dossier = Column(String(30), primary_key=True)
+    
+    nb_creances = Column(BigInteger, nullable=False, default=0)
+    nb_retard = Column(BigInteger, nullable=False, default=0)
+    nb_dossiers = Column(BigInteger, nullable=False, default=0)
+    montant_initial = Column(Numeric(18, 2), nullable=False, default=0)
+    montant_paye = Column(Numeric(18, 2), nullable=False, default=0)
+    montant_restant = Column(Numeric(18, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_portefeuille_cube_agent", "id_agent"),
+        Index("ix_portefeuille_cube_region", "id_region"),
+    )
+    
+    def __repr__(self):
+        return f"<PortefeuilleCube(jour={self.jour}, agent={self.id_agent}, type='{self.type_credit}')>"
+
+class PortefeuilleCubeBuild(Base):
+    """Journal des reconstructions complètes du cube"""
+    __tablename__ = "portefeuille_cube_builds"
+    
+    id_build = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True))
+    nb_lignes = Column(Integer)
+    duree_ms = Column(Integer)
+    
+    def __repr__(self):
+        return f"<PortefeuilleCubeBuild(id={self.id_build}, lignes={self.nb_lignes})>"
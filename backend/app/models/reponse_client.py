@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Numeric, Float, Boolean, Date, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -12,6 +12,9 @@ class CanalReponseEnum(str, enum.Enum):
 
 class ReponseClient(Base, TimestampMixin):
     __tablename__ = "reponses_clients"
+    __table_args__ = (
+        Index("ix_reponses_clients_dossier_date", "id_dossier", "date_reponse"),
+    )
     
     id_reponse = Column(Integer, primary_key=True, index=True)
     id_message = Column(Integer, ForeignKey("messages.id_message"))
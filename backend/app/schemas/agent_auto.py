@@ -38,6 +38,8 @@ class AgentAutoStats(BaseModel):
     type: str
     statut: str
     messages_traites: int
+    messages_derniere_heure: Optional[int] = None  # None si Redis indisponible
     capacite_max: int
-    taux_utilisation: float
+    taux_utilisation: float  # % de capacite_max sur l'heure glissante
     date_dernier_run: Optional[datetime] = None
+    date_prochain_run: Optional[datetime] = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 from app.models.campagne import TypeCampagneEnum, StatutCampagneEnum
 
@@ -12,8 +12,28 @@ class CampagneBase(BaseModel):
     date_fin: Optional[datetime] = None
     criteres_segmentation: dict  # JSON avec critères
 
+# Test A/B : variantes de template et part des cibles (poids en %, total 100)
+
+class VarianteCreate(BaseModel):
+    code: str = Field(..., min_length=1, max_length=20)
+    id_template: int
+    poids: int = Field(..., ge=1, le=100)
+
+class VarianteResponse(VarianteCreate):
+    id_variante: int
+    id_campagne: int
+    nombre_cibles: int
+    nombre_envoyes: int
+    nombre_delivres: int
+    nombre_ouverts: int
+    nombre_cliques: int
+    nombre_reponses: int
+    
+    class Config:
+        from_attributes = True
+
 class CampagneCreate(CampagneBase):
-    pass
+    variantes: Optional[List[VarianteCreate]] = None
 
 class CampagneUpdate(BaseModel):
     nom_campagne: Optional[str] = None
@@ -50,3 +70,28 @@ class CampagneStats(BaseModel):
     taux_delivrance: float
     taux_ouverture: float
     taux_clic: float
+
+
+# Segmentation : estimation d'audience et aperçu avant lancement
+
+class SegmentationRequete(BaseModel):
+    criteres_segmentation: dict = {}
+    limite: int = Field(20, ge=1, le=50)       # Aperçu uniquement
+    apres: Optional[int] = None                # Curseur : dernier id_dossier reçu
+
+class AudienceEstimee(BaseModel):
+    estimation: int
+    marge: int
+    methode: Literal["exact", "echantillon"]
+
+class DossierCible(BaseModel):
+    id_dossier: int
+    numero_dossier: str
+    client: str
+    statut: str
+    priorite: str
+    montant_total_du: float
+
+class ApercuSegment(BaseModel):
+    dossiers: List[DossierCible]
+    suivant: Optional[int] = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 from app.models.campagne_client import StatutEnvoiEnum
 
@@ -31,3 +31,28 @@ class CampagneClientResponse(CampagneClientBase):
     
     class Config:
         from_attributes = True
+
+
+# Événements d'envoi (accusés fournisseurs), appliqués par lots
+
+EVENEMENTS_MAX = 10000
+
+class EvenementEnvoi(BaseModel):
+    cible: Literal["campagne_client", "message"] = "campagne_client"
+    id: int
+    statut: StatutEnvoiEnum
+    horodatage: Optional[datetime] = None     # Défaut : heure de réception
+    code_erreur: Optional[str] = Field(None, max_length=100)  # messages.code_erreur : String(100)
+    message_erreur: Optional[str] = None
+
+class LotEvenementsEnvoi(BaseModel):
+    evenements: List[EvenementEnvoi] = Field(..., min_length=1, max_length=EVENEMENTS_MAX)
+
+class BilanEvenements(BaseModel):
+    recus: int
+    inconnus: int
+    transitions: int
+
+class ResultatEvenementsEnvoi(BaseModel):
+    messages: BilanEvenements
+    campagnes_clients: BilanEvenements
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 
 
 class MonthlyPerformance(BaseModel):
@@ -14,6 +14,12 @@ class StatutDistribution(BaseModel):
     color: str
 
 
+class Precision(BaseModel):
+    mode: str                          # "exact" ou "approx"
+    echantillon_pct: Optional[float] = None
+    marges: Dict[str, Optional[float]] = {}   # demi-largeur IC 95 % par KPI
+
+
 class DashboardStats(BaseModel):
     # KPIs
     total_dossiers: int
@@ -25,4 +31,7 @@ class DashboardStats(BaseModel):
 
     # Charts
     monthly_performance: List[MonthlyPerformance]
-    status_distribution: List[StatutDistribution]
\ No newline at end of file
+    status_distribution: List[StatutDistribution]
+
+    # Renseigné quand precision=approx est demandé
+    precision: Optional[Precision] = None
\ No newline at end of file
@@ -29,6 +29,9 @@ class MessageResponse(MessageBase):
     date_delivre: Optional[datetime] = None
     code_erreur: Optional[str] = None
     message_erreur: Optional[str] = None
+    priorite: int = 0
+    tentatives: int = 0
+    disponible_a: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class SessionInfo(BaseModel):
+    sid: str
+    created_at: Optional[int] = None
+    last_refresh: Optional[int] = None
+    expires_at: int
+    ip: Optional[str] = None
+    user_agent: Optional[str] = None
+
+class RevocationRequest(BaseModel):
+    """Cibles d'une révocation en masse (cumulatives)"""
+    utilisateurs: List[int] = []
+    agences: List[int] = []
+    regions: List[int] = []
+    desactiver: bool = False
+
+class RevocationResult(BaseModel):
+    utilisateurs: int
+    sessions_revoquees: int
+    desactives: int = 0
+
+class SessionCounts(BaseModel):
+    total: int
+    par_utilisateur: Dict[int, int]
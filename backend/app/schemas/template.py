@@ -36,3 +36,9 @@ class TemplatePreview(BaseModel):
     objet_rendu: Optional[str] = None
     corps_rendu: str
     variables_utilisees: dict
+
+class TemplateRenduDossier(BaseModel):
+    """Template personnalisé pour un dossier"""
+    id_dossier: int
+    objet_rendu: Optional[str] = None
+    corps_rendu: str
@@ -0,0 +1,218 @@
+"""Benchmark: /analytics/portefeuille/summary — 4 requêtes IN (ids) vs agrégation unique
+
+Usage:
+    python app/scripts/bench_analytics.py --seed 1000000   # jeu de données "BENCH" (1M créances)
+    python app/scripts/bench_analytics.py [--repeat 5]     # mesure
+    python app/scripts/bench_analytics.py --purge          # suppression du jeu de données
+
+À lancer sur une base dédiée (DATABASE_URL) : le seed ajoute des régions,
+agences, agents, clients, dossiers, affectations et créances préfixés "BENCH".
+"""
+import sys
+import os
+import time
+import re
+import argparse
+import statistics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import func, text
+
+from app.core.database import SessionLocal, engine
+from app.core.permissions import filter_dossiers_by_role
+from app.api.v1.endpoints import analytics
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient, StatutDossierEnum
+from app.models.utilisateur import Utilisateur, RoleEnum
+
+engine.echo = False
+
+
+# Mesure du calcul lui-même, hors cache des réponses. Les paramètres
+# optionnels sont passés explicitement : appelée hors FastAPI, la fonction
+# recevrait sinon leurs Query(...) par défaut
+def get_portefeuille_summary(current_user, db):
+    return analytics.get_portefeuille_summary.__wrapped__(
+        as_of=None, precision="exact", current_user=current_user, db=db
+    )
+
+
+REGIONS = 6
+AGENCES = 60
+AGENTS = 1200
+CREANCES_PAR_DOSSIER = 4
+
+SEED_SQL = [
+    """INSERT INTO regions (nom_region, code_region)
+       SELECT 'Bench Région ' || g, 'BENCH-R' || g FROM generate_series(1, :regions) g""",
+    """INSERT INTO agences (nom_agence, code_agence, id_region)
+       SELECT 'Bench Agence ' || g, 'BENCH-A' || g, r.id_region
+       FROM generate_series(1, :agences) g
+       JOIN regions r ON r.code_region = 'BENCH-R' || (1 + g % :regions)""",
+    """INSERT INTO utilisateurs (nom, prenom, email, mot_de_passe, role, id_agence, actif)
+       SELECT 'Bench', 'Agent ' || g, 'bench.agent' || g || '@bench.local', '!', 'AGENT', a.id_agence, true
+       FROM generate_series(1, :agents) g
+       JOIN agences a ON a.code_agence = 'BENCH-A' || (1 + g % :agences)""",
+    """INSERT INTO clients (cin, nom, prenom, telephone)
+       SELECT 'BENCH' || g, 'Client', 'Bench ' || g, '00000000' FROM generate_series(1, :dossiers) g""",
+    """INSERT INTO dossiers_clients (id_client, numero_dossier, statut, priorite, montant_total_du, date_ouverture)
+       SELECT c.id_client, 'BENCH-' || c.cin,
+              (ARRAY['ACTIF','ACTIF','ACTIF','CLOTURE','SUSPENDU'])[1 + c.id_client % 5]::statutdossierenum,
+              'NORMALE', 0, now() - (c.id_client % 720) * interval '1 day'
+       FROM clients c WHERE c.cin LIKE 'BENCH%'""",
+    """WITH agents AS (
+           SELECT id_utilisateur, row_number() OVER (ORDER BY id_utilisateur) - 1 AS rn, count(*) OVER () AS n
+           FROM utilisateurs WHERE email LIKE 'bench.agent%'
+       )
+       INSERT INTO affectations_dossiers (id_dossier, id_agent, id_assigneur, date_affectation, actif)
+       SELECT d.id_dossier, a.id_utilisateur, a.id_utilisateur, d.date_ouverture, true
+       FROM dossiers_clients d JOIN agents a ON a.rn = d.id_dossier % a.n
+       WHERE d.numero_dossier LIKE 'BENCH-%'""",
+    """INSERT INTO creances (id_dossier, numero_contrat, type_credit, montant_initial, montant_restant,
+                            montant_paye, date_echeance, jours_retard, statut)
+       SELECT d.id_dossier, 'BENCH-' || d.id_dossier || '-' || k,
+              (ARRAY['PretPersonnel','CreditAuto','CreditImmobilier','CreditConsommation','Autre'])[1 + (d.id_dossier + k) % 5],
+              m.initial, m.initial - m.paye, m.paye,
+              current_date - m.retard, m.retard, 'EN_COURS'
+       FROM dossiers_clients d
+       CROSS JOIN generate_series(1, :par_dossier) k
+       CROSS JOIN LATERAL (
+           SELECT (1000 + (d.id_dossier * 37 + k * 101) % 99000)::numeric AS initial,
+                  ((1000 + (d.id_dossier * 37 + k * 101) % 99000) * ((d.id_dossier + k) % 10) / 10)::numeric AS paye,
+                  (d.id_dossier * 7 + k * 13) % 400 AS retard
+       ) m
+       WHERE d.numero_dossier LIKE 'BENCH-%'""",
+]
+
+PURGE_SQL = [
+    "DELETE FROM creances WHERE numero_contrat LIKE 'BENCH-%'",
+    "DELETE FROM affectations_dossiers WHERE id_dossier IN (SELECT id_dossier FROM dossiers_clients WHERE numero_dossier LIKE 'BENCH-%')",
+    "DELETE FROM dossiers_clients WHERE numero_dossier LIKE 'BENCH-%'",
+    "DELETE FROM clients WHERE cin LIKE 'BENCH%'",
+    "DELETE FROM utilisateurs WHERE email LIKE 'bench.%@bench.local'",
+    "DELETE FROM agences WHERE code_agence LIKE 'BENCH-A%'",
+    "DELETE FROM regions WHERE code_region LIKE 'BENCH-R%'",
+]
+
+
+def seed(nb_creances: int):
+    params = {
+        "regions": REGIONS,
+        "agences": AGENCES,
+        "agents": AGENTS,
+        "dossiers": nb_creances // CREANCES_PAR_DOSSIER,
+        "par_dossier": CREANCES_PAR_DOSSIER,
+    }
+    with engine.begin() as conn:
+        for sql in SEED_SQL:
+            started = time.perf_counter()
+            result = conn.execute(text(sql), params)
+            table = re.search(r"INSERT INTO (\w+)", sql).group(1)
+            print(f"  {result.rowcount:>10,} lignes  ({time.perf_counter() - started:6.1f}s)  {table}")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print("✅ Seed terminé")
+
+
+def purge():
+    with engine.begin() as conn:
+        for sql in PURGE_SQL:
+            conn.execute(text(sql))
+    print("✅ Jeu de données BENCH supprimé")
+
+
+def legacy_summary(db, current_user) -> dict:
+    """Implémentation d'origine : liste d'ids puis quatre requêtes IN (ids)"""
+    q = filter_dossiers_by_role(db.query(DossierClient.id_dossier), current_user, db)
+    ids = [row[0] for row in q.distinct().all()]
+    if not ids:
+        return {"total_encours": 0, "montant_recouvre": 0, "taux_recouvrement": 0,
+                "nb_debiteurs_actifs": 0, "risque_moyen": "Faible"}
+
+    agg = db.query(
+        func.sum(Creance.montant_initial).label("initial"),
+        func.sum(Creance.montant_paye).label("paye"),
+        func.sum(Creance.montant_restant).label("restant"),
+    ).filter(Creance.id_dossier.in_(ids)).first()
+    total_initial = float(agg.initial or 0)
+    total_paye = float(agg.paye or 0)
+    taux = round((total_paye / total_initial * 100), 1) if total_initial > 0 else 0
+
+    nb_actifs = db.query(func.count(DossierClient.id_dossier)).filter(
+        DossierClient.id_dossier.in_(ids), DossierClient.statut == StatutDossierEnum.ACTIF
+    ).scalar() or 0
+    nb_total = db.query(func.count(Creance.id_creance)).filter(
+        Creance.id_dossier.in_(ids)
+    ).scalar() or 1
+    nb_retard = db.query(func.count(Creance.id_creance)).filter(
+        Creance.id_dossier.in_(ids), Creance.jours_retard > 0
+    ).scalar() or 0
+    taux_retard = nb_retard / nb_total
+    risque = "Faible" if taux_retard < 0.20 else "Modéré" if taux_retard < 0.45 else "Élevé"
+
+    return {
+        "total_encours": float(agg.restant or 0),
+        "montant_recouvre": total_paye,
+        "taux_recouvrement": taux,
+        "nb_debiteurs_actifs": nb_actifs,
+        "risque_moyen": risque,
+    }
+
+
+def bench_users(db):
+    """Un utilisateur (non persisté) par niveau de périmètre"""
+    agent = db.query(Utilisateur).filter(Utilisateur.email.like("bench.agent%")).first()
+    if agent is None:
+        sys.exit("❌ Pas de données BENCH : lancer d'abord --seed")
+    region_id = db.execute(
+        text("SELECT id_region FROM agences WHERE id_agence = :a"), {"a": agent.id_agence}
+    ).scalar()
+    return [
+        ("DGA (global)", Utilisateur(id_utilisateur=0, role=RoleEnum.DGA)),
+        ("Chef régional", Utilisateur(id_utilisateur=0, role=RoleEnum.CHEF_REGIONAL, id_region=region_id)),
+        ("Chef d'agence", Utilisateur(id_utilisateur=0, role=RoleEnum.CHEF_AGENCE, id_agence=agent.id_agence)),
+        ("Agent", agent),
+    ]
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()  # warm-up (cache PostgreSQL)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, metavar="NB_CREANCES")
+    parser.add_argument("--purge", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.purge:
+        return purge()
+    if args.seed:
+        return seed(args.seed)
+
+    db = SessionLocal()
+    try:
+        total = db.query(func.count(Creance.id_creance)).scalar()
+        print(f"{total:,} créances — médiane sur {args.repeat} exécutions\n")
+        print(f"  {'Périmètre':<16} {'avant (ms)':>12} {'après (ms)':>12} {'gain':>8}")
+        for label, user in bench_users(db):
+            before = legacy_summary(db, user)
+            after = get_portefeuille_summary(current_user=user, db=db)
+            assert before == after, f"Résultats différents pour {label}: {before} != {after}"
+
+            legacy_ms = timeit(lambda: legacy_summary(db, user), args.repeat)
+            single_ms = timeit(lambda: get_portefeuille_summary(current_user=user, db=db), args.repeat)
+            print(f"  {label:<16} {legacy_ms:12.1f} {single_ms:12.1f} {legacy_ms / single_ms:7.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
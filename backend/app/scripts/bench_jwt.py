@@ -0,0 +1,78 @@
+"""Benchmark: décodage JWT python-jose vs chemin rapide app.core.jwt_keys
+
+Usage:
+    python app/scripts/bench_jwt.py [iterations]
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jose import jwt
+
+from app.core.jwt_keys import KeySet, build_keyset
+
+SECRET = "bench-secret-key"
+CLAIMS = {
+    "sub": "agent@banquezitouna.tn",
+    "role": "Agent",
+    "user_id": 42,
+    "exp": datetime.utcnow() + timedelta(hours=1),
+}
+
+
+def timeit(label: str, fn, iterations: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / iterations * 1_000_000
+    print(f"  {label:<40} {per_call_us:8.1f} µs/décodage  ({iterations / elapsed:,.0f}/s)")
+    return per_call_us
+
+
+def asymmetric_keyset(private_key) -> KeySet:
+    alg = "RS256" if isinstance(private_key, rsa.RSAPrivateKey) else "EdDSA"
+    return KeySet(
+        alg,
+        private_key,
+        signing_kid="bench",
+        verification_keys={"bench": (alg, private_key.public_key())},
+    )
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    print("HS256")
+    legacy_token = jwt.encode(CLAIMS, SECRET, algorithm="HS256")
+    keyset = build_keyset(SECRET)
+    assert keyset.decode(legacy_token)["user_id"] == 42
+    jose_us = timeit("python-jose jwt.decode", lambda: jwt.decode(legacy_token, SECRET, algorithms=["HS256"]), iterations)
+    fast_us = timeit("jwt_keys.KeySet.decode", lambda: keyset.decode(legacy_token), iterations)
+    print(f"  → gain x{jose_us / fast_us:.1f}")
+
+    print("RS256")
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    rsa_public_pem = rsa_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    rsa_keyset = asymmetric_keyset(rsa_key)
+    rsa_token = rsa_keyset.encode(CLAIMS)
+    jose_us = timeit("python-jose jwt.decode (PEM)", lambda: jwt.decode(rsa_token, rsa_public_pem, algorithms=["RS256"]), iterations)
+    fast_us = timeit("jwt_keys.KeySet.decode", lambda: rsa_keyset.decode(rsa_token), iterations)
+    print(f"  → gain x{jose_us / fast_us:.1f}")
+
+    print("EdDSA (non supporté par python-jose)")
+    ed_keyset = asymmetric_keyset(ed25519.Ed25519PrivateKey.generate())
+    ed_token = ed_keyset.encode(CLAIMS)
+    timeit("jwt_keys.KeySet.decode", lambda: ed_keyset.decode(ed_token), iterations)
+
+
+if __name__ == "__main__":
+    main()
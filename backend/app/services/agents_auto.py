@@ -0,0 +1,273 @@
+"""
+Exécution des agents automatiques
+
+Un agent actif traite la file des messages unitaires (app.services.file_messages)
+de son type : SMS, Email, ou les deux (Mixte).
+
+Planification (app.tasks.agents, beat toutes les AGENTS_INTERVAL_SECONDS):
+    reclamer_agents_dus()  agents actifs dont date_prochain_run est passée,
+                           réservés par UPDATE ... SKIP LOCKED : date_prochain_run
+                           repoussée d'un bail, donc un agent ne tourne jamais
+                           deux fois en même temps (et repart si son worker meurt)
+    executer_agent()       une tâche Celery par agent : les agents tournent en
+                           parallèle dans le pool de processus des workers
+
+Capacité : capacite_max messages par heure, prélevés dans le même seau à
+jetons que l'envoi des campagnes (app.core.rate_limit, clé cle_seau) ; la
+capacité d'un agent est donc partagée entre campagnes et file.
+
+Politique de contact : chaque message réclamé est réservé par
+politique_contact.reserver (membre "m{id_message}", ou "c{id_campagne_client}"
+comme au recalage) avant l'envoi, dans les mêmes plafonds que les campagnes.
+Un message refusé retourne dans la file après le délai indiqué
+(file_messages.reporter), son jeton est rendu ; un envoi en échec est libéré.
+
+Compteurs : messages_traites est incrémenté en SQL (UPDATE ... SET
+messages_traites = messages_traites + n), jamais lu puis réécrit. Les
+messages traités sont aussi comptés par minute dans Redis pour le taux
+d'utilisation sur l'heure glissante (utilisation()).
+
+Configuration (AgentAuto.configuration, toutes les clés sont optionnelles):
+    {"intervalle_secondes": 300, "taille_lot": 50, "visibilite_secondes": 300}
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import redis
+from loguru import logger
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+
+from app.core import metrics, rate_limit
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.models.agent_auto import AgentAuto, TypeAgentEnum, StatutAgentEnum
+from app.models.campagne_client import StatutEnvoiEnum
+from app.models.message import Message, TypeMessageEnum
+from app.services import evenements_envoi, file_messages, politique_contact
+from app.services.canaux import Envoi, get_canal
+
+TRAITES_PREFIX = "agents:traites:"
+TRAITES_TTL_SECONDS = 7200
+
+# Types de messages traités par type d'agent (None : tous)
+_TYPES_MESSAGES = {
+    TypeAgentEnum.SMS: TypeMessageEnum.SMS,
+    TypeAgentEnum.EMAIL: TypeMessageEnum.EMAIL,
+    TypeAgentEnum.MIXTE: None,
+}
+
+
+def cle_seau(id_agent: int) -> str:
+    """Seau à jetons de l'agent (capacite_max par heure)"""
+    return f"agent:{id_agent}"
+
+
+# ========================
+# COMPTEURS ET UTILISATION
+# ========================
+
+def _minute(t: float) -> int:
+    return int(t // 60)
+
+
+def compter_traites(db: Session, traites: Dict[int, int], maintenant: Optional[datetime] = None) -> None:
+    """
+    Ajouter des messages traités aux agents (sans COMMIT)
+
+    Incrément SQL atomique : des workers concurrents ne perdent aucune unité.
+    """
+    if not traites:
+        return
+    maintenant = maintenant or datetime.now().astimezone()
+    for id_agent, n in traites.items():
+        db.execute(
+            update(AgentAuto)
+            .where(AgentAuto.id_agent == id_agent)
+            .values(messages_traites=func.coalesce(AgentAuto.messages_traites, 0) + n, date_dernier_run=maintenant)
+        )
+
+    minute = _minute(time.time())
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for id_agent, n in traites.items():
+            key = f"{TRAITES_PREFIX}{id_agent}:{minute}"
+            pipe.incrby(key, n)
+            pipe.expire(key, TRAITES_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (utilisation des agents): {e}")
+    for id_agent, n in traites.items():
+        metrics.incr(f"agents.{id_agent}.traites", n)
+
+
+def traites_derniere_heure(id_agent: int) -> Optional[int]:
+    """Messages traités sur les 60 dernières minutes (None si Redis indisponible)"""
+    minute = _minute(time.time())
+    try:
+        valeurs = redis_client.mget([f"{TRAITES_PREFIX}{id_agent}:{m}" for m in range(minute - 59, minute + 1)])
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (utilisation des agents): {e}")
+        return None
+    return sum(int(v) for v in valeurs if v)
+
+
+def utilisation(id_agent: int, capacite_max: Optional[int]) -> Optional[float]:
+    """Taux d'utilisation (%) de la capacité horaire sur l'heure glissante"""
+    traites = traites_derniere_heure(id_agent)
+    if traites is None or not capacite_max:
+        return None
+    return round(traites / capacite_max * 100, 2)
+
+
+# ========================
+# PLANIFICATION
+# ========================
+
+def reclamer_agents_dus(db: Session) -> List[int]:
+    """Réserver les agents actifs à réveiller (bail de AGENTS_RUN_SECONDS + 60 s)"""
+    dus = (
+        select(AgentAuto.id_agent)
+        .where(
+            AgentAuto.statut == StatutAgentEnum.ACTIF,
+            (AgentAuto.date_prochain_run.is_(None)) | (AgentAuto.date_prochain_run <= func.now()),
+        )
+        .with_for_update(skip_locked=True)
+    )
+    ids = list(db.scalars(
+        update(AgentAuto)
+        .where(AgentAuto.id_agent.in_(dus.scalar_subquery()))
+        .values(date_prochain_run=func.now() + timedelta(seconds=settings.AGENTS_RUN_SECONDS + 60))
+        .returning(AgentAuto.id_agent),
+        execution_options={"synchronize_session": False},
+    ))
+    db.commit()
+    return ids
+
+
+def _replanifier(db: Session, id_agent: int, delai: float) -> None:
+    db.execute(
+        update(AgentAuto)
+        .where(AgentAuto.id_agent == id_agent)
+        .values(date_prochain_run=func.now() + timedelta(seconds=delai))
+    )
+    db.commit()
+
+
+# ========================
+# EXÉCUTION
+# ========================
+
+def _contact(message: Message) -> politique_contact.Contact:
+    membre = f"c{message.id_campagne_client}" if message.id_campagne_client else f"m{message.id_message}"
+    return message.id_dossier, message.type.value, membre
+
+
+def _traiter_lot(db: Session, id_agent: int, messages: List[Message]) -> Dict[str, int]:
+    """Envoyer des messages réclamés, acquitter succès, échecs et reports, compter (COMMIT inclus)"""
+    delais = politique_contact.reserver([_contact(m) for m in messages])
+    reportes = {m.id_message: d for m, d in zip(messages, delais) if d}
+    file_messages.reporter(db, reportes)
+    messages = [m for m in messages if m.id_message not in reportes]
+
+    par_canal: Dict[str, List[Message]] = {}
+    for message in messages:
+        par_canal.setdefault(message.type.value, []).append(message)
+
+    envoyes, echecs = [], []
+    for canal, lot in par_canal.items():
+        sortie = get_canal(canal).envoyer_lot([
+            Envoi(m.id_message, m.destinataire, m.sujet if canal == "Email" else None, m.contenu) for m in lot
+        ])
+        for message, resultat in zip(lot, sortie):
+            (envoyes if resultat.succes else echecs).append((message, resultat))
+
+    # Un envoi en échec ne compte pas comme contact
+    politique_contact.liberer([_contact(m) for m, _ in echecs])
+
+    maintenant = datetime.now().astimezone()
+    if envoyes:
+        ids = [m.id_message for m, _ in envoyes]
+        db.execute(
+            update(Message),
+            [{"id_message": m.id_message, "id_agent_auto": id_agent, "id_externe": r.id_externe} for m, r in envoyes],
+        )
+        evenements_envoi.appliquer_evenements(db, [
+            evenements_envoi.Evenement(evenements_envoi.CIBLE_MESSAGE, i, StatutEnvoiEnum.ENVOYE, maintenant)
+            for i in ids
+        ])
+    for message, resultat in echecs:
+        file_messages.echec(db, message.id_message, resultat.code_erreur, resultat.message_erreur)
+    if messages:
+        compter_traites(db, {id_agent: len(messages)}, maintenant)
+    db.commit()
+    return {"envoyes": len(envoyes), "echecs": len(echecs), "reportes": len(reportes)}
+
+
+def executer_agent(db: Session, id_agent: int, duree_max: float) -> dict:
+    """
+    Traiter la file pendant au plus duree_max secondes, dans la capacité de l'agent
+
+    Replanifie l'agent en fin d'exécution : tout de suite s'il reste du
+    travail et de la capacité, sinon après configuration["intervalle_secondes"].
+    """
+    bilan = {"id_agent": id_agent, "envoyes": 0, "echecs": 0, "reportes": 0, "lots": 0, "arret": None}
+    agent = db.execute(
+        select(AgentAuto.type, AgentAuto.statut, AgentAuto.capacite_max, AgentAuto.configuration)
+        .where(AgentAuto.id_agent == id_agent)
+    ).first()
+    if agent is None or agent.statut != StatutAgentEnum.ACTIF:
+        bilan["arret"] = "inactif"
+        return bilan
+
+    configuration = agent.configuration or {}
+    intervalle = configuration.get("intervalle_secondes", settings.AGENTS_INTERVALLE_DEFAUT)
+    taille_lot = configuration.get("taille_lot", settings.AGENTS_LOT_DEFAUT)
+    visibilite = configuration.get("visibilite_secondes")
+    capacite = agent.capacite_max or 0
+    type_message = _TYPES_MESSAGES[agent.type]
+
+    if not politique_contact.amorcer(db):
+        bilan["arret"] = "amorcage"
+        _replanifier(db, id_agent, intervalle)
+        return bilan
+
+    debut = time.monotonic()
+    try:
+        while time.monotonic() - debut < duree_max:
+            if not politique_contact.dans_plage():
+                bilan["arret"] = "hors_plage"
+                break
+            jetons = rate_limit.prendre(cle_seau(id_agent), taille_lot, capacite=capacite)
+            if not jetons:
+                bilan["arret"] = "quota"
+                break
+            messages = file_messages.reclamer(db, jetons, type_message, visibilite)
+            rate_limit.rendre(cle_seau(id_agent), jetons - len(messages), capacite=capacite)
+            if not messages:
+                bilan["arret"] = "vide"
+                break
+            lot = _traiter_lot(db, id_agent, messages)
+            # Messages reportés par la politique de contact : jetons non consommés
+            rate_limit.rendre(cle_seau(id_agent), lot["reportes"], capacite=capacite)
+            bilan["envoyes"] += lot["envoyes"]
+            bilan["echecs"] += lot["echecs"]
+            bilan["reportes"] += lot["reportes"]
+            bilan["lots"] += 1
+        else:
+            bilan["arret"] = "duree"
+    except Exception:
+        db.rollback()
+        metrics.incr(f"agents.{id_agent}.erreurs")
+        logger.exception(f"❌ Agent {id_agent} : exécution interrompue")
+        _replanifier(db, id_agent, intervalle)
+        raise
+
+    metrics.observe(f"agents.{id_agent}.duree_run", time.monotonic() - debut)
+    taux = utilisation(id_agent, capacite)
+    if taux is not None:
+        metrics.gauge(f"agents.{id_agent}.utilisation", taux)
+    _replanifier(db, id_agent, 0 if bilan["arret"] == "duree" else intervalle)
+    return bilan
@@ -0,0 +1,125 @@
+"""
+Canaux d'envoi des messages (SMS, Email)
+
+Chaque canal est un adaptateur : une classe dérivée de CanalEnvoi dont
+la méthode envoyer_lot() reçoit un lot d'envois et renvoie un résultat par
+envoi, dans le même ordre. L'adaptateur utilisé par canal est configuré
+par chemin d'import (CANAL_SMS_ADAPTER, CANAL_EMAIL_ADAPTER) : brancher un
+fournisseur réel (passerelle SMS, SMTP, API transactionnelle) ne touche
+pas au dispatcher.
+
+Les adaptateurs par défaut sont des bouchons locaux : ils journalisent le
+message et le déclarent envoyé si le destinataire est plausible.
+"""
+
+import importlib
+import re
+import uuid
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class Envoi:
+    """Message prêt à partir"""
+
+    __slots__ = ("reference", "destinataire", "sujet", "contenu")
+
+    def __init__(self, reference: int, destinataire: Optional[str], sujet: Optional[str], contenu: str):
+        self.reference = reference          # id CampagneClient (ou Message)
+        self.destinataire = destinataire
+        self.sujet = sujet
+        self.contenu = contenu
+
+
+class ResultatEnvoi:
+    """Issue d'un envoi ; id_externe = identifiant chez le fournisseur"""
+
+    __slots__ = ("succes", "id_externe", "code_erreur", "message_erreur")
+
+    def __init__(self, succes: bool, id_externe: Optional[str] = None,
+                 code_erreur: Optional[str] = None, message_erreur: Optional[str] = None):
+        self.succes = succes
+        self.id_externe = id_externe
+        self.code_erreur = code_erreur
+        self.message_erreur = message_erreur
+
+    @classmethod
+    def echec(cls, code: str, message: str) -> "ResultatEnvoi":
+        return cls(False, code_erreur=code, message_erreur=message)
+
+
+class CanalEnvoi:
+    """Adaptateur de canal ; surcharger envoyer() ou, pour un envoi groupé, envoyer_lot()"""
+
+    nom = "?"
+
+    def envoyer(self, envoi: Envoi) -> ResultatEnvoi:
+        raise NotImplementedError
+
+    def envoyer_lot(self, envois: List[Envoi]) -> List[ResultatEnvoi]:
+        resultats = []
+        for envoi in envois:
+            try:
+                resultats.append(self.envoyer(envoi))
+            except Exception as e:
+                print(f"❌ Erreur canal {self.nom} (envoi {envoi.reference}): {e}")
+                resultats.append(ResultatEnvoi.echec("ERREUR_CANAL", str(e)))
+        return resultats
+
+
+# ========================
+# BOUCHONS LOCAUX
+# ========================
+
+_TELEPHONE = re.compile(r"^\+?[0-9 ]{8,20}$")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class SmsStub(CanalEnvoi):
+    nom = "SMS"
+
+    def envoyer(self, envoi: Envoi) -> ResultatEnvoi:
+        if not envoi.destinataire or not _TELEPHONE.match(envoi.destinataire):
+            return ResultatEnvoi.echec("DESTINATAIRE_INVALIDE", "Numéro de téléphone invalide")
+        logger.debug(f"📱 SMS → {envoi.destinataire} : {envoi.contenu[:60]}")
+        return ResultatEnvoi(True, id_externe=f"sms-{uuid.uuid4().hex[:12]}")
+
+
+class EmailStub(CanalEnvoi):
+    nom = "Email"
+
+    def envoyer(self, envoi: Envoi) -> ResultatEnvoi:
+        if not envoi.destinataire or not _EMAIL.match(envoi.destinataire):
+            return ResultatEnvoi.echec("DESTINATAIRE_INVALIDE", "Adresse email invalide")
+        logger.debug(f"📧 Email → {envoi.destinataire} : {envoi.sujet or ''}")
+        return ResultatEnvoi(True, id_externe=f"mail-{uuid.uuid4().hex[:12]}")
+
+
+# ========================
+# REGISTRE
+# ========================
+
+_canaux: Dict[str, CanalEnvoi] = {}
+
+
+def _charger(chemin: str) -> CanalEnvoi:
+    module, _, classe = chemin.rpartition(".")
+    return getattr(importlib.import_module(module), classe)()
+
+
+def get_canal(nom: str) -> CanalEnvoi:
+    """Adaptateur du canal "SMS" ou "Email" (instancié une fois par processus)"""
+    if nom not in _canaux:
+        chemins = {"SMS": settings.CANAL_SMS_ADAPTER, "Email": settings.CANAL_EMAIL_ADAPTER}
+        if nom not in chemins:
+            raise ValueError(f"Canal inconnu : {nom}")
+        _canaux[nom] = _charger(chemins[nom])
+    return _canaux[nom]
+
+
+def enregistrer_canal(nom: str, canal: CanalEnvoi) -> None:
+    """Remplacer l'adaptateur d'un canal (fournisseur spécifique, tests)"""
+    _canaux[nom] = canal
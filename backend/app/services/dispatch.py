@@ -0,0 +1,446 @@
+"""
+Moteur d'envoi des campagnes
+
+Un lot = deux transactions :
+    1. Jetons pris dans le seau de chaque agent automatique actif compatible
+       (capacite_max messages par heure, voir app.core.rate_limit)
+    2. Réservation d'autant de CampagneClient "EnAttente" par
+       SELECT ... FOR UPDATE SKIP LOCKED : plusieurs workers (ou processus)
+       vident la même campagne sans jamais prendre la même cible
+    2 bis. Politique de contact (app.services.politique_contact), en un
+       aller-retour Redis pour le lot : les dossiers déjà trop sollicités
+       sont reportés (date_report) au lieu d'être envoyés
+    2 ter. Les cibles retenues reçoivent une date_reservation, puis COMMIT :
+       la prise est durable AVANT tout appel aux fournisseurs
+    3. Rendu du template compilé (variables du lot en une requête), envoi par l'adaptateur du canal (app.services.canaux)
+       Test A/B : chaque cible reçoit le template de sa variante (id_variante)
+    4. Écriture groupée : messages créés (avec l'id_externe du fournisseur),
+       cibles passées en Envoye / Echec (app.services.evenements_envoi,
+       compteurs de campagne compris), messages_traites des agents
+       incrémentés en SQL (app.services.agents_auto.compter_traites), puis COMMIT
+
+Un worker arrêté avant le COMMIT de l'étape 2 ter annule sa transaction :
+les cibles redeviennent disponibles pour le suivant. Arrêté après, ses
+cibles restent réservées et ne sont jamais renvoyées : au-delà de
+DISPATCH_RESERVATION_SECONDS elles passent en Echec (ENVOI_INTERROMPU,
+recuperer_interrompus). Un débiteur n'est donc jamais contacté deux fois
+pour la même cible, au prix d'un échec à relancer à la main si le
+fournisseur n'avait pas reçu le lot.
+
+La pause d'une campagne (/campagnes/{id}/pause) est prise en compte au lot
+suivant : le statut est relu avant chaque réservation. Hors de la plage
+horaire de contact, aucun lot n'est envoyé.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, insert, exists, or_, func
+from sqlalchemy.orm import Session
+
+from app.core import metrics, rate_limit
+from app.core.config import settings
+from app.models.agent_auto import AgentAuto, TypeAgentEnum, StatutAgentEnum
+from app.models.campagne import Campagne, TypeCampagneEnum, StatutCampagneEnum
+from app.models.campagne_client import CampagneClient, StatutEnvoiEnum
+from app.models.campagne_variante import CampagneVariante
+from app.models.client import Client
+from app.models.dossier_client import DossierClient
+from app.models.message import Message, TypeMessageEnum, StatutMessageEnum
+from app.models.template import Template
+from app.services import rendu_templates, evenements_envoi, politique_contact, agents_auto
+from app.services.canaux import Envoi, get_canal
+
+# Agents autorisés à envoyer pour chaque type de campagne
+_AGENTS_COMPATIBLES = {
+    TypeCampagneEnum.SMS:   (TypeAgentEnum.SMS, TypeAgentEnum.MIXTE),
+    TypeCampagneEnum.EMAIL: (TypeAgentEnum.EMAIL, TypeAgentEnum.MIXTE),
+    TypeCampagneEnum.MIXTE: (TypeAgentEnum.SMS, TypeAgentEnum.EMAIL, TypeAgentEnum.MIXTE),
+}
+
+
+# ========================
+# JETONS
+# ========================
+
+# (id_agent, capacite_max) : les agents sont lus une fois par boucle de worker
+Agent = Tuple[int, int]
+
+
+def _prendre_jetons(agents: List[Agent], demande: int) -> List[Tuple[Agent, int]]:
+    """Répartir la demande sur les seaux des agents (ordre aléatoire : charge étalée)"""
+    agents = list(agents)
+    random.shuffle(agents)
+    accordes = []
+    for agent in agents:
+        if demande <= 0:
+            break
+        n = rate_limit.prendre(agents_auto.cle_seau(agent[0]), demande, capacite=agent[1])
+        if n:
+            accordes.append((agent, n))
+            demande -= n
+    return accordes
+
+
+def _rendre_jetons(accordes: List[Tuple[Agent, int]], inutilises: int) -> None:
+    """Restituer les jetons en trop (moins de cibles disponibles que prévu)"""
+    for agent, n in reversed(accordes):
+        if inutilises <= 0:
+            break
+        rendus = min(n, inutilises)
+        rate_limit.rendre(agents_auto.cle_seau(agent[0]), rendus, capacite=agent[1])
+        inutilises -= rendus
+
+
+# ========================
+# RÉSERVATION ET ENVOI
+# ========================
+
+def _reserver(db: Session, campagne_id: int, limite: int) -> list:
+    """Cibles en attente, verrouillées pour la transaction (SKIP LOCKED)"""
+    return (
+        db.query(
+            CampagneClient.id,
+            CampagneClient.id_dossier,
+            CampagneClient.canal,
+            CampagneClient.id_variante,
+            Client.telephone,
+            Client.email,
+        )
+        .select_from(CampagneClient)
+        .join(DossierClient, DossierClient.id_dossier == CampagneClient.id_dossier)
+        .join(Client, Client.id_client == DossierClient.id_client)
+        .filter(
+            CampagneClient.id_campagne == campagne_id,
+            CampagneClient.statut == StatutEnvoiEnum.EN_ATTENTE,
+            CampagneClient.date_reservation.is_(None),
+            or_(CampagneClient.date_report.is_(None), CampagneClient.date_report <= func.now()),
+        )
+        .order_by(CampagneClient.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True, of=CampagneClient)
+        .all()
+    )
+
+
+def _canal_cible(cible) -> str:
+    """Canal effectif : une cible MIXTE part en SMS si un numéro est connu"""
+    if cible.canal == "SMS" or (cible.canal == "MIXTE" and cible.telephone):
+        return "SMS"
+    return "Email"
+
+
+def _contact(cible) -> politique_contact.Contact:
+    return cible.id_dossier, _canal_cible(cible), f"c{cible.id}"
+
+
+def _filtrer_contacts(db: Session, cibles: list) -> Tuple[list, int]:
+    """
+    Appliquer la politique de contact au lot réservé
+
+    Les cibles refusées restent "EnAttente" avec une date_report (fin de la
+    fenêtre qui les bloque) : elles ne sont plus réservées d'ici là.
+
+    Returns:
+        (cibles autorisées, nombre de cibles reportées)
+    """
+    delais = politique_contact.reserver([_contact(cible) for cible in cibles])
+    maintenant = datetime.now().astimezone()
+    reports = [
+        {"id": cible.id, "date_report": maintenant + timedelta(seconds=delai)}
+        for cible, delai in zip(cibles, delais) if delai
+    ]
+    acceptees = [cible for cible, delai in zip(cibles, delais) if not delai]
+    if reports:
+        try:
+            db.execute(update(CampagneClient), reports)
+        except Exception:
+            # Contacts déjà enregistrés dans Redis : ne pas les laisser bloquer une semaine
+            politique_contact.liberer([_contact(cible) for cible in acceptees])
+            raise
+        metrics.incr("dispatch.reportes", len(reports))
+    return acceptees, len(reports)
+
+
+def _prendre(db: Session, cibles: list) -> None:
+    """Marquer les cibles comme prises par ce worker (sans COMMIT)"""
+    if cibles:
+        db.execute(
+            update(CampagneClient)
+            .where(CampagneClient.id.in_([cible.id for cible in cibles]))
+            .values(date_reservation=func.now()),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def recuperer_interrompus(db: Session, campagne_id: int) -> int:
+    """
+    Cibles prises depuis plus de DISPATCH_RESERVATION_SECONDS sans résultat
+
+    Le worker s'est arrêté entre la prise et l'écriture des résultats : le
+    fournisseur a peut-être envoyé le message, la cible passe donc en Echec
+    plutôt que d'être renvoyée (COMMIT inclus). Renvoie le nombre de cibles.
+    """
+    ids = list(db.scalars(
+        select(CampagneClient.id).where(
+            CampagneClient.id_campagne == campagne_id,
+            CampagneClient.statut == StatutEnvoiEnum.EN_ATTENTE,
+            CampagneClient.date_reservation
+            < func.now() - timedelta(seconds=settings.DISPATCH_RESERVATION_SECONDS),
+        )
+    ))
+    if ids:
+        evenements_envoi.appliquer_evenements(db, [
+            evenements_envoi.Evenement(
+                evenements_envoi.CIBLE_CAMPAGNE_CLIENT, i, StatutEnvoiEnum.ECHEC,
+                code_erreur="ENVOI_INTERROMPU",
+                message_erreur="Worker arrêté après la prise de la cible",
+            )
+            for i in ids
+        ])
+        db.commit()
+        metrics.incr("dispatch.interrompus", len(ids))
+        print(f"❌ Campagne {campagne_id} : {len(ids)} envois interrompus passés en échec")
+    return len(ids)
+
+
+def _preparer(cible, rendu: Tuple[Optional[str], str]) -> Tuple[str, Envoi]:
+    canal = _canal_cible(cible)
+    objet, corps = rendu
+    destinataire = cible.telephone if canal == "SMS" else cible.email
+    return canal, Envoi(cible.id, destinataire, objet if canal == "Email" else None, corps)
+
+
+def envoyer_lot(db: Session, campagne_id: int, templates: Dict[Optional[int], Template], agents: List[Agent]) -> dict:
+    """
+    Envoyer un lot de DISPATCH_BATCH_SIZE cibles au plus
+
+    Returns:
+        {"envoyes", "echecs", "reportes", "limite"} ; limite=True si les
+        quotas des agents ont borné le lot
+    """
+    accordes = _prendre_jetons(agents, settings.DISPATCH_BATCH_SIZE)
+    jetons = sum(n for _, n in accordes)
+    if not jetons:
+        return {"envoyes": 0, "echecs": 0, "reportes": 0, "limite": True}
+
+    cibles = []
+    try:
+        cibles, reportes = _filtrer_contacts(db, _reserver(db, campagne_id, jetons))
+        # Prise durable avant l'appel aux fournisseurs
+        _prendre(db, cibles)
+        db.commit()
+    except Exception:
+        db.rollback()
+        politique_contact.liberer([_contact(cible) for cible in cibles])
+        _rendre_jetons(accordes, jetons)
+        raise
+    _rendre_jetons(accordes, jetons - len(cibles))
+    if not cibles:
+        return {"envoyes": 0, "echecs": 0, "reportes": reportes, "limite": False}
+
+    # Attribution des cibles aux agents, dans la limite des jetons de chacun
+    attribution = [agent[0] for agent, n in accordes for _ in range(n)][:len(cibles)]
+
+    # Personnalisation du lot : variables lues en une requête, template compilé
+    # de la variante de chaque cible (templates[None] : template de la campagne)
+    variables = rendu_templates.variables_dossiers(db, [cible.id_dossier for cible in cibles])
+    rendus = {
+        cible.id: rendu_templates.compiler(templates.get(cible.id_variante) or templates[None])
+        .rendre(variables.get(cible.id_dossier, {}))
+        for cible in cibles
+    }
+
+    par_canal: Dict[str, List[Tuple[int, Envoi]]] = {}
+    for i, cible in enumerate(cibles):
+        canal, envoi = _preparer(cible, rendus[cible.id])
+        par_canal.setdefault(canal, []).append((i, envoi))
+
+    resultats = [None] * len(cibles)
+    envois = [None] * len(cibles)
+    types = [None] * len(cibles)
+    for canal, items in par_canal.items():
+        sortie = get_canal(canal).envoyer_lot([envoi for _, envoi in items])
+        for (i, envoi), resultat in zip(items, sortie):
+            resultats[i], envois[i], types[i] = resultat, envoi, canal
+
+    maintenant = datetime.now().astimezone()
+    messages, evenements = [], []
+    traites: Dict[int, int] = {}
+    for i, cible in enumerate(cibles):
+        resultat, envoi, id_agent = resultats[i], envois[i], attribution[i]
+        messages.append({
+            "id_campagne_client": cible.id,
+            "id_dossier": cible.id_dossier,
+            "type": TypeMessageEnum.SMS if types[i] == "SMS" else TypeMessageEnum.EMAIL,
+            "destinataire": envoi.destinataire or "",
+            "sujet": envoi.sujet,
+            "contenu": envoi.contenu,
+            "date_envoi": maintenant if resultat.succes else None,
+            "statut": StatutMessageEnum.ENVOYE if resultat.succes else StatutMessageEnum.ECHEC,
+            "id_agent_auto": id_agent,
+            "code_erreur": resultat.code_erreur,
+            "message_erreur": resultat.message_erreur,
+            "id_externe": resultat.id_externe,
+        })
+        evenements.append(evenements_envoi.Evenement(
+            evenements_envoi.CIBLE_CAMPAGNE_CLIENT,
+            cible.id,
+            StatutEnvoiEnum.ENVOYE if resultat.succes else StatutEnvoiEnum.ECHEC,
+            maintenant,
+        ))
+        traites[id_agent] = traites.get(id_agent, 0) + 1
+
+    # Un envoi en échec ne compte pas comme contact
+    politique_contact.liberer([
+        _contact(cible) for cible, resultat in zip(cibles, resultats) if not resultat.succes
+    ])
+
+    db.execute(insert(Message), messages)
+    # Statut des cibles et compteurs de la campagne, comme pour les accusés
+    evenements_envoi.appliquer_evenements(db, evenements)
+    agents_auto.compter_traites(db, traites, maintenant)
+    db.commit()
+
+    envoyes = sum(1 for r in resultats if r.succes)
+    metrics.incr("dispatch.envoyes", envoyes)
+    if len(cibles) - envoyes:
+        metrics.incr("dispatch.echecs", len(cibles) - envoyes)
+    return {
+        "envoyes": envoyes,
+        "echecs": len(cibles) - envoyes,
+        "reportes": reportes,
+        "limite": jetons < settings.DISPATCH_BATCH_SIZE,
+    }
+
+
+# ========================
+# BOUCLE D'UN WORKER
+# ========================
+
+def _statut(db: Session, campagne_id: int) -> Optional[StatutCampagneEnum]:
+    return db.execute(select(Campagne.statut).where(Campagne.id_campagne == campagne_id)).scalar()
+
+
+def dispatcher_campagne(db: Session, campagne_id: int, duree_max: float) -> dict:
+    """
+    Envoyer des lots pendant au plus duree_max secondes
+
+    S'arrête dès que la campagne n'est plus "EnCours" (pause, annulation),
+    hors de la plage horaire de contact, quand les quotas des agents sont
+    épuisés ou qu'il n'y a plus de cible envoyable.
+    Passe la campagne en "Terminee" quand plus aucune cible n'attend.
+    """
+    bilan = {"campagne_id": campagne_id, "envoyes": 0, "echecs": 0, "reportes": 0, "lots": 0, "arret": None}
+    if not politique_contact.dans_plage():
+        bilan["arret"] = "hors_plage"
+        return bilan
+    if not politique_contact.amorcer(db):
+        bilan["arret"] = "amorcage"
+        return bilan
+    bilan["echecs"] += recuperer_interrompus(db, campagne_id)
+
+    campagne = db.query(Campagne).filter(Campagne.id_campagne == campagne_id).first()
+    if campagne is None:
+        bilan["arret"] = "introuvable"
+        return bilan
+
+    templates = _charger_templates(db, campagne)
+    if templates is None:
+        print(f"❌ Campagne {campagne_id} : template absent ou inactif, envoi impossible")
+        bilan["arret"] = "template"
+        return bilan
+
+    agents = [
+        (a.id_agent, a.capacite_max or 0)
+        for a in db.query(AgentAuto.id_agent, AgentAuto.capacite_max).filter(
+            AgentAuto.statut == StatutAgentEnum.ACTIF,
+            AgentAuto.type.in_(_AGENTS_COMPATIBLES[campagne.type]),
+        )
+    ]
+    if not agents:
+        bilan["arret"] = "aucun_agent"
+        return bilan
+
+    fin = time.monotonic() + duree_max
+    while time.monotonic() < fin:
+        if _statut(db, campagne_id) != StatutCampagneEnum.EN_COURS:
+            bilan["arret"] = "pause"
+            break
+        if not politique_contact.dans_plage():
+            bilan["arret"] = "hors_plage"
+            break
+
+        lot = envoyer_lot(db, campagne_id, templates, agents)
+        bilan["envoyes"] += lot["envoyes"]
+        bilan["echecs"] += lot["echecs"]
+        bilan["reportes"] += lot["reportes"]
+
+        if lot["envoyes"] + lot["echecs"] == 0:
+            if lot["reportes"]:
+                # Lot entièrement reporté : les cibles suivantes restent envoyables
+                continue
+            if lot["limite"]:
+                bilan["arret"] = "quota"
+            else:
+                bilan["arret"] = "vide"
+                _terminer_si_vide(db, campagne_id)
+            break
+        bilan["lots"] += 1
+        if lot["limite"]:
+            bilan["arret"] = "quota"
+            break
+    else:
+        bilan["arret"] = "duree"
+
+    return bilan
+
+
+def _charger_templates(db: Session, campagne: Campagne) -> Optional[Dict[Optional[int], Template]]:
+    """
+    Templates de la campagne : {None: template de la campagne, id_variante: template}
+
+    None si un template attendu est absent ou inactif. Les templates sont
+    détachés : lisibles sans rechargement après les COMMIT de chaque lot.
+    """
+    attendus: Dict[Optional[int], int] = {}
+    if campagne.id_template:
+        attendus[None] = campagne.id_template
+    for id_variante, id_template in db.query(CampagneVariante.id_variante, CampagneVariante.id_template).filter(
+        CampagneVariante.id_campagne == campagne.id_campagne
+    ):
+        attendus[id_variante] = id_template
+    if not attendus:
+        return None
+
+    actifs = {
+        t.id_template: t
+        for t in db.query(Template).filter(
+            Template.id_template.in_(set(attendus.values())), Template.actif.is_(True)
+        )
+    }
+    if not set(attendus.values()) <= set(actifs):
+        return None
+    for template in actifs.values():
+        db.expunge(template)
+    templates = {cle: actifs[id_template] for cle, id_template in attendus.items()}
+    # Sans template de campagne, une cible sans variante prend la première variante
+    templates.setdefault(None, next(iter(templates.values())))
+    return templates
+
+
+def _terminer_si_vide(db: Session, campagne_id: int) -> None:
+    """Campagne terminée quand aucune cible n'est plus en attente (même verrouillée ailleurs)"""
+    reste = db.execute(select(exists().where(
+        CampagneClient.id_campagne == campagne_id,
+        CampagneClient.statut == StatutEnvoiEnum.EN_ATTENTE,
+    ))).scalar()
+    if not reste:
+        db.execute(
+            update(Campagne)
+            .where(Campagne.id_campagne == campagne_id, Campagne.statut == StatutCampagneEnum.EN_COURS)
+            .values(statut=StatutCampagneEnum.TERMINEE)
+        )
+        db.commit()
@@ -0,0 +1,213 @@
+"""
+Estimations rapides pour les tableaux de bord à périmètre global (precision=approx)
+
+Sources:
+    - Statistiques du planificateur (pg_class.reltuples, pg_stats) : effectifs
+      et répartitions par valeur, tenus à jour par ANALYZE / autovacuum
+    - HyperLogLog Redis "hll:clients" : clients distincts (erreur type 0,81 %),
+      alimenté à chaque création de dossier et reconstruit chaque nuit
+    - TABLESAMPLE SYSTEM sur creances : sommes et ratios avec marge d'erreur
+      à 95 % (estimateur de Horvitz-Thompson, tirage supposé bernoullien ;
+      SYSTEM tirant des blocs entiers, la marge est indicative)
+
+Chaque fonction renvoie None quand l'estimation n'est pas disponible ou pas
+fiable (table trop petite, statistiques absentes, Redis indisponible) :
+l'appelant repasse alors en calcul exact.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+import redis
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.redis_client import redis_client
+from app.models.dossier_client import DossierClient
+
+Z_95 = 1.96
+HLL_CLIENTS_KEY = "hll:clients"
+HLL_ERREUR_TYPE = 0.0081
+HLL_BATCH = 10000
+
+
+def estimation(valeur: float, marge: Optional[float]) -> dict:
+    """Valeur estimée et demi-largeur de l'intervalle de confiance à 95 %"""
+    return {"valeur": valeur, "marge": None if marge is None else round(marge, 2)}
+
+
+# ========================
+# STATISTIQUES DU PLANIFICATEUR
+# ========================
+
+def effectif(db: Session, table: str) -> Optional[int]:
+    """Nombre de lignes estimé (pg_class.reltuples) ; None si jamais analysée"""
+    n = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+        {"t": table},
+    ).scalar()
+    return n if n is not None and n >= 0 else None
+
+
+def repartition(db: Session, table: str, colonne: str) -> Optional[Dict[str, int]]:
+    """
+    Effectif estimé par valeur (valeurs les plus fréquentes de pg_stats)
+
+    Adapté aux colonnes à faible cardinalité (statuts, priorités) dont
+    toutes les valeurs figurent dans most_common_vals.
+    """
+    total = effectif(db, table)
+    if not total:
+        return None
+    row = db.execute(
+        text(
+            "SELECT most_common_vals::text::text[] AS vals, most_common_freqs AS freqs "
+            "FROM pg_stats WHERE schemaname = current_schema() "
+            "AND tablename = :t AND attname = :c"
+        ),
+        {"t": table, "c": colonne},
+    ).first()
+    if row is None or row.vals is None:
+        return None
+    return {v: int(round(f * total)) for v, f in zip(row.vals, row.freqs)}
+
+
+# ========================
+# HYPERLOGLOG : CLIENTS DISTINCTS
+# ========================
+
+def clients_distincts() -> Optional[dict]:
+    """Clients distincts (PFCOUNT) ; None tant que le sketch n'est pas construit"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.exists(HLL_CLIENTS_KEY)
+        pipe.pfcount(HLL_CLIENTS_KEY)
+        existe, n = pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (HyperLogLog clients): {e}")
+        return None
+    if not existe:
+        return None
+    return estimation(n, Z_95 * HLL_ERREUR_TYPE * n)
+
+
+def reconstruire_hll_clients() -> int:
+    """
+    Reconstruire le sketch depuis dossiers_clients (curseur serveur)
+
+    Écrit dans une clé temporaire puis RENAME : les lecteurs ne voient
+    jamais un sketch partiel. Rattrape les suppressions, que HyperLogLog
+    ne sait pas retirer.
+    """
+    tmp = f"{HLL_CLIENTS_KEY}:tmp"
+    redis_client.delete(tmp)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=HLL_BATCH).execute(
+            text("SELECT DISTINCT id_client FROM dossiers_clients")
+        )
+        for batch in result.partitions():
+            redis_client.pfadd(tmp, *[row.id_client for row in batch])
+    if not redis_client.exists(tmp):
+        redis_client.pfadd(tmp)  # aucun client : sketch vide mais construit
+    redis_client.rename(tmp, HLL_CLIENTS_KEY)
+    return redis_client.pfcount(HLL_CLIENTS_KEY)
+
+
+def _noter_client(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.id_client is not None:
+        session.info.setdefault("hll_clients", set()).add(target.id_client)
+
+
+event.listen(DossierClient, "after_insert", _noter_client)
+
+
+@event.listens_for(Session, "after_commit")
+def _alimenter_hll(session):
+    clients = session.info.pop("hll_clients", None)
+    if clients:
+        try:
+            # Sans sketch construit, PFADD en créerait un partiel
+            if redis_client.exists(HLL_CLIENTS_KEY):
+                redis_client.pfadd(HLL_CLIENTS_KEY, *clients)
+        except redis.RedisError as e:
+            print(f"❌ Erreur Redis (HyperLogLog clients): {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _oublier_hll(session):
+    session.info.pop("hll_clients", None)
+
+
+# ========================
+# ÉCHANTILLONNAGE DES CRÉANCES
+# ========================
+
+_ECHANTILLON_SQL = """
+SELECT {groupe}
+       count(*)                                              AS n,
+       count(*) FILTER (WHERE jours_retard > 0)              AS n_retard,
+       COALESCE(sum(montant_initial), 0)                     AS s_init,
+       COALESCE(sum(montant_initial * montant_initial), 0)   AS s2_init,
+       COALESCE(sum(montant_paye), 0)                        AS s_paye,
+       COALESCE(sum(montant_paye * montant_paye), 0)         AS s2_paye,
+       COALESCE(sum(montant_paye * montant_initial), 0)      AS s_paye_init,
+       COALESCE(sum(montant_restant), 0)                     AS s_rest,
+       COALESCE(sum(montant_restant * montant_restant), 0)   AS s2_rest
+FROM creances TABLESAMPLE SYSTEM (:pct)
+{group_by}
+"""
+
+
+def _estimer(row, q: float) -> dict:
+    """Totaux extrapolés (÷ q) et marges Horvitz-Thompson : √((1-q)/q² · Σx²)"""
+    f = (1 - q) / (q * q)
+    total = lambda s, s2: estimation(float(s) / q, Z_95 * math.sqrt(f * float(s2)))
+
+    s_init, s_paye = float(row.s_init), float(row.s_paye)
+    if s_init > 0:
+        # Ratio payé / initial : linéarisation (y - R·x)
+        r = s_paye / s_init
+        residus = float(row.s2_paye) - 2 * r * float(row.s_paye_init) + r * r * float(row.s2_init)
+        taux = estimation(r * 100, Z_95 * math.sqrt(f * max(residus, 0)) / (s_init / q) * 100)
+    else:
+        taux = estimation(0, None)
+
+    p = row.n_retard / row.n
+    return {
+        "nb_creances":     estimation(row.n / q, Z_95 * math.sqrt(f * row.n)),
+        "montant_initial": total(row.s_init, row.s2_init),
+        "montant_paye":    total(row.s_paye, row.s2_paye),
+        "montant_restant": total(row.s_rest, row.s2_rest),
+        "taux_recouvrement": taux,
+        "taux_retard":     estimation(p, Z_95 * math.sqrt(p * (1 - p) / row.n)),
+    }
+
+
+def echantillon_creances(db: Session, par_type_credit: bool = False):
+    """
+    Estimations sur un échantillon de APPROX_SAMPLE_PERCENT % des blocs
+
+    Returns:
+        dict d'estimations, ou {type_credit: dict} si par_type_credit ;
+        None si la table compte moins de APPROX_MIN_ROWS lignes
+    """
+    total = effectif(db, "creances")
+    if total is None or total < settings.APPROX_MIN_ROWS:
+        return None
+
+    pct = settings.APPROX_SAMPLE_PERCENT
+    q = pct / 100
+    sql = _ECHANTILLON_SQL.format(
+        groupe="type_credit," if par_type_credit else "",
+        group_by="GROUP BY type_credit" if par_type_credit else "",
+    )
+    rows: List = db.execute(text(sql), {"pct": pct}).all()
+    rows = [r for r in rows if r.n]
+    if not rows:
+        return None
+    if par_type_credit:
+        return {r.type_credit: _estimer(r, q) for r in rows}
+    return _estimer(rows[0], q)
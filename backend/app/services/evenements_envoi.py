@@ -0,0 +1,297 @@
+"""
+Application groupée des événements d'envoi (accusés des fournisseurs)
+
+Un lot d'événements (envoyé, délivré, ouvert, cliqué, échec) visant des
+CampagneClient ou des Message est appliqué en deux ordres SQL au plus,
+dans la transaction de l'appelant :
+
+    1. messages         : UPDATE ... FROM unnest(...) ; les messages liés à
+                          une cible de campagne lui propagent l'événement
+    2. campagnes_clients : UPDATE ... FROM unnest(...), et dans le même ordre
+                          (CTE) incrément des compteurs de la Campagne
+
+Transitions monotones : les statuts sont rangés
+    EnAttente < Envoye < Echec < Delivre < Ouvert < Clique
+et un événement de rang inférieur ou égal au statut courant ne le modifie
+pas : les accusés arrivés dans le désordre (ouvert avant délivré) donnent
+le même résultat que dans l'ordre. Les dates, elles, sont renseignées à la
+première occurrence, y compris les étapes implicites (un clic date aussi
+l'ouverture, la délivrance et l'envoi s'ils manquent).
+
+Compteurs de campagne (nombre_envoyes / _delivres / _ouverts / _cliques) :
+nombre de cibles dont la date correspondante vient de passer de NULL à
+renseignée ; un événement rejoué ne compte donc jamais deux fois. Les
+compteurs des variantes de test A/B (campagnes_variantes) suivent la même
+règle, dans le même ordre SQL.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.models.campagne_client import StatutEnvoiEnum
+
+CIBLE_CAMPAGNE_CLIENT = "campagne_client"
+CIBLE_MESSAGE = "message"
+
+RANGS = {
+    StatutEnvoiEnum.EN_ATTENTE: 0,
+    StatutEnvoiEnum.ENVOYE: 1,
+    StatutEnvoiEnum.ECHEC: 2,
+    StatutEnvoiEnum.DELIVRE: 3,
+    StatutEnvoiEnum.OUVERT: 4,
+    StatutEnvoiEnum.CLIQUE: 5,
+}
+
+# Dates renseignées par un statut (étapes implicites comprises)
+_DATES = {
+    StatutEnvoiEnum.ENVOYE: ("date_envoi",),
+    StatutEnvoiEnum.ECHEC: (),
+    StatutEnvoiEnum.DELIVRE: ("date_envoi", "date_delivre"),
+    StatutEnvoiEnum.OUVERT: ("date_envoi", "date_delivre", "date_ouvert"),
+    StatutEnvoiEnum.CLIQUE: ("date_envoi", "date_delivre", "date_ouvert", "date_clique"),
+}
+_COLONNES_DATES = ("date_envoi", "date_delivre", "date_ouvert", "date_clique")
+
+
+class Evenement:
+    """Événement d'envoi normalisé"""
+
+    __slots__ = ("cible", "id", "statut", "horodatage", "code_erreur", "message_erreur")
+
+    def __init__(self, cible: str, id: int, statut: StatutEnvoiEnum,
+                 horodatage: Optional[datetime] = None,
+                 code_erreur: Optional[str] = None, message_erreur: Optional[str] = None):
+        self.cible = cible
+        self.id = id
+        self.statut = StatutEnvoiEnum(statut)
+        # Horodatage naïf : heure locale du serveur
+        self.horodatage = (horodatage or datetime.now()).astimezone()
+        self.code_erreur = code_erreur
+        self.message_erreur = message_erreur
+
+
+def _rang_sql(colonne: str, autres: Optional[Dict[str, int]] = None) -> str:
+    """Rang SQL du statut courant (enum stocké par nom)"""
+    rangs = {s.name: r for s, r in RANGS.items()}
+    rangs.update(autres or {})
+    branches = " ".join(f"WHEN '{nom}' THEN {r}" for nom, r in rangs.items())
+    return f"(CASE {colonne}::text {branches} ELSE 0 END)"
+
+
+class _Cumul:
+    """Événements d'une même ligne fusionnés : rang max, première date par étape"""
+
+    __slots__ = ("statut", "dates", "code_erreur", "message_erreur")
+
+    def __init__(self):
+        self.statut: Optional[StatutEnvoiEnum] = None
+        self.dates: Dict[str, datetime] = {}
+        self.code_erreur = None
+        self.message_erreur = None
+
+    def ajouter(self, ev: Evenement) -> None:
+        if self.statut is None or RANGS[ev.statut] > RANGS[self.statut]:
+            self.statut = ev.statut
+        for colonne in _DATES.get(ev.statut, ()):
+            if colonne not in self.dates or ev.horodatage < self.dates[colonne]:
+                self.dates[colonne] = ev.horodatage
+        if ev.statut == StatutEnvoiEnum.ECHEC:
+            self.code_erreur = ev.code_erreur or self.code_erreur
+            self.message_erreur = ev.message_erreur or self.message_erreur
+
+
+def _fusionner(evenements: Iterable[Evenement]) -> Dict[int, _Cumul]:
+    cumuls: Dict[int, _Cumul] = {}
+    for ev in evenements:
+        if ev.statut == StatutEnvoiEnum.EN_ATTENTE:
+            continue
+        cumuls.setdefault(ev.id, _Cumul()).ajouter(ev)
+    return cumuls
+
+
+def _parametres(cumuls: Dict[int, _Cumul], colonnes_dates: Tuple[str, ...]) -> dict:
+    ids = sorted(cumuls)  # ordre stable des verrous : pas d'interblocage entre lots
+    params = {
+        "ids": ids,
+        "rangs": [RANGS[cumuls[i].statut] for i in ids],
+        "statuts": [cumuls[i].statut.name for i in ids],
+    }
+    for colonne in colonnes_dates:
+        params[colonne] = [cumuls[i].dates.get(colonne) for i in ids]
+    return params
+
+
+# ========================
+# MESSAGES
+# ========================
+
+# Un message en file morte vaut un échec : seul un accusé de délivrance l'en fait sortir
+_RANGS_MESSAGES = {"ABANDONNE": RANGS[StatutEnvoiEnum.ECHEC]}
+
+_MESSAGES_SQL = f"""
+WITH v AS (
+    SELECT * FROM unnest(
+        CAST(:ids AS integer[]), CAST(:rangs AS integer[]), CAST(:statuts AS text[]),
+        CAST(:date_envoi AS timestamptz[]), CAST(:date_delivre AS timestamptz[]),
+        CAST(:codes AS text[]), CAST(:textes AS text[])
+    ) AS v(id, rang, statut, d_envoi, d_delivre, code_erreur, message_erreur)
+),
+avant AS (
+    SELECT m.id_message, {_rang_sql("m.statut", _RANGS_MESSAGES)} AS rang
+    FROM messages m JOIN v ON v.id = m.id_message
+    ORDER BY m.id_message
+    FOR UPDATE OF m
+)
+UPDATE messages m SET
+    statut = CASE WHEN v.rang > avant.rang THEN CAST(v.statut AS statutmessageenum) ELSE m.statut END,
+    date_envoi = COALESCE(m.date_envoi, v.d_envoi),
+    date_delivre = COALESCE(m.date_delivre, v.d_delivre),
+    code_erreur = CASE WHEN v.rang > avant.rang AND v.statut = 'ECHEC'
+                       THEN COALESCE(v.code_erreur, m.code_erreur) ELSE m.code_erreur END,
+    message_erreur = CASE WHEN v.rang > avant.rang AND v.statut = 'ECHEC'
+                          THEN COALESCE(v.message_erreur, m.message_erreur) ELSE m.message_erreur END,
+    updated_at = now()
+FROM v JOIN avant ON avant.id_message = v.id
+WHERE m.id_message = v.id
+RETURNING m.id_message, m.id_campagne_client, (v.rang > avant.rang) AS transition
+"""
+
+
+def _appliquer_messages(db: Session, evenements: List[Evenement]) -> Tuple[dict, List[Evenement]]:
+    """Mettre à jour les messages ; renvoie le bilan et les événements à propager"""
+    cumuls = _fusionner(evenements)
+    if not cumuls:
+        return {"recus": 0, "inconnus": 0, "transitions": 0}, []
+
+    params = _parametres(cumuls, ("date_envoi", "date_delivre"))
+    params["codes"] = [cumuls[i].code_erreur for i in params["ids"]]
+    params["textes"] = [cumuls[i].message_erreur for i in params["ids"]]
+    rows = db.execute(text(_MESSAGES_SQL), params).all()
+
+    liens = {row.id_message: row.id_campagne_client for row in rows if row.id_campagne_client}
+    propages = [
+        Evenement(CIBLE_CAMPAGNE_CLIENT, liens[ev.id], ev.statut, ev.horodatage)
+        for ev in evenements if ev.id in liens
+    ]
+    return {
+        "recus": len(cumuls),
+        "inconnus": len(cumuls) - len(rows),
+        "transitions": sum(1 for row in rows if row.transition),
+    }, propages
+
+
+# ========================
+# CAMPAGNES_CLIENTS ET COMPTEURS
+# ========================
+
+_CAMPAGNES_CLIENTS_SQL = f"""
+WITH v AS (
+    SELECT * FROM unnest(
+        CAST(:ids AS integer[]), CAST(:rangs AS integer[]), CAST(:statuts AS text[]),
+        CAST(:date_envoi AS timestamptz[]), CAST(:date_delivre AS timestamptz[]),
+        CAST(:date_ouvert AS timestamptz[]), CAST(:date_clique AS timestamptz[])
+    ) AS v(id, rang, statut, d_envoi, d_delivre, d_ouvert, d_clique)
+),
+avant AS (
+    SELECT cc.id, cc.id_campagne, cc.id_variante, {_rang_sql("cc.statut")} AS rang,
+           cc.date_envoi, cc.date_delivre, cc.date_ouvert, cc.date_clique
+    FROM campagnes_clients cc JOIN v ON v.id = cc.id
+    ORDER BY cc.id
+    FOR UPDATE OF cc
+),
+apres AS (
+    UPDATE campagnes_clients cc SET
+        statut = CASE WHEN v.rang > avant.rang THEN CAST(v.statut AS statutenvoienum) ELSE cc.statut END,
+        date_envoi = COALESCE(cc.date_envoi, v.d_envoi),
+        date_delivre = COALESCE(cc.date_delivre, v.d_delivre),
+        date_ouvert = COALESCE(cc.date_ouvert, v.d_ouvert),
+        date_clique = COALESCE(cc.date_clique, v.d_clique),
+        updated_at = now()
+    FROM v JOIN avant ON avant.id = v.id
+    WHERE cc.id = v.id
+    RETURNING cc.id, cc.date_envoi, cc.date_delivre, cc.date_ouvert, cc.date_clique,
+              (v.rang > avant.rang) AS transition
+),
+delta AS (
+    SELECT avant.id_campagne,
+           count(*) FILTER (WHERE avant.date_envoi IS NULL AND apres.date_envoi IS NOT NULL)     AS envoyes,
+           count(*) FILTER (WHERE avant.date_delivre IS NULL AND apres.date_delivre IS NOT NULL) AS delivres,
+           count(*) FILTER (WHERE avant.date_ouvert IS NULL AND apres.date_ouvert IS NOT NULL)   AS ouverts,
+           count(*) FILTER (WHERE avant.date_clique IS NULL AND apres.date_clique IS NOT NULL)   AS cliques
+    FROM apres JOIN avant ON avant.id = apres.id
+    GROUP BY avant.id_campagne
+),
+compteurs AS (
+    UPDATE campagnes c SET
+        nombre_envoyes  = COALESCE(c.nombre_envoyes, 0)  + delta.envoyes,
+        nombre_delivres = COALESCE(c.nombre_delivres, 0) + delta.delivres,
+        nombre_ouverts  = COALESCE(c.nombre_ouverts, 0)  + delta.ouverts,
+        nombre_cliques  = COALESCE(c.nombre_cliques, 0)  + delta.cliques
+    FROM delta
+    WHERE c.id_campagne = delta.id_campagne
+      AND (delta.envoyes + delta.delivres + delta.ouverts + delta.cliques) > 0
+    RETURNING c.id_campagne
+),
+delta_variantes AS (
+    SELECT avant.id_variante,
+           count(*) FILTER (WHERE avant.date_envoi IS NULL AND apres.date_envoi IS NOT NULL)     AS envoyes,
+           count(*) FILTER (WHERE avant.date_delivre IS NULL AND apres.date_delivre IS NOT NULL) AS delivres,
+           count(*) FILTER (WHERE avant.date_ouvert IS NULL AND apres.date_ouvert IS NOT NULL)   AS ouverts,
+           count(*) FILTER (WHERE avant.date_clique IS NULL AND apres.date_clique IS NOT NULL)   AS cliques
+    FROM apres JOIN avant ON avant.id = apres.id
+    WHERE avant.id_variante IS NOT NULL
+    GROUP BY avant.id_variante
+),
+compteurs_variantes AS (
+    UPDATE campagnes_variantes v SET
+        nombre_envoyes  = v.nombre_envoyes  + d.envoyes,
+        nombre_delivres = v.nombre_delivres + d.delivres,
+        nombre_ouverts  = v.nombre_ouverts  + d.ouverts,
+        nombre_cliques  = v.nombre_cliques  + d.cliques
+    FROM delta_variantes d
+    WHERE v.id_variante = d.id_variante
+      AND (d.envoyes + d.delivres + d.ouverts + d.cliques) > 0
+    RETURNING v.id_variante
+)
+SELECT (SELECT count(*) FROM apres)                  AS connus,
+       (SELECT count(*) FROM apres WHERE transition) AS transitions,
+       (SELECT count(*) FROM compteurs)              AS campagnes
+"""
+
+
+def _appliquer_campagnes_clients(db: Session, evenements: List[Evenement]) -> dict:
+    cumuls = _fusionner(evenements)
+    if not cumuls:
+        return {"recus": 0, "inconnus": 0, "transitions": 0, "campagnes": 0}
+
+    row = db.execute(text(_CAMPAGNES_CLIENTS_SQL), _parametres(cumuls, _COLONNES_DATES)).one()
+    return {
+        "recus": len(cumuls),
+        "inconnus": len(cumuls) - row.connus,
+        "transitions": row.transitions,
+        "campagnes": row.campagnes,
+    }
+
+
+def appliquer_evenements(db: Session, evenements: Iterable[Evenement]) -> dict:
+    """
+    Appliquer un lot d'événements (sans COMMIT : à la charge de l'appelant)
+
+    Returns:
+        {"messages": bilan, "campagnes_clients": bilan} ; bilan =
+        {"recus", "inconnus", "transitions"} (lignes distinctes visées,
+        introuvables, dont le statut a avancé)
+    """
+    par_cible: Dict[str, List[Evenement]] = {CIBLE_MESSAGE: [], CIBLE_CAMPAGNE_CLIENT: []}
+    for ev in evenements:
+        par_cible[ev.cible].append(ev)
+
+    bilan_messages, propages = _appliquer_messages(db, par_cible[CIBLE_MESSAGE])
+    bilan_cc = _appliquer_campagnes_clients(db, par_cible[CIBLE_CAMPAGNE_CLIENT] + propages)
+
+    metrics.incr("evenements_envoi.recus", bilan_messages["recus"] + bilan_cc["recus"])
+    return {"messages": bilan_messages, "campagnes_clients": bilan_cc}
@@ -0,0 +1,240 @@
+"""
+File d'envoi des messages unitaires (table messages)
+
+Un message "EnAttente" est dans la file ; il est servi par priorité
+décroissante puis par ancienneté (id_message), index partiel
+ix_messages_file.
+
+Priorité = 10 x priorité du dossier (Basse 0 ... Critique 3) + niveau de la
+plus grave alerte non traitée du dossier (Info 0, Warning 1, Critique 2).
+Elle est calculée à la mise en file et recalée périodiquement
+(rafraichir_priorites) pour suivre les changements du dossier.
+
+Cycle d'un message:
+    reclamer()      SELECT ... FOR UPDATE SKIP LOCKED : plusieurs expéditeurs
+                    vident la file sans prendre le même message ; le message
+                    reste "EnAttente" mais devient invisible pendant
+                    FILE_MESSAGES_VISIBILITE_SECONDS (tentatives + 1)
+    marquer_envoye  sortie de la file (app.crud.message)
+    echec()         nouvel essai après un délai exponentiel, ou file morte
+                    ("Abandonne") après FILE_MESSAGES_TENTATIVES_MAX tentatives
+    reporter()      refus de la politique de contact : le message revient
+                    après le délai indiqué, sans compter de tentative
+    (rien)          expéditeur arrêté : le message redevient visible à la fin
+                    du délai de visibilité et sera réclamé à nouveau
+
+Les messages de campagne envoyés par app.services.dispatch n'entrent pas
+dans la file : ils sont créés directement avec leur résultat.
+"""
+
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update, text, func
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.campagne_client import StatutEnvoiEnum
+from app.models.message import Message, TypeMessageEnum, StatutMessageEnum
+from app.services import evenements_envoi
+
+# Priorité d'un dossier d:  à insérer dans une requête où d = dossiers_clients
+_PRIORITE_SQL = """
+    CASE d.priorite WHEN 'CRITIQUE' THEN 30 WHEN 'HAUTE' THEN 20 WHEN 'NORMALE' THEN 10 ELSE 0 END
+    + COALESCE((
+        SELECT max(CASE a.niveau WHEN 'CRITIQUE' THEN 2 WHEN 'WARNING' THEN 1 ELSE 0 END)
+        FROM alertes a
+        WHERE a.id_dossier = d.id_dossier AND a.traitee IS NOT TRUE
+    ), 0)
+"""
+
+_RAFRAICHIR_SQL = f"""
+UPDATE messages m SET priorite = p.priorite
+FROM (
+    SELECT d.id_dossier, {_PRIORITE_SQL} AS priorite
+    FROM dossiers_clients d
+    WHERE d.id_dossier IN (SELECT id_dossier FROM messages WHERE statut = 'EN_ATTENTE')
+) p
+WHERE m.id_dossier = p.id_dossier
+  AND m.statut = 'EN_ATTENTE'
+  AND m.priorite IS DISTINCT FROM p.priorite
+"""
+
+# Tentatives épuisées par des expéditeurs arrêtés avant d'acquitter
+_EXPIRES_SQL = """
+UPDATE messages SET statut = 'ABANDONNE', updated_at = now()
+WHERE statut = 'EN_ATTENTE' AND tentatives >= :max AND disponible_a <= now()
+RETURNING id_message, id_campagne_client
+"""
+
+# Délai : BACKOFF x 2^(tentatives - 1), plafonné, avec ±25 % d'aléa
+# (les échecs simultanés d'un fournisseur ne reviennent pas tous ensemble)
+_ECHEC_SQL = """
+UPDATE messages SET
+    code_erreur = :code_erreur,
+    message_erreur = :message_erreur,
+    statut = CASE WHEN tentatives >= :max
+                  THEN CAST('ABANDONNE' AS statutmessageenum) ELSE statut END,
+    disponible_a = CASE WHEN tentatives >= :max THEN disponible_a
+                        ELSE now() + make_interval(secs => least(
+                            :backoff * power(2, greatest(tentatives - 1, 0)), :backoff_max
+                        ) * (0.75 + random() / 2)) END,
+    updated_at = now()
+WHERE id_message = :id AND statut = 'EN_ATTENTE'
+RETURNING statut, id_campagne_client
+"""
+
+
+_REPORTER_SQL = """
+UPDATE messages m SET
+    disponible_a = now() + make_interval(secs => v.delai),
+    tentatives = greatest(m.tentatives - 1, 0),
+    updated_at = now()
+FROM unnest(CAST(:ids AS integer[]), CAST(:delais AS integer[])) AS v(id, delai)
+WHERE m.id_message = v.id AND m.statut = 'EN_ATTENTE'
+"""
+
+
+def priorite_dossier(db: Session, id_dossier: int) -> int:
+    """Priorité de file d'un nouveau message pour ce dossier"""
+    return db.execute(
+        text(f"SELECT {_PRIORITE_SQL} FROM dossiers_clients d WHERE d.id_dossier = :id"),
+        {"id": id_dossier},
+    ).scalar() or 0
+
+
+def rafraichir_priorites(db: Session) -> int:
+    """Recaler la priorité des messages en attente ; renvoie le nombre modifié"""
+    modifies = db.execute(text(_RAFRAICHIR_SQL)).rowcount
+    db.commit()
+    return modifies
+
+
+def _abandonner(db: Session, rows: Sequence) -> None:
+    """Répercuter la mise en file morte sur les cibles de campagne liées"""
+    if not rows:
+        return
+    metrics.incr("file_messages.abandonnes", len(rows))
+    evenements_envoi.appliquer_evenements(db, [
+        evenements_envoi.Evenement(evenements_envoi.CIBLE_CAMPAGNE_CLIENT, row.id_campagne_client, StatutEnvoiEnum.ECHEC)
+        for row in rows if row.id_campagne_client
+    ])
+
+
+# ========================
+# RÉCLAMATION
+# ========================
+
+def reclamer(
+    db: Session,
+    limite: int,
+    type_message: Optional[TypeMessageEnum] = None,
+    visibilite: Optional[int] = None
+) -> List[Message]:
+    """
+    Réserver les `limite` prochains messages de la file (COMMIT inclus)
+
+    Les messages renvoyés sont détachés de la session : lisibles sans
+    rechargement. L'expéditeur doit les acquitter (marquer_envoye /
+    marquer_echec) avant la fin du délai de visibilité.
+    """
+    _abandonner(db, db.execute(text(_EXPIRES_SQL), {"max": settings.FILE_MESSAGES_TENTATIVES_MAX}).all())
+
+    visibilite = visibilite or settings.FILE_MESSAGES_VISIBILITE_SECONDS
+    choisis = (
+        select(Message.id_message)
+        .where(Message.statut == StatutMessageEnum.EN_ATTENTE, Message.disponible_a <= func.now())
+        .order_by(Message.priorite.desc(), Message.id_message)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )
+    if type_message:
+        choisis = choisis.where(Message.type == type_message)
+
+    messages = list(db.scalars(
+        update(Message)
+        .where(Message.id_message.in_(choisis.scalar_subquery()))
+        .values(
+            disponible_a=func.now() + timedelta(seconds=visibilite),
+            tentatives=Message.tentatives + 1,
+            updated_at=func.now(),
+        )
+        .returning(Message),
+        execution_options={"synchronize_session": False},
+    ))
+    for message in messages:
+        db.expunge(message)
+    db.commit()
+
+    metrics.incr("file_messages.reclames", len(messages))
+    return sorted(messages, key=lambda m: (-m.priorite, m.id_message))
+
+
+def apercu(db: Session, limite: int, type_message: Optional[TypeMessageEnum] = None) -> List[Message]:
+    """Prochains messages servis par la file, sans les réserver"""
+    query = db.query(Message).filter(
+        Message.statut == StatutMessageEnum.EN_ATTENTE,
+        Message.disponible_a <= func.now(),
+    )
+    if type_message:
+        query = query.filter(Message.type == type_message)
+    return query.order_by(Message.priorite.desc(), Message.id_message).limit(limite).all()
+
+
+# ========================
+# ÉCHECS ET FILE MORTE
+# ========================
+
+def echec(db: Session, message_id: int, code_erreur: str, message_erreur: str) -> Optional[StatutMessageEnum]:
+    """
+    Échec d'envoi signalé par l'expéditeur (sans COMMIT)
+
+    Returns:
+        EN_ATTENTE (nouvel essai programmé), ABANDONNE (file morte), ou None
+        si le message n'est pas dans la file
+    """
+    row = db.execute(text(_ECHEC_SQL), {
+        "id": message_id,
+        "code_erreur": code_erreur,
+        "message_erreur": message_erreur,
+        "max": settings.FILE_MESSAGES_TENTATIVES_MAX,
+        "backoff": settings.FILE_MESSAGES_BACKOFF_SECONDS,
+        "backoff_max": settings.FILE_MESSAGES_BACKOFF_MAX_SECONDS,
+    }).first()
+    if row is None:
+        return None
+    statut = StatutMessageEnum[row.statut]
+    if statut == StatutMessageEnum.ABANDONNE:
+        _abandonner(db, [row])
+    else:
+        metrics.incr("file_messages.reessais")
+    return statut
+
+
+def reporter(db: Session, delais: Dict[int, int]) -> None:
+    """Rendre des messages réclamés à la file après {id_message: délai en secondes} (sans COMMIT)"""
+    if not delais:
+        return
+    ids = sorted(delais)
+    db.execute(text(_REPORTER_SQL), {"ids": ids, "delais": [delais[i] for i in ids]})
+    metrics.incr("file_messages.reportes", len(ids))
+
+
+def rejouer(db: Session, ids_messages: Sequence[int]) -> int:
+    """Remettre en file des messages abandonnés (tentatives remises à zéro)"""
+    if not ids_messages:
+        return 0
+    remis = db.execute(
+        update(Message)
+        .where(Message.id_message.in_(ids_messages), Message.statut == StatutMessageEnum.ABANDONNE)
+        .values(
+            statut=StatutMessageEnum.EN_ATTENTE,
+            tentatives=0,
+            disponible_a=func.now(),
+            updated_at=func.now(),
+        ),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.commit()
+    return remis
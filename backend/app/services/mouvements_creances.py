@@ -0,0 +1,139 @@
+"""
+Journal des mouvements de créances et soldes à date ("as of")
+
+enregistrer_paiement et les mises à jour de créances écrasent montant_paye /
+montant_restant ; ce journal append-only en garde l'historique :
+
+    - Toute création de Creance, ou modification de montant_paye /
+      montant_restant par l'ORM, ajoute une ligne dans le même flush
+      (variation du payé + soldes résultants, auteur si connu)
+    - L'auteur est lu dans session.info["id_utilisateur"] s'il est renseigné
+    - reprendre_historique() crée une ligne REPRISE (soldes actuels, datée
+      de la création de la créance) pour les créances antérieures au journal ;
+      l'index unique partiel uq_mouvements_creances_reprise garantit une
+      seule reprise par créance quand plusieurs instances démarrent ensemble.
+      Faute d'historique, tout le payé antérieur est compté (delta_paye) au
+      mois de création de la créance dans les séries mensuelles
+
+Solde à une date:
+    dernière ligne de la créance avant la fin du jour as_of, lue par un
+    JOIN LATERAL ... ORDER BY date_mouvement DESC LIMIT 1 : une descente
+    d'index (id_creance, date_mouvement) par créance, O(log n), sans
+    rejouer les mouvements. Les créances créées après as_of disparaissent
+    naturellement de la jointure.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.models.creance import Creance
+from app.models.mouvement_creance import MouvementCreance, TypeMouvementEnum
+
+
+# ========================
+# SOLDES À DATE
+# ========================
+
+def fin_de_journee(as_of: date) -> datetime:
+    """Borne exclue : mouvements du jour as_of inclus"""
+    return datetime.combine(as_of + timedelta(days=1), time.min)
+
+
+def soldes_au(as_of: date):
+    """
+    Sous-requête LATERAL (id_creance, montant_paye, montant_restant) à as_of
+
+    Corrélée à Creance : à joindre sur `solde.c.id_creance == Creance.id_creance`
+    dans une requête qui parcourt déjà les créances.
+    """
+    return (
+        select(
+            MouvementCreance.id_creance,
+            MouvementCreance.montant_paye,
+            MouvementCreance.montant_restant,
+        )
+        .where(
+            MouvementCreance.id_creance == Creance.id_creance,
+            MouvementCreance.date_mouvement < fin_de_journee(as_of),
+        )
+        .order_by(MouvementCreance.date_mouvement.desc(), MouvementCreance.id_mouvement.desc())
+        .limit(1)
+        .lateral("solde")
+    )
+
+
+# ========================
+# JOURNALISATION
+# ========================
+
+def _montant(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+@event.listens_for(Session, "before_flush")
+def _journaliser(session, flush_context, instances):
+    auteur = session.info.get("id_utilisateur")
+
+    for obj in list(session.new):
+        if isinstance(obj, Creance):
+            session.add(MouvementCreance(
+                creance=obj,
+                type_mouvement=TypeMouvementEnum.CREATION,
+                delta_paye=_montant(obj.montant_paye),
+                montant_paye=_montant(obj.montant_paye),
+                montant_restant=_montant(obj.montant_restant),
+                id_utilisateur=auteur,
+            ))
+
+    for obj in list(session.dirty):
+        if not isinstance(obj, Creance):
+            continue
+        attrs = inspect(obj).attrs
+        paye, restant = attrs.montant_paye.history, attrs.montant_restant.history
+        if not (paye.has_changes() or restant.has_changes()):
+            continue
+        ancien = paye.deleted[0] if paye.deleted else obj.montant_paye
+        delta = _montant(obj.montant_paye) - _montant(ancien)
+        session.add(MouvementCreance(
+            creance=obj,
+            type_mouvement=TypeMouvementEnum.PAIEMENT if delta > 0 else TypeMouvementEnum.AJUSTEMENT,
+            delta_paye=delta,
+            montant_paye=_montant(obj.montant_paye),
+            montant_restant=_montant(obj.montant_restant),
+            id_utilisateur=auteur,
+        ))
+
+
+# ========================
+# REPRISE DE L'EXISTANT
+# ========================
+
+_REPRISE_SQL = """
+INSERT INTO mouvements_creances
+    (id_creance, date_mouvement, type_mouvement, delta_paye, montant_paye, montant_restant)
+SELECT c.id_creance, c.created_at, 'REPRISE',
+       COALESCE(c.montant_paye, 0), COALESCE(c.montant_paye, 0), c.montant_restant
+FROM creances c
+WHERE NOT EXISTS (SELECT 1 FROM mouvements_creances m WHERE m.id_creance = c.id_creance)
+ON CONFLICT (id_creance) WHERE type_mouvement = 'REPRISE' DO NOTHING
+"""
+
+
+def reprendre_historique(db: Session) -> int:
+    """
+    Amorcer le journal pour les créances qui n'y figurent pas (idempotent)
+
+    Faute d'historique, les paiements antérieurs sont datés de la création
+    de la créance : la série mensuelle du dashboard les compte tous ce
+    mois-là. Sûr en cas de démarrages concurrents (ON CONFLICT sur l'index
+    unique des reprises).
+
+    Returns:
+        nombre de créances reprises
+    """
+    result = db.execute(text(_REPRISE_SQL))
+    db.commit()
+    return result.rowcount
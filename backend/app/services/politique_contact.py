@@ -0,0 +1,234 @@
+"""
+Politique de contact des débiteurs
+
+Avant tout envoi de campagne, chaque dossier est vérifié contre:
+    - CONTACT_MAX_PAR_JOUR / CONTACT_MAX_PAR_SEMAINE contacts, tous canaux
+      et toutes campagnes confondus (fenêtres glissantes de 24 h et 7 jours)
+    - CONTACT_MAX_SMS_SEMAINE / CONTACT_MAX_EMAIL_SEMAINE par canal
+    - la plage horaire autorisée (CONTACT_HEURE_DEBUT..FIN, CONTACT_JOURS,
+      heure locale CONTACT_FUSEAU)
+
+Les contacts récents sont tenus dans Redis, deux ensembles triés par dossier
+(score = horodatage):
+    contact:{id_dossier}          tous canaux
+    contact:{id_dossier}:{canal}  SMS / Email
+
+reserver() vérifie ET enregistre un lot complet en un seul script Lua, donc
+un aller-retour par lot et aucune course entre workers : un dossier présent
+dans trois campagnes simultanées n'est contacté qu'une fois si le plafond
+journalier est 1. Un dossier refusé reçoit le délai avant libération de la
+fenêtre qui le bloque.
+
+Les ensembles sont amorcés (et recalés toutes les heures) depuis la table
+messages, qui contient aussi les envois des campagnes (id_campagne_client) :
+le membre d'un envoi de campagne est "c{id_campagne_client}", celui d'un
+message hors campagne "m{id_message}", donc le recalage est idempotent.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import redis
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.models.message import Message, StatutMessageEnum
+
+JOUR = 86400
+SEMAINE = 7 * JOUR
+
+CONTACT_PREFIX = "contact:"
+AMORCE_KEY = "contact:_amorce"
+AMORCE_LOCK_KEY = "contact:_amorce:verrou"
+AMORCE_LOCK_TTL = 600
+AMORCE_BATCH = 5000
+
+# Redis indisponible : les cibles sont reportées plutôt qu'envoyées sans contrôle
+DELAI_INDISPONIBLE = 60
+
+# (id_dossier, canal "SMS" | "Email", membre unique de l'envoi)
+Contact = Tuple[int, str, str]
+
+# KEYS[2i-1], KEYS[2i] = ensembles tous canaux / canal du i-ème contact
+# ARGV = maintenant, max_jour, max_semaine, puis par contact : membre, max_canal
+# Renvoie par contact 0 (accepté et enregistré) ou le délai en secondes
+_RESERVER_LUA = """
+local maintenant = tonumber(ARGV[1])
+local max_jour = tonumber(ARGV[2])
+local max_semaine = tonumber(ARGV[3])
+local JOUR, SEMAINE = 86400, 604800
+local reponse = {}
+
+local function attente(cle, fenetre, max)
+    if max <= 0 then
+        return fenetre
+    end
+    local n = redis.call('ZCOUNT', cle, maintenant - fenetre, '+inf')
+    if n < max then
+        return 0
+    end
+    -- La fenêtre se libère quand le (n - max + 1)-ième contact en sort
+    local r = redis.call('ZRANGEBYSCORE', cle, maintenant - fenetre, '+inf', 'WITHSCORES', 'LIMIT', n - max, 1)
+    return math.max(1, math.ceil(tonumber(r[2]) + fenetre - maintenant))
+end
+
+for i = 1, #KEYS / 2 do
+    local tous, canal = KEYS[2 * i - 1], KEYS[2 * i]
+    local membre = ARGV[2 + 2 * i]
+    local max_canal = tonumber(ARGV[3 + 2 * i])
+    redis.call('ZREMRANGEBYSCORE', tous, '-inf', maintenant - SEMAINE)
+    redis.call('ZREMRANGEBYSCORE', canal, '-inf', maintenant - SEMAINE)
+
+    local delai = 0
+    if not redis.call('ZSCORE', tous, membre) then
+        delai = math.max(
+            attente(tous, JOUR, max_jour),
+            attente(tous, SEMAINE, max_semaine),
+            attente(canal, SEMAINE, max_canal)
+        )
+        if delai == 0 then
+            redis.call('ZADD', tous, maintenant, membre)
+            redis.call('ZADD', canal, maintenant, membre)
+            redis.call('EXPIRE', tous, SEMAINE)
+            redis.call('EXPIRE', canal, SEMAINE)
+        end
+    end
+    reponse[i] = delai
+end
+return reponse
+"""
+
+_reserver = redis_client.register_script(_RESERVER_LUA)
+
+
+def _cles(id_dossier: int, canal: str) -> Tuple[str, str]:
+    tous = f"{CONTACT_PREFIX}{id_dossier}"
+    return tous, f"{tous}:{canal}"
+
+
+def _max_canal(canal: str) -> int:
+    return settings.CONTACT_MAX_SMS_SEMAINE if canal == "SMS" else settings.CONTACT_MAX_EMAIL_SEMAINE
+
+
+# ========================
+# PLAGE HORAIRE
+# ========================
+
+def dans_plage(moment: Optional[datetime] = None) -> bool:
+    """Envoi autorisé à ce moment (heure locale du fuseau de contact)"""
+    local = (moment or datetime.now().astimezone()).astimezone(ZoneInfo(settings.CONTACT_FUSEAU))
+    jours = {int(j) for j in settings.CONTACT_JOURS.split(",") if j.strip()}
+    return local.weekday() in jours and settings.CONTACT_HEURE_DEBUT <= local.hour < settings.CONTACT_HEURE_FIN
+
+
+# ========================
+# RÉSERVATION
+# ========================
+
+def reserver(contacts: Sequence[Contact]) -> List[int]:
+    """
+    Vérifier et enregistrer un lot de contacts (un aller-retour Redis)
+
+    Returns:
+        pour chaque contact, 0 s'il est autorisé (et désormais compté), sinon
+        le nombre de secondes avant qu'il puisse l'être
+    """
+    if not contacts:
+        return []
+    keys, args = [], [time.time(), settings.CONTACT_MAX_PAR_JOUR, settings.CONTACT_MAX_PAR_SEMAINE]
+    for id_dossier, canal, membre in contacts:
+        keys.extend(_cles(id_dossier, canal))
+        args.extend((membre, _max_canal(canal)))
+    try:
+        return [int(d) for d in _reserver(keys=keys, args=args)]
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (politique de contact): {e}")
+        return [DELAI_INDISPONIBLE] * len(contacts)
+
+
+def liberer(contacts: Sequence[Contact]) -> None:
+    """Annuler des réservations dont l'envoi a échoué (non comptées comme contact)"""
+    if not contacts:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for id_dossier, canal, membre in contacts:
+            for cle in _cles(id_dossier, canal):
+                pipe.zrem(cle, membre)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (politique de contact): {e}")
+
+
+# ========================
+# AMORÇAGE DEPUIS LA BASE
+# ========================
+
+def reconstruire(db: Session) -> int:
+    """
+    Recharger les contacts des 7 derniers jours depuis messages
+
+    Ajout idempotent (ZADD sur des membres stables), sans effacer les
+    réservations en cours. Renvoie le nombre de contacts chargés.
+    """
+    depuis = datetime.now().astimezone() - timedelta(seconds=SEMAINE)
+    rows = db.execute(
+        select(
+            Message.id_message,
+            Message.id_campagne_client,
+            Message.id_dossier,
+            Message.type,
+            Message.date_envoi,
+        )
+        .where(Message.date_envoi >= depuis, Message.statut != StatutMessageEnum.ECHEC)
+        .execution_options(yield_per=AMORCE_BATCH)
+    )
+    charges = 0
+    pipe = redis_client.pipeline(transaction=False)
+    for row in rows:
+        membre = f"c{row.id_campagne_client}" if row.id_campagne_client else f"m{row.id_message}"
+        score = row.date_envoi.timestamp()
+        for cle in _cles(row.id_dossier, row.type.value):
+            pipe.zadd(cle, {membre: score})
+            pipe.expire(cle, SEMAINE)
+        charges += 1
+        if charges % AMORCE_BATCH == 0:
+            pipe.execute()
+    pipe.set(AMORCE_KEY, datetime.now().isoformat())
+    pipe.execute()
+    logger.info(f"📇 Politique de contact : {charges} contacts récents chargés")
+    return charges
+
+
+def amorcer(db: Session) -> bool:
+    """
+    S'assurer que les contacts récents sont chargés (Redis vidé ou redémarré)
+
+    Returns:
+        True si la politique peut être appliquée, False si un autre processus
+        est en train de la charger ou si Redis est indisponible
+    """
+    try:
+        if redis_client.exists(AMORCE_KEY):
+            return True
+        if not redis_client.set(AMORCE_LOCK_KEY, "1", nx=True, ex=AMORCE_LOCK_TTL):
+            return False
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (politique de contact): {e}")
+        return False
+    try:
+        reconstruire(db)
+        return True
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (politique de contact): {e}")
+        return False
+    finally:
+        try:
+            redis_client.delete(AMORCE_LOCK_KEY)
+        except redis.RedisError:
+            pass
@@ -0,0 +1,239 @@
+"""
+Cube pré-agrégé du portefeuille
+
+Table de faits "portefeuille_cube" (voir app.models.portefeuille_cube) :
+montants et effectifs agrégés au grain jour × région × agence × agent ×
+type de crédit × tranche d'ancienneté × statut. Les endpoints analytiques
+et le dashboard l'agrègent au lieu de rejoindre créances, dossiers et
+affectations à chaque requête.
+
+Fraîcheur:
+    - Reconstruction complète chaque nuit (tâche Celery, une transaction :
+      les lecteurs voient l'ancien cube jusqu'au commit, les écritures
+      incrémentales attendent la fin de la reconstruction)
+    - Incrémental : toute écriture ORM sur Creance / DossierClient /
+      AffectationDossier retire la contribution des dossiers concernés avant
+      le flush et la rajoute après, dans la même transaction. Les dossiers
+      sont d'abord verrouillés (FOR UPDATE) : deux transactions concurrentes
+      sur un même dossier appliquent leurs deltas l'une après l'autre, la
+      seconde retirant la contribution déjà mise à jour par la première.
+      Un objet rattaché à un autre dossier compte pour l'ancien et le nouveau.
+
+Les tranches d'ancienneté du cube suivent CUBE_AGING_BORNES ; une requête
+avec d'autres bornes (ou une date as_of) repasse par les tables sources.
+"""
+
+import time
+from typing import Iterable, Optional, FrozenSet, Set
+
+from sqlalchemy import event, inspect, text, false
+from sqlalchemy.orm import Session, Query
+
+from app.models.portefeuille_cube import PortefeuilleCube
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient
+from app.models.affectation_dossier import AffectationDossier
+
+# Bornes supérieures (incluses) des tranches : 0-30, 31-60, 61-90, 91-180, > 180
+CUBE_AGING_BORNES = (30, 60, 90, 180)
+
+_DIMENSIONS = (
+    "jour", "id_region", "id_agence", "id_agent",
+    "type_credit", "tranche_aging", "statut_creance", "statut_dossier",
+)
+_MESURES = (
+    "nb_creances", "nb_retard", "nb_dossiers",
+    "montant_initial", "montant_paye", "montant_restant",
+)
+
+# Contribution des dossiers au cube ; {filtre_aff} / {filtre_dossier} restreignent
+# aux dossiers :ids pour l'incrémental. Un seul dossier "représentant" (première
+# créance) porte nb_dossiers, ce qui rend la mesure additive.
+_CONTRIBUTION_SQL = """
+WITH aff AS (
+    SELECT DISTINCT ON (a.id_dossier)
+           a.id_dossier, a.id_agent, u.id_agence, ag.id_region
+    FROM affectations_dossiers a
+    JOIN utilisateurs u ON u.id_utilisateur = a.id_agent
+    LEFT JOIN agences ag ON ag.id_agence = u.id_agence
+    WHERE a.actif {filtre_aff}
+    ORDER BY a.id_dossier, a.date_affectation DESC
+),
+base AS (
+    SELECT d.date_ouverture::date                     AS jour,
+           COALESCE(aff.id_region, 0)                 AS id_region,
+           COALESCE(aff.id_agence, 0)                 AS id_agence,
+           COALESCE(aff.id_agent, 0)                  AS id_agent,
+           COALESCE(c.type_credit, '')                AS type_credit,
+           CASE WHEN c.jours_retard IS NULL OR c.jours_retard < 0 THEN -1
+                ELSE width_bucket(c.jours_retard, CAST(:seuils AS integer[]))
+           END                                        AS tranche_aging,
+           COALESCE(c.statut::text, '')               AS statut_creance,
+           d.statut::text                             AS statut_dossier,
+           c.id_creance, c.jours_retard,
+           c.montant_initial, c.montant_paye, c.montant_restant,
+           row_number() OVER (PARTITION BY d.id_dossier ORDER BY c.id_creance) = 1 AS representant
+    FROM dossiers_clients d
+    LEFT JOIN creances c ON c.id_dossier = d.id_dossier
+    LEFT JOIN aff ON aff.id_dossier = d.id_dossier
+    {filtre_dossier}
+)
+SELECT jour, id_region, id_agence, id_agent,
+       type_credit, tranche_aging, statut_creance, statut_dossier,
+       :signe * count(id_creance)                                  AS nb_creances,
+       :signe * count(id_creance) FILTER (WHERE jours_retard > 0)  AS nb_retard,
+       :signe * count(*) FILTER (WHERE representant)               AS nb_dossiers,
+       :signe * COALESCE(sum(montant_initial), 0)                  AS montant_initial,
+       :signe * COALESCE(sum(montant_paye), 0)                     AS montant_paye,
+       :signe * COALESCE(sum(montant_restant), 0)                  AS montant_restant
+FROM base
+GROUP BY jour, id_region, id_agence, id_agent,
+         type_credit, tranche_aging, statut_creance, statut_dossier
+"""
+
+_COLONNES = ", ".join(_DIMENSIONS + _MESURES)
+
+_UPSERT_SQL = (
+    f"INSERT INTO portefeuille_cube AS pc ({_COLONNES})\n"
+    + _CONTRIBUTION_SQL.format(
+        filtre_aff="AND a.id_dossier = ANY(:ids)",
+        filtre_dossier="WHERE d.id_dossier = ANY(:ids)",
+    )
+    + f"\nON CONFLICT ({', '.join(_DIMENSIONS)}) DO UPDATE SET "
+    + ", ".join(f"{m} = pc.{m} + EXCLUDED.{m}" for m in _MESURES)
+)
+
+_REBUILD_SQL = (
+    f"INSERT INTO portefeuille_cube ({_COLONNES})\n"
+    + _CONTRIBUTION_SQL.format(filtre_aff="", filtre_dossier="")
+)
+
+
+def _seuils() -> list:
+    # width_bucket(x, seuils) = nombre de seuils <= x → seuils = bornes basses
+    return [b + 1 for b in CUBE_AGING_BORNES]
+
+
+# ========================
+# RECONSTRUCTION COMPLÈTE
+# ========================
+
+def rebuild(db: Session) -> dict:
+    """
+    Reconstruire tout le cube en une transaction
+
+    Les lecteurs continuent de lire l'ancien contenu (MVCC) jusqu'au commit.
+    Le verrou SHARE ROW EXCLUSIVE (compatible avec les lectures) fait
+    attendre les deltas concurrents jusqu'au commit : aucun ne peut insérer
+    une ligne entre le DELETE et l'INSERT, ni se perdre dans le nouveau cube.
+    """
+    global _ready
+    started = time.perf_counter()
+    db.execute(text("LOCK TABLE portefeuille_cube IN SHARE ROW EXCLUSIVE MODE"))
+    build_id = db.execute(
+        text("INSERT INTO portefeuille_cube_builds DEFAULT VALUES RETURNING id_build")
+    ).scalar()
+    db.execute(text("DELETE FROM portefeuille_cube"))
+    result = db.execute(text(_REBUILD_SQL), {"seuils": _seuils(), "signe": 1})
+    duree_ms = int((time.perf_counter() - started) * 1000)
+    db.execute(
+        text(
+            "UPDATE portefeuille_cube_builds "
+            "SET finished_at = now(), nb_lignes = :n, duree_ms = :d WHERE id_build = :id"
+        ),
+        {"n": result.rowcount, "d": duree_ms, "id": build_id},
+    )
+    db.commit()
+    _ready = True
+    return {"id_build": build_id, "nb_lignes": result.rowcount, "duree_ms": duree_ms}
+
+
+_ready = False
+
+
+def is_ready(db) -> bool:
+    """
+    Le cube a-t-il été construit au moins une fois ?
+
+    Accepte une Session ou une Connection. Seul un résultat positif est
+    mis en cache : tant que la première construction n'est pas terminée,
+    chaque écriture revérifie, pour ne perdre aucun delta dès qu'elle l'est.
+    """
+    global _ready
+    if not _ready:
+        _ready = bool(db.execute(
+            text("SELECT EXISTS (SELECT 1 FROM portefeuille_cube_builds WHERE finished_at IS NOT NULL)")
+        ).scalar())
+    return _ready
+
+
+# ========================
+# INCRÉMENTAL
+# ========================
+
+def apply_delta(connection, dossier_ids: Iterable[int], signe: int) -> None:
+    """Ajouter (+1) ou retirer (-1) la contribution actuelle des dossiers"""
+    ids = sorted(set(i for i in dossier_ids if i is not None))
+    if ids:
+        connection.execute(text(_UPSERT_SQL), {"ids": ids, "seuils": _seuils(), "signe": signe})
+
+
+def lock_dossiers(connection, dossier_ids: Iterable[int]) -> None:
+    """Verrouiller les dossiers jusqu'à la fin de la transaction (ordre fixe : pas d'interblocage)"""
+    ids = sorted(set(i for i in dossier_ids if i is not None))
+    if ids:
+        connection.execute(
+            text(
+                "SELECT id_dossier FROM dossiers_clients "
+                "WHERE id_dossier = ANY(:ids) ORDER BY id_dossier FOR UPDATE"
+            ),
+            {"ids": ids},
+        )
+
+
+def _dossier_ids(obj) -> Set[int]:
+    """Dossier actuel de l'objet et, s'il a changé, celui d'avant"""
+    ids = {obj.id_dossier}
+    ids.update(inspect(obj).attrs.id_dossier.history.deleted or ())
+    return {i for i in ids if i is not None}
+
+
+_SUIVIS = (Creance, DossierClient, AffectationDossier)
+
+
+@event.listens_for(Session, "before_flush")
+def _retirer_avant_flush(session, flush_context, instances):
+    objets = [
+        o for o in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(o, _SUIVIS)
+    ]
+    if not objets or not is_ready(session.connection()):
+        return
+    ids = set().union(*map(_dossier_ids, objets))
+    session.info["cube_objets"] = (ids, objets)
+    # Verrou puis retrait : la contribution retirée est celle en base,
+    # commits concurrents compris
+    lock_dossiers(session.connection(), ids)
+    apply_delta(session.connection(), ids, -1)
+
+
+@event.listens_for(Session, "after_flush")
+def _ajouter_apres_flush(session, flush_context):
+    suivis = session.info.pop("cube_objets", None)
+    if suivis:
+        ids, objets = suivis
+        # Les ids des nouveaux dossiers sont connus après le flush
+        apply_delta(session.connection(), ids.union(*map(_dossier_ids, objets)), +1)
+
+
+# ========================
+# AGRÉGATION
+# ========================
+
+def scoped(query: Query, agents: Optional[FrozenSet[int]]) -> Query:
+    """Restreindre une requête sur le cube au périmètre (None = global)"""
+    if agents is None:
+        return query
+    if not agents:
+        return query.filter(false())
+    return query.filter(PortefeuilleCube.id_agent.in_(sorted(agents)))
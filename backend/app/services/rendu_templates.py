@@ -0,0 +1,166 @@
+"""
+Rendu compilé des templates et personnalisation par lots
+
+Un template est découpé une seule fois en segments (texte fixe / variable)
+par une expression régulière ; le rendu n'est plus qu'un "".join sur ces
+segments, sans str.replace par variable ni nouvelle analyse du texte.
+
+Les versions compilées sont gardées en mémoire par id_template et
+updated_at : toute modification du template (updated_at change) entraîne
+une nouvelle compilation au premier rendu.
+
+Personnalisation d'un lot:
+    variables = variables_dossiers(db, ids_dossiers)   # une requête jointe
+    rendus = compiler(template).rendre_lot(variables[i] for i in ids_dossiers)
+
+Variables disponibles : nom_client, prenom_client, montant_du,
+numero_dossier, date_echeance (prochaine échéance non soldée).
+Une variable inconnue est laissée telle quelle ({variable}).
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.models.client import Client
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient
+from app.models.template import Template
+
+TEMPLATE_CACHE_MAX = 256
+
+VARIABLE = re.compile(r"\{(\w+)\}")
+
+VARIABLES_DISPONIBLES = ("nom_client", "prenom_client", "montant_du", "numero_dossier", "date_echeance")
+
+# Segments : (texte, texte, ...) et (variable, ...) ; len(textes) == len(variables) + 1
+Segments = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+_ABSENT = object()
+
+
+def segmenter(texte: str) -> Segments:
+    """Découper un texte en segments fixes et noms de variables"""
+    parties = VARIABLE.split(texte)
+    return tuple(parties[0::2]), tuple(parties[1::2])
+
+
+def _rendre(segments: Segments, variables: Mapping) -> str:
+    textes, noms = segments
+    if not noms:
+        return textes[0]
+    morceaux = [textes[0]]
+    for nom, texte in zip(noms, textes[1:]):
+        valeur = variables.get(nom, _ABSENT)
+        morceaux.append("{" + nom + "}" if valeur is _ABSENT else str(valeur))
+        morceaux.append(texte)
+    return "".join(morceaux)
+
+
+class TemplateCompile:
+    """Template prêt au rendu : objet (emails) et corps segmentés"""
+
+    __slots__ = ("objet", "corps", "variables_objet", "variables_corps")
+
+    def __init__(self, objet: Optional[str], corps: str):
+        self.objet: Optional[Segments] = segmenter(objet) if objet else None
+        self.corps: Segments = segmenter(corps or "")
+        self.variables_objet: List[str] = list(self.objet[1]) if self.objet else []
+        self.variables_corps: List[str] = list(self.corps[1])
+
+    def rendre(self, variables: Mapping) -> Tuple[Optional[str], str]:
+        """(objet_rendu, corps_rendu)"""
+        objet = _rendre(self.objet, variables) if self.objet else None
+        return objet, _rendre(self.corps, variables)
+
+    def rendre_lot(self, lignes: Iterable[Mapping]) -> List[Tuple[Optional[str], str]]:
+        """Rendu d'un lot de destinataires, dans l'ordre"""
+        rendre = self.rendre
+        return [rendre(variables) for variables in lignes]
+
+
+# ========================
+# CACHE DES TEMPLATES COMPILÉS
+# ========================
+
+_cache: "OrderedDict[int, Tuple[object, TemplateCompile]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compiler(template: Template) -> TemplateCompile:
+    """Version compilée du template (cache LRU par id_template + updated_at)"""
+    cle = template.id_template
+    version = template.updated_at
+    if cle is None:
+        return TemplateCompile(template.objet, template.corps)
+
+    with _cache_lock:
+        entree = _cache.get(cle)
+        if entree is not None and entree[0] == version:
+            _cache.move_to_end(cle)
+            return entree[1]
+
+    compile_ = TemplateCompile(template.objet, template.corps)
+    with _cache_lock:
+        _cache[cle] = (version, compile_)
+        _cache.move_to_end(cle)
+        while len(_cache) > TEMPLATE_CACHE_MAX:
+            _cache.popitem(last=False)
+    return compile_
+
+
+# ========================
+# VARIABLES DES DOSSIERS
+# ========================
+
+def variables_dossiers(db: Session, ids_dossiers: Sequence[int]) -> Dict[int, dict]:
+    """
+    Variables de personnalisation d'un lot de dossiers, en une requête
+
+    Returns:
+        {id_dossier: {nom_client, prenom_client, montant_du, numero_dossier, date_echeance}}
+    """
+    if not ids_dossiers:
+        return {}
+
+    echeances = (
+        select(Creance.id_dossier, func.min(Creance.date_echeance).label("date_echeance"))
+        .where(Creance.id_dossier.in_(ids_dossiers), Creance.montant_restant > 0)
+        .group_by(Creance.id_dossier)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            DossierClient.id_dossier,
+            Client.nom.label("nom_client"),
+            Client.prenom.label("prenom_client"),
+            DossierClient.montant_total_du.label("montant_du"),
+            DossierClient.numero_dossier,
+            echeances.c.date_echeance,
+        )
+        .join(Client, Client.id_client == DossierClient.id_client)
+        .outerjoin(echeances, echeances.c.id_dossier == DossierClient.id_dossier)
+        .where(DossierClient.id_dossier.in_(ids_dossiers))
+    )
+    resultat = {}
+    for row in rows:
+        variables = dict(row._mapping)
+        del variables["id_dossier"]
+        if variables["date_echeance"] is None:
+            del variables["date_echeance"]
+        resultat[row.id_dossier] = variables
+    return resultat
+
+
+def personnaliser(db: Session, template: Template, ids_dossiers: Sequence[int]) -> Dict[int, Tuple[Optional[str], str]]:
+    """Rendu du template pour chaque dossier du lot : {id_dossier: (objet, corps)}"""
+    compile_ = compiler(template)
+    variables = variables_dossiers(db, ids_dossiers)
+    return {
+        id_dossier: compile_.rendre(variables.get(id_dossier, {}))
+        for id_dossier in ids_dossiers
+    }
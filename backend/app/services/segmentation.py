@@ -0,0 +1,292 @@
+"""
+Moteur de segmentation des campagnes
+
+Les critères (Campagne.criteres_segmentation, JSON) sont compilés en UNE
+condition SQL sur dossiers_clients ; le ciblage, l'estimation d'audience
+et l'aperçu partagent donc exactement la même requête. Chaque critère
+porté par une autre table devient un EXISTS / une sous-requête corrélée
+servie par un index (id_dossier, ...) : voir app.core.schema.
+
+Critères (toutes les clés sont optionnelles, combinées par ET):
+    statut / statut_dossier : ["Actif", ...]         priorite : ["Haute", ...]
+    montant_min, montant_max : montant_total_du
+    regions, agences, agents : [id] (affectation active)
+    jours_retard_min, jours_retard_max : tranche d'ancienneté, sur le plus
+                                         grand retard des créances du dossier
+                                         (jours_retard_max seul retient aussi
+                                         les dossiers sans aucune créance)
+    type_credit : ["CreditImmobilier", "PretPersonnel", ...] (au moins une créance)
+    sentiment : ["Negatif", ...] (dernière réponse analysée)
+    derniere_interaction_avant : "2024-01-31" (ou jamais contacté)
+    derniere_interaction_apres : "2024-01-01"
+    promesse : "en_cours" | "echue" | "aucune" (dernière promesse de paiement)
+
+Composition:
+    tous : [critères, ...]   un_parmi : [critères, ...]   sauf : critères
+
+Exemple:
+    {"regions": [1], "jours_retard_min": 31, "jours_retard_max": 90,
+     "un_parmi": [{"sentiment": ["Negatif"]}, {"promesse": "echue"}],
+     "sauf": {"derniere_interaction_apres": "2024-06-01"}}
+"""
+
+import math
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, not_, exists, select, func, true, tablesample
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.core.config import settings
+from app.models.affectation_dossier import AffectationDossier
+from app.models.agence import Agence
+from app.models.analyse_nlp import AnalyseNLP, SentimentEnum
+from app.models.client import Client
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient, StatutDossierEnum, PrioriteEnum
+from app.models.interaction import Interaction
+from app.models.reponse_client import ReponseClient
+from app.models.utilisateur import Utilisateur
+from app.services import estimations
+
+PROFONDEUR_MAX = 5
+APERCU_MAX = 50
+
+PROMESSES = ("en_cours", "echue", "aucune")
+
+
+class CritereInvalide(ValueError):
+    """Critère de segmentation inconnu ou mal formé"""
+
+
+# ========================
+# LECTURE DES VALEURS
+# ========================
+
+def _liste(cle: str, valeur) -> list:
+    if not isinstance(valeur, list) or not valeur:
+        raise CritereInvalide(f"{cle} : liste non vide attendue")
+    return valeur
+
+
+def _enums(cle: str, valeur, enum_cls) -> list:
+    try:
+        return [enum_cls(v) for v in _liste(cle, valeur)]
+    except ValueError:
+        valides = ", ".join(e.value for e in enum_cls)
+        raise CritereInvalide(f"{cle} : valeurs possibles {valides}")
+
+
+def _ids(cle: str, valeur) -> List[int]:
+    ids = _liste(cle, valeur)
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise CritereInvalide(f"{cle} : liste d'identifiants attendue")
+    return ids
+
+
+def _textes(cle: str, valeur) -> List[str]:
+    textes = _liste(cle, valeur)
+    if not all(isinstance(t, str) for t in textes):
+        raise CritereInvalide(f"{cle} : liste de chaînes attendue")
+    return textes
+
+
+def _nombre(cle: str, valeur) -> float:
+    if not isinstance(valeur, (int, float)) or isinstance(valeur, bool):
+        raise CritereInvalide(f"{cle} : nombre attendu")
+    return valeur
+
+
+def _date(cle: str, valeur) -> datetime:
+    try:
+        return datetime.fromisoformat(str(valeur))
+    except ValueError:
+        raise CritereInvalide(f"{cle} : date ISO attendue (AAAA-MM-JJ)")
+
+
+# ========================
+# COMPILATION
+# ========================
+
+def _affectes(*conditions) -> ColumnElement:
+    """Dossiers dont l'affectation active vérifie les conditions"""
+    return DossierClient.id_dossier.in_(
+        select(AffectationDossier.id_dossier).where(AffectationDossier.actif == True, *conditions)
+    )
+
+
+def _agents_de(*conditions):
+    return select(Utilisateur.id_utilisateur).where(*conditions)
+
+
+def _creance(*conditions) -> ColumnElement:
+    return exists().where(Creance.id_dossier == DossierClient.id_dossier, *conditions)
+
+
+def _interaction(*conditions) -> ColumnElement:
+    return exists().where(Interaction.id_dossier == DossierClient.id_dossier, *conditions)
+
+
+def _dernier_sentiment():
+    return (
+        select(AnalyseNLP.sentiment)
+        .join(ReponseClient, ReponseClient.id_reponse == AnalyseNLP.id_reponse)
+        .where(ReponseClient.id_dossier == DossierClient.id_dossier)
+        .order_by(ReponseClient.date_reponse.desc(), AnalyseNLP.date_analyse.desc())
+        .limit(1)
+        .correlate(DossierClient)
+        .scalar_subquery()
+    )
+
+
+def _promesse(valeur) -> ColumnElement:
+    if valeur not in PROMESSES:
+        raise CritereInvalide(f"promesse : valeurs possibles {', '.join(PROMESSES)}")
+    promesses = (Interaction.promesse_paiement == True,)
+    if valeur == "aucune":
+        return not_(_interaction(*promesses))
+    derniere = (
+        select(Interaction.date_promesse)
+        .where(Interaction.id_dossier == DossierClient.id_dossier, *promesses)
+        .order_by(Interaction.date_interaction.desc())
+        .limit(1)
+        .correlate(DossierClient)
+        .scalar_subquery()
+    )
+    return derniere >= func.now() if valeur == "en_cours" else derniere < func.now()
+
+
+_COMPILATEURS: Dict[str, Callable[[object], ColumnElement]] = {
+    "statut": lambda v: DossierClient.statut.in_(_enums("statut", v, StatutDossierEnum)),
+    "statut_dossier": lambda v: DossierClient.statut.in_(_enums("statut_dossier", v, StatutDossierEnum)),
+    "priorite": lambda v: DossierClient.priorite.in_(_enums("priorite", v, PrioriteEnum)),
+    "montant_min": lambda v: DossierClient.montant_total_du >= _nombre("montant_min", v),
+    "montant_max": lambda v: DossierClient.montant_total_du <= _nombre("montant_max", v),
+    "agents": lambda v: _affectes(AffectationDossier.id_agent.in_(_ids("agents", v))),
+    "agences": lambda v: _affectes(AffectationDossier.id_agent.in_(
+        _agents_de(Utilisateur.id_agence.in_(_ids("agences", v)))
+    )),
+    "regions": lambda v: _affectes(AffectationDossier.id_agent.in_(
+        _agents_de(Utilisateur.id_agence.in_(
+            select(Agence.id_agence).where(Agence.id_region.in_(_ids("regions", v)))
+        ))
+    )),
+    "jours_retard_min": lambda v: _creance(Creance.jours_retard >= _nombre("jours_retard_min", v)),
+    "jours_retard_max": lambda v: not_(_creance(Creance.jours_retard > _nombre("jours_retard_max", v))),
+    "type_credit": lambda v: _creance(Creance.type_credit.in_(_textes("type_credit", v))),
+    "sentiment": lambda v: _dernier_sentiment().in_(_enums("sentiment", v, SentimentEnum)),
+    "derniere_interaction_avant": lambda v: not_(_interaction(
+        Interaction.date_interaction >= _date("derniere_interaction_avant", v)
+    )),
+    "derniere_interaction_apres": lambda v: _interaction(
+        Interaction.date_interaction >= _date("derniere_interaction_apres", v)
+    ),
+    "promesse": _promesse,
+}
+
+_COMPOSITIONS = ("tous", "un_parmi", "sauf")
+
+
+def condition(criteres: Optional[dict], profondeur: int = 0) -> ColumnElement:
+    """
+    Compiler des critères en condition SQL sur DossierClient
+
+    Raises:
+        CritereInvalide: clé inconnue, valeur mal formée, imbrication trop profonde
+    """
+    if not criteres:
+        return true()
+    if not isinstance(criteres, dict):
+        raise CritereInvalide("Les critères doivent être un objet JSON")
+    if profondeur > PROFONDEUR_MAX:
+        raise CritereInvalide(f"Imbrication limitée à {PROFONDEUR_MAX} niveaux")
+
+    parties = []
+    for cle, valeur in criteres.items():
+        if cle in _COMPILATEURS:
+            parties.append(_COMPILATEURS[cle](valeur))
+        elif cle == "sauf":
+            parties.append(not_(condition(valeur, profondeur + 1)))
+        elif cle in _COMPOSITIONS:
+            membres = [condition(c, profondeur + 1) for c in _liste(cle, valeur)]
+            parties.append(and_(*membres) if cle == "tous" else or_(*membres))
+        else:
+            raise CritereInvalide(f"Critère inconnu : {cle}")
+    return and_(*parties) if parties else true()
+
+
+def requete_cibles(criteres: Optional[dict]):
+    """SELECT id_dossier des dossiers ciblés"""
+    return select(DossierClient.id_dossier).where(condition(criteres))
+
+
+# ========================
+# ESTIMATION ET APERÇU
+# ========================
+
+def estimer_audience(db: Session, criteres: Optional[dict]) -> dict:
+    """
+    Taille d'audience : comptage exact sur une petite base, sinon
+    extrapolée d'un échantillon TABLESAMPLE SYSTEM (APPROX_SAMPLE_PERCENT %
+    des blocs) avec sa marge d'erreur à 95 %
+
+    Returns:
+        {"estimation", "marge", "methode": "exact" | "echantillon"}
+    """
+    cond = condition(criteres)
+    total = estimations.effectif(db, "dossiers_clients")
+    if total is None or total < settings.APPROX_MIN_ROWS:
+        n = db.execute(select(func.count()).select_from(DossierClient).where(cond)).scalar()
+        return {"estimation": n, "marge": 0, "methode": "exact"}
+
+    pct = settings.APPROX_SAMPLE_PERCENT
+    q = pct / 100
+    echantillon = tablesample(DossierClient.__table__, func.system(pct), name="echantillon")
+    n = db.execute(
+        select(func.count())
+        .select_from(DossierClient)
+        .where(cond, DossierClient.id_dossier.in_(select(echantillon.c.id_dossier)))
+    ).scalar()
+    return {
+        "estimation": round(n / q),
+        "marge": round(estimations.Z_95 * math.sqrt((1 - q) * n) / q),
+        "methode": "echantillon",
+    }
+
+
+def apercu(db: Session, criteres: Optional[dict], limite: int = 20, apres: Optional[int] = None) -> List[dict]:
+    """
+    Page de dossiers ciblés, triés par id_dossier (pagination par curseur `apres`)
+
+    Seules `limite` lignes (APERCU_MAX au plus) sont lues, quelle que soit
+    la taille du segment.
+    """
+    query = (
+        select(
+            DossierClient.id_dossier,
+            DossierClient.numero_dossier,
+            DossierClient.statut,
+            DossierClient.priorite,
+            DossierClient.montant_total_du,
+            Client.nom,
+            Client.prenom,
+        )
+        .join(Client, Client.id_client == DossierClient.id_client)
+        .where(condition(criteres))
+        .order_by(DossierClient.id_dossier)
+        .limit(min(limite, APERCU_MAX))
+    )
+    if apres is not None:
+        query = query.where(DossierClient.id_dossier > apres)
+    return [
+        {
+            "id_dossier": r.id_dossier,
+            "numero_dossier": r.numero_dossier,
+            "client": f"{r.prenom} {r.nom}",
+            "statut": r.statut.value,
+            "priorite": r.priorite.value,
+            "montant_total_du": float(r.montant_total_du or 0),
+        }
+        for r in db.execute(query)
+    ]
@@ -0,0 +1,276 @@
+"""
+Export colonnaire du portefeuille (Parquet)
+
+Produit des instantanés de creances, dossiers_clients, affectations_dossiers
+et analyses_nlp pour l'analyse hors ligne, afin que les analystes n'aient
+plus à paginer l'API ni à interroger la base transactionnelle.
+
+Arborescence (partitions Hive, lisibles par pyarrow.dataset / DuckDB / Spark):
+    {EXPORT_DIR}/{table}/snapshot_date=YYYY-MM-DD/id_region={id}/{mode}-{HHMMSS}.parquet
+    {EXPORT_DIR}/_watermarks.json
+
+    id_region = région de l'agent affecté (0 si le dossier n'est pas affecté)
+
+Mémoire bornée:
+    Les lignes sont lues par curseur serveur (stream_results) par lots de
+    EXPORT_BATCH_ROWS et écrites aussitôt, un fichier ouvert par région.
+    Les quatre tables sont lues dans la même transaction REPEATABLE READ :
+    l'instantané est cohérent entre tables.
+
+Mode incrémental:
+    Seules les lignes dont coalesce(updated_at, created_at) dépasse le
+    dernier filigrane (moins EXPORT_WATERMARK_OVERLAP_SECONDS, pour les
+    transactions encore ouvertes lors de l'export précédent) sont exportées.
+    Une ligne peut donc apparaître dans deux exports : dédoublonner sur la
+    clé primaire en gardant le updated_at le plus récent. Les suppressions
+    et les changements de région sans mise à jour de la ligne ne sont pas
+    propagés : l'export complet hebdomadaire (beat, jour EXPORT_FULL_DAY)
+    les rattrape ; le dernier snapshot complet fait référence.
+"""
+
+import enum
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    Boolean, Date, DateTime, Enum, Float, Integer, JSON, Numeric,
+    func, select,
+)
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.models.affectation_dossier import AffectationDossier
+from app.models.agence import Agence
+from app.models.analyse_nlp import AnalyseNLP
+from app.models.creance import Creance
+from app.models.dossier_client import DossierClient
+from app.models.reponse_client import ReponseClient
+from app.models.utilisateur import Utilisateur
+
+WATERMARKS_FILE = "_watermarks.json"
+
+
+# ========================
+# SCHÉMAS ARROW
+# ========================
+
+def _arrow_type(column) -> pa.DataType:
+    """Type Arrow d'une colonne SQLAlchemy (enums et JSON en texte)"""
+    t = column.type
+    if isinstance(t, Enum) or isinstance(t, JSON):
+        return pa.string()
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, Numeric) and not isinstance(t, Float):
+        return pa.decimal128(t.precision or 38, t.scale or 0)
+    if isinstance(t, Float):
+        return pa.float64()
+    if isinstance(t, DateTime):
+        return pa.timestamp("us", tz="UTC") if t.timezone else pa.timestamp("us")
+    if isinstance(t, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _convertisseur(column):
+    """Conversion Python → valeur Arrow pour les types sans équivalent direct"""
+    t = column.type
+    if isinstance(t, Enum):
+        return lambda v: v.name if isinstance(v, enum.Enum) else v
+    if isinstance(t, JSON):
+        return lambda v: None if v is None else json.dumps(v, ensure_ascii=False, default=str)
+    if isinstance(t, Numeric) and not isinstance(t, Float):
+        scale = Decimal(1).scaleb(-(t.scale or 0))
+        return lambda v: None if v is None else Decimal(v).quantize(scale)
+    return None
+
+
+# ========================
+# REQUÊTES SOURCES
+# ========================
+
+def _affectation_region():
+    """Région de l'affectation active la plus récente de chaque dossier"""
+    return (
+        select(AffectationDossier.id_dossier, Agence.id_region)
+        .join(Utilisateur, Utilisateur.id_utilisateur == AffectationDossier.id_agent)
+        .join(Agence, Agence.id_agence == Utilisateur.id_agence)
+        .where(AffectationDossier.actif == True)
+        .distinct(AffectationDossier.id_dossier)
+        .order_by(AffectationDossier.id_dossier, AffectationDossier.date_affectation.desc())
+        .subquery("aff_region")
+    )
+
+
+def _sources() -> Dict[str, tuple]:
+    """table → (modèle, requête de base avec colonne id_region)"""
+    aff = _affectation_region()
+    region = lambda col: func.coalesce(col, 0).label("id_region")
+
+    creances = (
+        select(*Creance.__table__.c, region(aff.c.id_region))
+        .outerjoin(aff, aff.c.id_dossier == Creance.id_dossier)
+    )
+    dossiers = (
+        select(*DossierClient.__table__.c, region(aff.c.id_region))
+        .outerjoin(aff, aff.c.id_dossier == DossierClient.id_dossier)
+    )
+    affectations = (
+        select(*AffectationDossier.__table__.c, region(Agence.id_region))
+        .outerjoin(Utilisateur, Utilisateur.id_utilisateur == AffectationDossier.id_agent)
+        .outerjoin(Agence, Agence.id_agence == Utilisateur.id_agence)
+    )
+    analyses = (
+        select(*AnalyseNLP.__table__.c, region(aff.c.id_region))
+        .join(ReponseClient, ReponseClient.id_reponse == AnalyseNLP.id_reponse)
+        .outerjoin(aff, aff.c.id_dossier == ReponseClient.id_dossier)
+    )
+    return {
+        "creances":              (Creance, creances),
+        "dossiers_clients":      (DossierClient, dossiers),
+        "affectations_dossiers": (AffectationDossier, affectations),
+        "analyses_nlp":          (AnalyseNLP, analyses),
+    }
+
+
+# ========================
+# ÉCRITURE
+# ========================
+
+class _PartitionWriter:
+    """Un ParquetWriter par région, fichiers renommés à la fermeture (atomique)"""
+
+    def __init__(self, base_dir: str, filename: str, schema: pa.Schema):
+        self.base_dir = base_dir
+        self.filename = filename
+        self.schema = schema
+        self.writers: Dict[int, tuple] = {}
+
+    def write(self, region_id: int, columns: Dict[str, list]) -> None:
+        if region_id not in self.writers:
+            directory = os.path.join(self.base_dir, f"id_region={region_id}")
+            os.makedirs(directory, exist_ok=True)
+            final = os.path.join(directory, self.filename)
+            tmp = final + ".tmp"
+            self.writers[region_id] = (pq.ParquetWriter(tmp, self.schema, compression="zstd"), tmp, final)
+        writer = self.writers[region_id][0]
+        writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self, commit: bool = True) -> int:
+        for writer, tmp, final in self.writers.values():
+            writer.close()
+            if commit:
+                os.replace(tmp, final)
+            else:
+                os.remove(tmp)
+        return len(self.writers)
+
+
+def _export_table(conn, model, query, since: Optional[datetime],
+                  out_dir: str, filename: str) -> dict:
+    columns = list(model.__table__.c)
+    names = [c.name for c in columns]
+    schema = pa.schema([pa.field(c.name, _arrow_type(c)) for c in columns])
+    converters = [_convertisseur(c) for c in columns]
+
+    modifie_le = func.coalesce(model.updated_at, model.created_at)
+    if since is not None:
+        query = query.where(modifie_le > since)
+
+    writer = _PartitionWriter(out_dir, filename, schema)
+    nb_lignes = 0
+    watermark = None  # filigrane calculé au fil de l'eau
+    try:
+        result = conn.execution_options(
+            stream_results=True, yield_per=settings.EXPORT_BATCH_ROWS
+        ).execute(query)
+        for batch in result.partitions():
+            par_region: Dict[int, Dict[str, list]] = {}
+            for row in batch:
+                region_cols = par_region.get(row.id_region)
+                if region_cols is None:
+                    region_cols = par_region[row.id_region] = {n: [] for n in names}
+                for n, convert in zip(names, converters):
+                    value = row._mapping[n]
+                    region_cols[n].append(convert(value) if convert else value)
+                modified = row.updated_at or row.created_at
+                if modified is not None and (watermark is None or modified > watermark):
+                    watermark = modified
+            for region_id, region_cols in par_region.items():
+                writer.write(region_id, region_cols)
+            nb_lignes += len(batch)
+    except Exception:
+        writer.close(commit=False)
+        raise
+    nb_fichiers = writer.close()
+    return {"lignes": nb_lignes, "fichiers": nb_fichiers, "watermark": watermark}
+
+
+# ========================
+# POINT D'ENTRÉE
+# ========================
+
+def _load_watermarks(export_dir: str) -> Dict[str, str]:
+    path = os.path.join(export_dir, WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_watermarks(export_dir: str, watermarks: Dict[str, str]) -> None:
+    path = os.path.join(export_dir, WATERMARKS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def export_snapshot(engine: Engine, incremental: bool = True,
+                    export_dir: Optional[str] = None) -> dict:
+    """
+    Exporter les quatre tables en Parquet partitionné (date d'instantané × région)
+
+    Args:
+        incremental: n'exporter que les lignes modifiées depuis le dernier
+            export (premier passage = export complet)
+
+    Returns:
+        {table: {"lignes", "fichiers", "watermark"}} ; les filigranes ne sont
+        enregistrés que si toutes les tables ont été exportées
+    """
+    export_dir = export_dir or settings.EXPORT_DIR
+    now = datetime.now(timezone.utc)
+    partition = f"snapshot_date={now.date().isoformat()}"
+    overlap = timedelta(seconds=settings.EXPORT_WATERMARK_OVERLAP_SECONDS)
+    watermarks = _load_watermarks(export_dir) if incremental else {}
+
+    summary = {}
+    os.makedirs(export_dir, exist_ok=True)
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            for name, (model, query) in _sources().items():
+                previous = watermarks.get(name)
+                previous = datetime.fromisoformat(previous) if previous else None
+                mode = "incr" if previous is not None else "full"
+                result = _export_table(
+                    conn, model, query,
+                    previous - overlap if previous is not None else None,
+                    os.path.join(export_dir, name, partition),
+                    f"{mode}-{now:%H%M%S}.parquet",
+                )
+                summary[name] = result
+                if result["watermark"] is not None and (previous is None or result["watermark"] > previous):
+                    watermarks[name] = result["watermark"].isoformat()
+
+    _save_watermarks(export_dir, watermarks)
+    for result in summary.values():
+        if result["watermark"] is not None:
+            result["watermark"] = result["watermark"].isoformat()
+    return summary
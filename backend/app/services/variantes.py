@@ -0,0 +1,218 @@
+"""
+Tests A/B des campagnes : variantes de template et résultats en continu
+
+Une campagne peut définir plusieurs variantes (code, template, poids en %
+des cibles). Affectation au lancement, dans le même INSERT ... SELECT que
+le ciblage : chaque dossier reçoit la variante de son seau
+
+    seau = md5("{id_campagne}:{id_dossier}")[:8] (entier) mod 10000
+
+comparé aux bornes cumulées des poids. L'affectation est déterministe
+(relancer la campagne redonne la même variante à chaque dossier) et
+indépendante de l'ordre des dossiers ; seau() en donne l'équivalent Python.
+
+Compteurs par variante (campagnes_variantes), jamais recalculés à la
+lecture:
+    envoyes / delivres / ouverts / cliques  incrémentés par
+        app.services.evenements_envoi, dans l'ordre SQL qui traite les
+        accusés (même règle que la campagne : date passée de NULL à renseignée)
+    reponses  incrémenté à l'insertion d'une ReponseClient (événement ORM) :
+        la réponse est attribuée à l'envoi de son message, à défaut au
+        dernier envoi de campagne du dossier (CAMPAGNE_ATTRIBUTION_JOURS),
+        une seule fois par envoi (campagnes_clients.date_reponse)
+    recalage horaire avec ceux de la campagne (crud.campagne.reconcilier_compteurs)
+
+resultats() lit donc une ligne par variante, quelle que soit la taille du test.
+"""
+
+import hashlib
+import math
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, case, cast, event, func, literal, text
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.campagne_variante import CampagneVariante
+from app.models.dossier_client import DossierClient
+from app.models.reponse_client import ReponseClient
+
+SEAUX = 10000
+
+# Seuil de significativité de l'écart avec la variante de référence
+SEUIL_P = 0.05
+
+
+# ========================
+# AFFECTATION
+# ========================
+
+def seau(id_campagne: int, id_dossier: int) -> int:
+    """Seau d'un dossier (équivalent Python de l'expression SQL de lancement)"""
+    return int(hashlib.md5(f"{id_campagne}:{id_dossier}".encode()).hexdigest()[:8], 16) % SEAUX
+
+
+def _bornes(variantes: Sequence[CampagneVariante]) -> List[Tuple[int, int]]:
+    """(borne supérieure exclue du seau, id_variante), poids cumulés"""
+    bornes, cumul = [], 0
+    for variante in variantes:
+        cumul += variante.poids
+        bornes.append((cumul * SEAUX // 100, variante.id_variante))
+    return bornes
+
+
+def variante_de(id_campagne: int, id_dossier: int, variantes: Sequence[CampagneVariante]) -> Optional[int]:
+    """id_variante attribuée à un dossier (None sans variantes)"""
+    s = seau(id_campagne, id_dossier)
+    for borne, id_variante in _bornes(variantes):
+        if s < borne:
+            return id_variante
+    return None
+
+
+def expression_variante(id_campagne: int, variantes: Sequence[CampagneVariante]):
+    """Expression SQL de l'id_variante d'un DossierClient (NULL sans variantes)"""
+    if not variantes:
+        return literal(None, BigInteger)
+    empreinte = func.substr(func.md5(func.concat(str(id_campagne), ":", DossierClient.id_dossier)), 1, 8)
+    s = cast(cast(func.concat("x", empreinte), BIT(32)), BigInteger) % SEAUX
+    return case(*[(s < borne, id_variante) for borne, id_variante in _bornes(variantes)])
+
+
+def get_variantes(db: Session, id_campagne: int) -> List[CampagneVariante]:
+    return (
+        db.query(CampagneVariante)
+        .filter(CampagneVariante.id_campagne == id_campagne)
+        .order_by(CampagneVariante.code)
+        .all()
+    )
+
+
+_CIBLES_SQL = """
+UPDATE campagnes_variantes v SET nombre_cibles = c.cibles
+FROM (
+    SELECT id_variante, count(*) AS cibles
+    FROM campagnes_clients
+    WHERE id_campagne = :id AND id_variante IS NOT NULL
+    GROUP BY id_variante
+) c
+WHERE v.id_variante = c.id_variante
+"""
+
+
+def compter_cibles(db: Session, id_campagne: int) -> None:
+    """nombre_cibles des variantes, après le lancement (sans COMMIT)"""
+    db.execute(text(_CIBLES_SQL), {"id": id_campagne})
+
+
+# ========================
+# RÉPONSES
+# ========================
+
+_REPONSE_SQL = """
+WITH cible AS (
+    SELECT COALESCE(
+        (SELECT m.id_campagne_client FROM messages m WHERE m.id_message = CAST(:id_message AS integer)),
+        (SELECT cc.id FROM campagnes_clients cc
+         WHERE cc.id_dossier = :id_dossier
+           AND cc.date_envoi <= CAST(:date_reponse AS timestamptz)
+           AND cc.date_envoi > CAST(:date_reponse AS timestamptz) - make_interval(days => :jours)
+         ORDER BY cc.date_envoi DESC
+         LIMIT 1)
+    ) AS id
+),
+repondu AS (
+    UPDATE campagnes_clients cc SET date_reponse = CAST(:date_reponse AS timestamptz)
+    FROM cible
+    WHERE cc.id = cible.id AND cc.date_reponse IS NULL
+    RETURNING cc.id_variante
+)
+UPDATE campagnes_variantes v SET nombre_reponses = v.nombre_reponses + 1
+FROM repondu
+WHERE v.id_variante = repondu.id_variante
+"""
+
+
+def _attribuer_reponse(mapper, connection, target):
+    connection.execute(text(_REPONSE_SQL), {
+        "id_message": target.id_message,
+        "id_dossier": target.id_dossier,
+        "date_reponse": (target.date_reponse or datetime.now()).astimezone(),
+        "jours": settings.CAMPAGNE_ATTRIBUTION_JOURS,
+    })
+
+
+event.listen(ReponseClient, "after_insert", _attribuer_reponse)
+
+
+# ========================
+# RÉSULTATS
+# ========================
+
+def _taux(n: int, d: int) -> float:
+    return round(n / d * 100, 2) if d > 0 else 0.0
+
+
+def _p_valeur(n1: int, d1: int, n2: int, d2: int) -> Optional[float]:
+    """Test bilatéral de l'égalité de deux proportions (approximation normale)"""
+    if d1 <= 0 or d2 <= 0:
+        return None
+    p = (n1 + n2) / (d1 + d2)
+    ecart_type = math.sqrt(p * (1 - p) * (1 / d1 + 1 / d2))
+    if ecart_type == 0:
+        return None
+    z = (n1 / d1 - n2 / d2) / ecart_type
+    return round(math.erfc(abs(z) / math.sqrt(2)), 4)
+
+
+# (taux, numérateur, dénominateur) : mêmes définitions que get_campagne_stats
+_MESURES = (
+    ("taux_ouverture", "nombre_ouverts", "nombre_delivres"),
+    ("taux_clic", "nombre_cliques", "nombre_ouverts"),
+    ("taux_reponse", "nombre_reponses", "nombre_envoyes"),
+)
+
+
+def resultats(db: Session, id_campagne: int) -> List[dict]:
+    """
+    Résultats par variante, lus sur les compteurs
+
+    Chaque variante est comparée à la première (ordre des codes) : écart
+    en points et p-valeur par taux ; "significatif" si p < SEUIL_P.
+    """
+    variantes = get_variantes(db, id_campagne)
+    lignes = []
+    for variante in variantes:
+        ligne = {
+            "id_variante": variante.id_variante,
+            "code": variante.code,
+            "id_template": variante.id_template,
+            "poids": variante.poids,
+            "cibles": variante.nombre_cibles,
+            "envoyes": variante.nombre_envoyes,
+            "delivres": variante.nombre_delivres,
+            "ouverts": variante.nombre_ouverts,
+            "cliques": variante.nombre_cliques,
+            "reponses": variante.nombre_reponses,
+            "comparaison": {},
+        }
+        for taux, num, den in _MESURES:
+            ligne[taux] = _taux(getattr(variante, num), getattr(variante, den))
+        lignes.append(ligne)
+
+    if len(variantes) > 1:
+        reference = variantes[0]
+        for variante, ligne in zip(variantes[1:], lignes[1:]):
+            for taux, num, den in _MESURES:
+                p = _p_valeur(
+                    getattr(variante, num), getattr(variante, den),
+                    getattr(reference, num), getattr(reference, den),
+                )
+                ligne["comparaison"][taux] = {
+                    "ecart": round(ligne[taux] - lignes[0][taux], 2),
+                    "p_valeur": p,
+                    "significatif": p is not None and p < SEUIL_P,
+                }
+    return lignes
@@ -0,0 +1,48 @@
+"""
+Tâches Celery : exécution des agents automatiques
+
+planifier_agents (beat, toutes les AGENTS_INTERVAL_SECONDS) réserve les
+agents actifs dont l'heure de passage est venue et lance une tâche
+executer_agent par agent : les agents tournent en parallèle dans le pool
+des workers Celery (voir app.services.agents_auto).
+"""
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import agents_auto
+from app.tasks.celery_app import celery_app
+
+
+@celery_app.task(name="app.tasks.agents.planifier_agents")
+def planifier_agents() -> int:
+    """Réveiller les agents dus ; renvoie le nombre d'agents lancés"""
+    db = SessionLocal()
+    try:
+        ids = agents_auto.reclamer_agents_dus(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for id_agent in ids:
+        executer_agent.delay(id_agent)
+    return len(ids)
+
+
+@celery_app.task(name="app.tasks.agents.executer_agent")
+def executer_agent(id_agent: int) -> dict:
+    """Traiter la file des messages pour un agent pendant AGENTS_RUN_SECONDS au plus"""
+    db = SessionLocal()
+    try:
+        bilan = agents_auto.executer_agent(db, id_agent, settings.AGENTS_RUN_SECONDS)
+        if bilan["envoyes"] or bilan["echecs"] or bilan["reportes"]:
+            logger.info(
+                f"🤖 Agent {id_agent} : {bilan['envoyes']} envoyés, "
+                f"{bilan['echecs']} échecs, {bilan['reportes']} reportés ({bilan['arret']})"
+            )
+        return bilan
+    finally:
+        db.close()
@@ -0,0 +1,90 @@
+"""Tâches Celery : lancement des campagnes (suivi d'avancement) et recalage de leurs compteurs"""
+
+from typing import Optional
+
+import redis
+from loguru import logger
+
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client
+from app.crud import campagne as crud_campagne
+from app.tasks.celery_app import celery_app
+
+PROGRESSION_TTL_SECONDS = 86400
+
+
+def _progression_key(campagne_id: int) -> str:
+    return f"campagne:lancement:{campagne_id}"
+
+
+def enregistrer_progression(campagne_id: int, etat: str, **champs) -> None:
+    """Avancement du lancement (hash Redis, expire après 24 h)"""
+    key = _progression_key(campagne_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={"etat": etat, **{k: str(v) for k, v in champs.items()}})
+        pipe.expire(key, PROGRESSION_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (progression campagne {campagne_id}): {e}")
+
+
+def lire_progression(campagne_id: int) -> Optional[dict]:
+    """Dernier avancement connu, None si aucun lancement récent"""
+    try:
+        return redis_client.hgetall(_progression_key(campagne_id)) or None
+    except redis.RedisError as e:
+        print(f"❌ Erreur Redis (progression campagne {campagne_id}): {e}")
+        return None
+
+
+def executer_lancement(campagne_id: int) -> dict:
+    """Lancer la campagne en publiant l'avancement après chaque tranche"""
+    enregistrer_progression(campagne_id, "en_cours", pourcentage=0, inseres=0)
+    db = SessionLocal()
+    try:
+        result = crud_campagne.lancer_campagne(
+            db, campagne_id,
+            on_progress=lambda p: enregistrer_progression(campagne_id, "en_cours", **p),
+        )
+    except Exception as e:
+        db.rollback()
+        enregistrer_progression(campagne_id, "echec", message=str(e))
+        raise
+    finally:
+        db.close()
+
+    if result["success"]:
+        enregistrer_progression(
+            campagne_id, "termine",
+            pourcentage=100, nombre_cibles=result["nombre_cibles"], message=result["message"],
+        )
+        logger.info(f"📣 Campagne {campagne_id} : {result['message']} ({result['nouveaux_cibles']} nouveaux)")
+    else:
+        enregistrer_progression(campagne_id, "echec", message=result["message"])
+    return result
+
+
+@celery_app.task(name="app.tasks.campagnes.lancer_campagne")
+def lancer_campagne(campagne_id: int) -> dict:
+    """Lancement d'une campagne volumineuse hors requête HTTP"""
+    return executer_lancement(campagne_id)
+
+
+@celery_app.task(name="app.tasks.campagnes.reconcilier_compteurs")
+def reconcilier_compteurs() -> int:
+    """Recalage horaire des compteurs des campagnes actives ; renvoie le nombre corrigé"""
+    db = SessionLocal()
+    try:
+        corrigees = 0
+        for campagne_id in crud_campagne.get_campagnes_a_reconcilier(db):
+            ecarts = crud_campagne.reconcilier_compteurs(db, campagne_id)
+            if ecarts:
+                corrigees += 1
+                logger.warning(f"🔧 Campagne {campagne_id} : compteurs recalés {ecarts}")
+        return corrigees
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,69 @@
+"""
+Application Celery (worker + beat)
+
+Lancement:
+    celery -A app.tasks.celery_app worker -B --loglevel=info
+"""
+
+from celery import Celery
+from celery.schedules import crontab
+
+from app.core.config import settings
+import app.models  # noqa: F401 — enregistre tous les mappers ORM dans le worker
+
+celery_app = Celery(
+    "recouvrement",
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    include=["app.tasks.portefeuille", "app.tasks.exports", "app.tasks.campagnes",
+             "app.tasks.dispatch", "app.tasks.agents"],
+)
+
+celery_app.conf.update(
+    timezone="Africa/Tunis",
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    beat_schedule={
+        "rebuild-portefeuille-cube": {
+            "task": "app.tasks.portefeuille.rebuild_portefeuille_cube",
+            "schedule": crontab(hour=settings.CUBE_REBUILD_HOUR, minute=0),
+        },
+        "rebuild-clients-hll": {
+            "task": "app.tasks.portefeuille.rebuild_clients_hll",
+            "schedule": crontab(hour=settings.CUBE_REBUILD_HOUR, minute=30),
+        },
+        "planifier-envois": {
+            "task": "app.tasks.dispatch.planifier_envois",
+            "schedule": settings.DISPATCH_INTERVAL_SECONDS,
+        },
+        "planifier-agents": {
+            "task": "app.tasks.agents.planifier_agents",
+            "schedule": settings.AGENTS_INTERVAL_SECONDS,
+        },
+        "rafraichir-priorites-messages": {
+            "task": "app.tasks.dispatch.rafraichir_priorites_messages",
+            "schedule": crontab(minute="*/5"),
+        },
+        "reconstruire-contacts": {
+            "task": "app.tasks.dispatch.reconstruire_contacts",
+            "schedule": crontab(minute=45),
+        },
+        "reconcilier-compteurs-campagnes": {
+            "task": "app.tasks.campagnes.reconcilier_compteurs",
+            "schedule": crontab(minute=15),
+        },
+        "export-portefeuille-parquet": {
+            "task": "app.tasks.exports.export_portefeuille_parquet",
+            "schedule": crontab(
+                hour=settings.EXPORT_HOUR, minute=0,
+                day_of_week=",".join(str(d) for d in range(7) if d != settings.EXPORT_FULL_DAY),
+            ),
+        },
+        # Export complet hebdomadaire : suppressions et changements de région
+        "export-portefeuille-parquet-complet": {
+            "task": "app.tasks.exports.export_portefeuille_parquet",
+            "schedule": crontab(hour=settings.EXPORT_HOUR, minute=0, day_of_week=settings.EXPORT_FULL_DAY),
+            "kwargs": {"incremental": False},
+        },
+    },
+)
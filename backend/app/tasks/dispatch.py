@@ -0,0 +1,113 @@
+"""
+Tâches Celery : envoi des campagnes en cours
+
+planifier_envois (beat, toutes les DISPATCH_INTERVAL_SECONDS) lance jusqu'à
+DISPATCH_PARALLELISME workers envoyer_campagne par campagne "EnCours". Un
+verrou Redis par emplacement (campagne, slot) évite d'empiler les tâches
+quand un worker tourne encore. Les workers d'une même campagne se
+partagent les cibles par SKIP LOCKED (voir app.services.dispatch) : le
+débit croît avec le nombre de processus Celery, dans la limite des quotas
+des agents.
+
+Hors de la plage horaire de contact, aucun worker n'est lancé ; les
+contacts récents utilisés par la politique de contact sont recalés chaque
+heure depuis la table messages (reconstruire_contacts). La priorité des
+messages unitaires en file suit celle de leur dossier (rafraichir_priorites_messages).
+"""
+
+from datetime import datetime
+
+import redis
+from loguru import logger
+from sqlalchemy import or_
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis_client import redis_client
+from app.models.campagne import Campagne, StatutCampagneEnum
+from app.services import dispatch, politique_contact, file_messages
+from app.tasks.celery_app import celery_app
+
+
+def _slot_key(campagne_id: int, slot: int) -> str:
+    return f"dispatch:campagne:{campagne_id}:{slot}"
+
+
+@celery_app.task(name="app.tasks.dispatch.planifier_envois")
+def planifier_envois() -> int:
+    """Répartir les campagnes en cours sur les workers d'envoi"""
+    if not politique_contact.dans_plage():
+        return 0
+    db = SessionLocal()
+    try:
+        maintenant = datetime.now().astimezone()
+        campagnes = [
+            c.id_campagne
+            for c in db.query(Campagne.id_campagne).filter(
+                Campagne.statut == StatutCampagneEnum.EN_COURS,
+                Campagne.date_debut <= maintenant,
+                or_(Campagne.date_fin.is_(None), Campagne.date_fin > maintenant),
+            )
+        ]
+    finally:
+        db.close()
+
+    lances = 0
+    ttl = settings.DISPATCH_TASK_SECONDS + 30
+    for campagne_id in campagnes:
+        for slot in range(settings.DISPATCH_PARALLELISME):
+            try:
+                libre = redis_client.set(_slot_key(campagne_id, slot), "1", nx=True, ex=ttl)
+            except redis.RedisError as e:
+                print(f"❌ Erreur Redis (dispatch campagne {campagne_id}): {e}")
+                return lances
+            if libre:
+                envoyer_campagne.delay(campagne_id, slot)
+                lances += 1
+    return lances
+
+
+@celery_app.task(name="app.tasks.dispatch.envoyer_campagne")
+def envoyer_campagne(campagne_id: int, slot: int = 0) -> dict:
+    """Envoyer des lots pour une campagne pendant DISPATCH_TASK_SECONDS au plus"""
+    db = SessionLocal()
+    try:
+        bilan = dispatch.dispatcher_campagne(db, campagne_id, settings.DISPATCH_TASK_SECONDS)
+        if bilan["envoyes"] or bilan["echecs"] or bilan["reportes"]:
+            logger.info(
+                f"📨 Campagne {campagne_id} [{slot}] : {bilan['envoyes']} envoyés, "
+                f"{bilan['echecs']} échecs, {bilan['reportes']} reportés ({bilan['arret']})"
+            )
+        return bilan
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        try:
+            redis_client.delete(_slot_key(campagne_id, slot))
+        except redis.RedisError:
+            pass
+
+
+@celery_app.task(name="app.tasks.dispatch.reconstruire_contacts")
+def reconstruire_contacts() -> int:
+    """Recaler les contacts récents (politique de contact) sur la table messages"""
+    db = SessionLocal()
+    try:
+        return politique_contact.reconstruire(db)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.dispatch.rafraichir_priorites_messages")
+def rafraichir_priorites_messages() -> int:
+    """Recaler la priorité des messages en file sur leur dossier et ses alertes"""
+    db = SessionLocal()
+    try:
+        return file_messages.rafraichir_priorites(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
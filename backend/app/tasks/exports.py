@@ -0,0 +1,16 @@
+"""Tâches Celery : exports Parquet pour l'analyse hors ligne"""
+
+from loguru import logger
+
+from app.core.database import engine
+from app.services import snapshot_export
+from app.tasks.celery_app import celery_app
+
+
+@celery_app.task(name="app.tasks.exports.export_portefeuille_parquet")
+def export_portefeuille_parquet(incremental: bool = True) -> dict:
+    """Export nocturne (incrémental par défaut) des tables du portefeuille"""
+    summary = snapshot_export.export_snapshot(engine, incremental=incremental)
+    for table, result in summary.items():
+        logger.info(f"📦 Export {table} : {result['lignes']} lignes, {result['fichiers']} fichiers")
+    return summary
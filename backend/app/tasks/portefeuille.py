@@ -0,0 +1,30 @@
+"""Tâches Celery : cube pré-agrégé du portefeuille et sketch des clients distincts"""
+
+from loguru import logger
+
+from app.core.database import SessionLocal
+from app.services import portefeuille_cube, estimations
+from app.tasks.celery_app import celery_app
+
+
+@celery_app.task(name="app.tasks.portefeuille.rebuild_portefeuille_cube")
+def rebuild_portefeuille_cube() -> dict:
+    """Reconstruction complète nocturne du cube"""
+    db = SessionLocal()
+    try:
+        result = portefeuille_cube.rebuild(db)
+        logger.info(f"🧊 Cube portefeuille reconstruit : {result['nb_lignes']} lignes en {result['duree_ms']} ms")
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.portefeuille.rebuild_clients_hll")
+def rebuild_clients_hll() -> int:
+    """Reconstruction nocturne du HyperLogLog des clients distincts"""
+    n = estimations.reconstruire_hll_clients()
+    logger.info(f"🧮 HyperLogLog clients reconstruit : ~{n} clients distincts")
+    return n
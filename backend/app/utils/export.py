@@ -0,0 +1,219 @@
+"""
+Export en flux (CSV / XLSX) de grandes listes
+
+Les lignes sont lues par curseur serveur et converties au fil de l'eau :
+le téléchargement démarre dès le premier lot et la mémoire de l'API reste
+constante quelle que soit la taille de l'export.
+
+Le XLSX est produit sans dépendance : un XLSX est une archive zip, que
+zipfile sait écrire dans un flux non "seekable" ; la feuille est écrite
+ligne par ligne en chaînes inline, sans table de chaînes partagées.
+
+Usage:
+    return streaming_export(stmt, columns, "dossiers", format)
+"""
+
+import csv
+import enum
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, List, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.core.database import engine
+
+STREAM_BATCH_ROWS = 2000
+
+# (clé de colonne dans le résultat, en-tête)
+ExportColumns = Sequence[Tuple[str, str]]
+
+FORMATS = {
+    "csv":  "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _stream_batches(stmt: Select) -> Iterator[list]:
+    """
+    Lots de lignes lus par curseur serveur
+
+    Connexion dédiée : la session de la requête est fermée avant que la
+    réponse ne soit envoyée.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=STREAM_BATCH_ROWS
+        ).execute(stmt)
+        for batch in result.partitions():
+            yield batch
+
+
+def _plain(value):
+    """Valeur affichable : enums par leur libellé, dates en ISO"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+# ========================
+# CSV
+# ========================
+
+def _csv_chunks(stmt: Select, columns: ExportColumns) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    # BOM : Excel ouvre alors le fichier en UTF-8
+    buffer.write("\ufeff")
+    writer.writerow([header for _, header in columns])
+    yield buffer.getvalue().encode("utf-8")
+
+    keys = [key for key, _ in columns]
+    for batch in _stream_batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            mapping = row._mapping
+            writer.writerow(["" if mapping[k] is None else _plain(mapping[k]) for k in keys])
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ========================
+# XLSX
+# ========================
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+# Caractères de contrôle interdits en XML 1.0
+_INVALID_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _ChunkSink:
+    """Flux en écriture seule : zipfile y écrit, le générateur vide les morceaux"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(_plain(value))))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_chunks(stmt: Select, columns: ExportColumns, sheet_name: str) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name[:31])))
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            header = "".join(_xlsx_cell(h) for _, h in columns)
+            sheet.write(f"{_SHEET_HEAD}<row>{header}</row>".encode("utf-8"))
+            yield sink.drain()
+
+            keys = [key for key, _ in columns]
+            for batch in _stream_batches(stmt):
+                rows = []
+                for row in batch:
+                    mapping = row._mapping
+                    rows.append("<row>" + "".join(_xlsx_cell(mapping[k]) for k in keys) + "</row>")
+                sheet.write("".join(rows).encode("utf-8"))
+                yield sink.drain()
+
+            sheet.write(_SHEET_TAIL.encode("utf-8"))
+    # Répertoire central de l'archive, écrit à la fermeture
+    yield sink.drain()
+
+
+# ========================
+# RÉPONSE
+# ========================
+
+def streaming_export(stmt: Select, columns: ExportColumns, basename: str, format: str) -> StreamingResponse:
+    """
+    Réponse HTTP en flux pour un SELECT déjà restreint au périmètre
+
+    Args:
+        stmt: requête Core ; chaque clé de `columns` doit en être une colonne
+        columns: [(clé, en-tête), ...] dans l'ordre d'affichage
+        basename: nom du fichier sans extension (date du jour ajoutée)
+        format: "csv" ou "xlsx"
+    """
+    if format == "xlsx":
+        chunks = _xlsx_chunks(stmt, columns, basename)
+    else:
+        chunks = _csv_chunks(stmt, columns)
+    filename = f"{basename}_{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )